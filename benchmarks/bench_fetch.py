@@ -0,0 +1,110 @@
+"""
+Rows per second of the cursor and COPY catalogue fetches.
+
+Seeds a throwaway schema on a local Postgres with synthetic products, times
+fetch_products() through the tuple cursor and through COPY ... CSV, and
+drops the schema again:
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/postgres \\
+        uv run python -m benchmarks.bench_fetch --rows 200000
+"""
+
+import argparse
+import os
+import time
+import uuid
+
+import psycopg2
+
+import src.db
+
+SCHEMA = """
+    CREATE TABLE products (
+        id SERIAL PRIMARY KEY,
+        sku VARCHAR UNIQUE NOT NULL,
+        name VARCHAR NOT NULL,
+        description TEXT,
+        active BOOLEAN DEFAULT TRUE,
+        is_new BOOLEAN DEFAULT FALSE
+    );
+    CREATE TABLE product_variants (
+        id SERIAL PRIMARY KEY,
+        product_id INTEGER REFERENCES products(id),
+        price DECIMAL(10, 2),
+        old_price DECIMAL(10, 2),
+        color VARCHAR,
+        size VARCHAR,
+        age VARCHAR,
+        inventory INTEGER DEFAULT 0
+    );
+    CREATE TABLE product_images (
+        id SERIAL PRIMARY KEY,
+        product_id INTEGER REFERENCES products(id),
+        image VARCHAR NOT NULL,
+        "order" INTEGER DEFAULT 0
+    );
+"""
+
+SEED = """
+    INSERT INTO products (sku, name, description, is_new)
+    SELECT 'SKU-' || g, 'Product ' || g, repeat('Soft cotton, relaxed fit. ', 12), g %% 3 = 0
+    FROM generate_series(1, %s) g;
+    INSERT INTO product_variants (product_id, price, color, size, age, inventory)
+    SELECT id, 1000 + id %% 500, 'Red', 'M', 'adult', id %% 7 FROM products;
+    INSERT INTO product_images (product_id, image)
+    SELECT id, 'https://cdn.example.com/images/' || sku || '.jpg' FROM products;
+    CREATE INDEX ON product_variants (product_id);
+    CREATE INDEX ON product_images (product_id);
+    ANALYZE;
+"""
+
+
+def measure(fetch, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        products = fetch()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(products), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database-url", default=os.getenv("TEST_DATABASE_URL"))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set TEST_DATABASE_URL or pass --database-url")
+
+    schema = f"feed_bench_{uuid.uuid4().hex[:8]}"
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+
+    try:
+        cur.execute(SCHEMA)
+        cur.execute(SEED, (args.rows,))
+        separator = "&" if "?" in args.database_url else "?"
+        os.environ["DATABASE_URL"] = f"{args.database_url}{separator}options=-csearch_path%3D{schema}"
+
+        print(f"{args.rows:,} products, best of {args.repeat}")
+        print(f"{'fetch':<10}{'seconds':>10}{'rows/s':>12}")
+        results = {}
+        for name, fetch in (("cursor", src.db.fetch_products), ("copy", src.db.fetch_products_copy)):
+            count, elapsed = measure(fetch, args.repeat)
+            results[name] = count / elapsed
+            print(f"{name:<10}{elapsed:>10.2f}{count / elapsed:>12,.0f}")
+
+        print(f"copy speedup: {results['copy'] / results['cursor']:.2f}x")
+    finally:
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
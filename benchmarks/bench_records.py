@@ -0,0 +1,102 @@
+"""
+Memory and build-time comparison of product representations.
+
+Compares the previous pipeline (RealDictCursor row dict plus a 12-key feed
+dict per product) with ProductRecords built straight from tuple cursor rows.
+Rows are synthesised in memory, so no database is needed:
+
+    uv run python -m benchmarks.bench_records --rows 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from decimal import Decimal
+
+from src.db import PLACEHOLDER_IMAGE, PRODUCT_URL, ProductRecord, availability_for
+
+COLUMNS = (
+    "id", "sku", "title", "description", "price", "old_price", "image_url",
+    "is_new", "color", "size", "age", "inventory", "is_active",
+)
+
+
+def synthetic_rows(count):
+    for i in range(count):
+        yield (
+            i,
+            f"SKU-{i:08d}",
+            f"Product {i}",
+            f"Description for product {i}",
+            Decimal("1000.00") + i % 500,
+            None,
+            f"https://cdn.example.com/images/{i}.jpg",
+            i % 3 == 0,
+            "Red",
+            "M",
+            "adult",
+            i % 7,
+            True,
+        )
+
+
+def dict_products(rows):
+    """The representation fetch_products used before ProductRecord."""
+    # RealDictCursor.fetchall() materialised every row as a dict first
+    row_dicts = [dict(zip(COLUMNS, values)) for values in rows]
+    products = []
+    for row in row_dicts:
+        products.append({
+            "id": row["sku"],
+            "title": row["title"],
+            "description": row["description"] or "",
+            "availability": availability_for(row["inventory"]),
+            "link": PRODUCT_URL + row["sku"],
+            "image link": row["image_url"] or PLACEHOLDER_IMAGE,
+            "price": float(row["price"]) if row["price"] else 0.0,
+            "condition": "new" if row["is_new"] else "used",
+            "color": row["color"] or "",
+            "size": row["size"] or "",
+            "age group": row["age"] or "",
+            "is_active": row["is_active"],
+        })
+    return products
+
+
+def record_products(rows):
+    return list(map(ProductRecord.from_row, rows))
+
+
+def measure(build, count):
+    rows = list(synthetic_rows(count))
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    products = build(rows)
+    elapsed = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del products, rows
+    gc.collect()
+    return retained, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{args.rows:,} products")
+    print(f"{'representation':<16}{'retained MB':>14}{'peak MB':>12}{'build s':>10}")
+    results = {}
+    for name, build in (("dict", dict_products), ("ProductRecord", record_products)):
+        retained, peak, elapsed = measure(build, args.rows)
+        results[name] = retained
+        print(f"{name:<16}{retained / 2**20:>14.1f}{peak / 2**20:>12.1f}{elapsed:>10.2f}")
+
+    print(f"retained memory ratio: {results['dict'] / results['ProductRecord']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
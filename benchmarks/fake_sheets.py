@@ -0,0 +1,99 @@
+"""
+In-memory stand-in for a gspread Worksheet.
+
+Implements the calls src.sync makes, with a fixed delay per request in
+place of the Sheets API round trip, and counts requests by method.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+
+_A1 = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def column_index(letters):
+    """Convert A1 column letters to a 1-based index (A -> 1, AA -> 27)."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index
+
+
+class FakeWorksheet:
+    def __init__(self, headers, latency=0.0):
+        self.rows = [list(headers)]
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _request(self, method):
+        self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _bounds(self, a1):
+        """0-based (first row, last row, first column, last column) of an A1 range, inclusive."""
+        start_col, start_row, end_col, end_row = _A1.match(a1).groups()
+        first_row = int(start_row) - 1 if start_row else 0
+        if end_col is None:
+            end_col, end_row = start_col, start_row
+        last_row = int(end_row) - 1 if end_row else max(len(self.rows) - 1, first_row)
+        return first_row, last_row, column_index(start_col) - 1, column_index(end_col) - 1
+
+    def row_values(self, row):
+        self._request("row_values")
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col):
+        self._request("col_values")
+        with self._lock:
+            values = [row[col - 1] if col <= len(row) else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def get_all_values(self):
+        self._request("get_all_values")
+        with self._lock:
+            width = max(len(row) for row in self.rows)
+            return [list(row) + [""] * (width - len(row)) for row in self.rows]
+
+    def batch_get(self, ranges):
+        self._request("batch_get")
+        results = []
+        with self._lock:
+            for a1 in ranges:
+                first_row, last_row, first_col, last_col = self._bounds(a1)
+                values = [
+                    row[first_col:last_col + 1]
+                    for row in self.rows[first_row:last_row + 1]
+                ]
+                while values and not any(values[-1]):
+                    values.pop()
+                results.append(values)
+        return results
+
+    def batch_update(self, data, value_input_option=None):
+        self._request("batch_update")
+        with self._lock:
+            for entry in data:
+                first_row, _, first_col, _ = self._bounds(entry["range"])
+                for offset, values in enumerate(entry["values"]):
+                    index = first_row + offset
+                    self.rows.extend([] for _ in range(index + 1 - len(self.rows)))
+                    row = self.rows[index]
+                    row.extend([""] * (first_col + len(values) - len(row)))
+                    row[first_col:first_col + len(values)] = [str(value) for value in values]
+
+    def append_rows(self, values, value_input_option=None):
+        self._request("append_rows")
+        with self._lock:
+            self.rows.extend([str(value) for value in row] for row in values)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._request("delete_rows")
+        with self._lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
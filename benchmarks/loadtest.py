@@ -0,0 +1,388 @@
+"""
+End-to-end load test of the HTTP API against local stand-ins.
+
+Boots the app with uvicorn inside this process, on a throwaway Postgres
+schema seeded with synthetic products, an in-memory Redis (fakeredis) and
+a FakeWorksheet, then triggers syncs and polls their status at fixed
+rates while a background writer keeps changing prices:
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/postgres \\
+        uv run python -m benchmarks.loadtest --duration 30 --trigger-rate 1 --pollers 20
+
+Reports request latency percentiles, job completion times and how many
+jobs found the sync lock taken. --save-baseline writes the report to a
+file; --baseline compares the run against one and exits non-zero when a
+metric regressed by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from unittest.mock import patch
+
+import httpx
+import psycopg2
+
+import src.async_locks
+import src.db
+import src.locks
+from benchmarks.bench_fetch import SCHEMA, SEED
+from benchmarks.fake_sheets import FakeWorksheet
+from src.jobs import JobStatus
+from src.sync import EXPECTED_HEADERS
+
+TRIGGER = "POST /sync"
+POLL = "GET /sync/{job_id}"
+
+CHURN_QUERY = """
+    UPDATE product_variants SET price = price + 1
+    WHERE product_id IN (SELECT id FROM products ORDER BY random() LIMIT %s)
+"""
+
+# Differences smaller than these are noise, whatever the tolerance says.
+REGRESSION_FLOORS = {"ms": 2.0, "seconds": 0.25, "contention": 0.05}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; values need not be sorted."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, -(-pct * len(values) // 100) - 1)]
+
+
+def _summary(values, scale=1.0, digits=2):
+    if not values:
+        return {}
+    return {
+        f"p{pct}": round(percentile(values, pct) * scale, digits) for pct in (50, 95, 99)
+    } | {"max": round(max(values) * scale, digits)}
+
+
+def use_fake_redis(redis_url=None):
+    """Point both Redis clients at one shared in-memory server, or at a scratch Redis."""
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+        src.locks.redis_client.flushdb()
+        return
+
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed; install it or pass --redis-url")
+
+    server = fakeredis.FakeServer()
+    src.locks.redis_client._client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    src.async_locks.async_redis_client._client = fakeredis.FakeAsyncRedis(
+        server=server, decode_responses=True
+    )
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    async def request(self, client, name, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        if response.is_error:
+            self.errors[name] += 1
+            return None
+        return response.json()
+
+    def report(self):
+        return {
+            name: {
+                "count": len(self.latencies[name]) + self.errors[name],
+                "errors": self.errors[name],
+                **{f"{key}_ms": value for key, value in _summary(self.latencies[name], 1000).items()},
+            }
+            for name in sorted(self.latencies.keys() | self.errors.keys())
+        }
+
+
+async def _at_rate(rate, deadline, action):
+    """Start action() rate times a second until the deadline, without waiting for each to finish."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks = []
+    for tick in range(int((deadline - started) * rate)):
+        await asyncio.sleep(max(0.0, started + tick / rate - loop.time()))
+        tasks.append(asyncio.create_task(action()))
+    await asyncio.gather(*tasks)
+
+
+async def drive(base_url, args, recorder, jobs):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.pollers + 32)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def trigger():
+            mode = "fast" if rng.random() < args.fast_ratio else "full"
+            params = {"mode": mode}
+            if mode == "full" and args.force:
+                params["force"] = "true"
+            body = await recorder.request(client, TRIGGER, "POST", "/sync", params=params)
+            if body:
+                jobs[body["job_id"]] = mode
+
+        async def poll():
+            if jobs:
+                job_id = rng.choice(list(jobs)[-args.poll_window:])
+                await recorder.request(client, POLL, "GET", f"/sync/{job_id}")
+
+        deadline = asyncio.get_running_loop().time() + args.duration
+        await asyncio.gather(
+            _at_rate(args.trigger_rate, deadline, trigger),
+            *(_at_rate(args.poll_rate, deadline, poll) for _ in range(args.pollers)),
+        )
+
+
+def churn(dsn, rows_per_second, stop):
+    """Keep changing prices so every full sync has rows to write."""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            while not stop.wait(1.0):
+                cur.execute(CHURN_QUERY, (rows_per_second,))
+    finally:
+        conn.close()
+
+
+def drain(jobs, timeout):
+    """Wait for every triggered job to finish; returns the jobs as stored."""
+    deadline = time.monotonic() + timeout
+    while True:
+        stored = {job_id: src.locks.get_job(job_id) for job_id in jobs}
+        pending = [
+            job for job in stored.values()
+            if job["status"] in (JobStatus.pending, JobStatus.running)
+        ]
+        if not pending or time.monotonic() > deadline:
+            return stored
+        time.sleep(0.5)
+
+
+def summarise(stored, modes):
+    def _jobs(job_ids):
+        finished = [
+            stored[job_id] for job_id in job_ids
+            if stored[job_id]["status"] in (JobStatus.success, JobStatus.failed)
+        ]
+        results = [(job.get("result") or {}).get("status") for job in finished]
+        locked = results.count("locked")
+        ran = [
+            job for job, result in zip(finished, results)
+            if job["status"] == JobStatus.success and result is None
+        ]
+        return {
+            "triggered": len(job_ids),
+            "succeeded": sum(job["status"] == JobStatus.success for job in finished),
+            "failed": sum(job["status"] == JobStatus.failed for job in finished),
+            "unfinished": len(job_ids) - len(finished),
+            "locked": locked,
+            "unchanged": results.count("unchanged"),
+            "lock_contention": round(locked / len(finished), 3) if finished else None,
+            # Created to finished, for the jobs that actually synced.
+            "completion_seconds": _summary(
+                [float(job["finished_at"]) - float(job["created_at"]) for job in ran], digits=3
+            ),
+            "queue_seconds": _summary(
+                [float(job["started_at"]) - float(job["created_at"]) for job in finished], digits=3
+            ),
+        }
+
+    by_mode = defaultdict(list)
+    for job_id, mode in modes.items():
+        by_mode[mode].append(job_id)
+
+    return {
+        **_jobs(list(modes)),
+        "by_mode": {mode: _jobs(job_ids) for mode, job_ids in sorted(by_mode.items())},
+    }
+
+
+def regressions(report, baseline, tolerance):
+    """(metric, baseline, current) for every tracked metric that got worse."""
+    found = []
+
+    def check(name, before, after, floor):
+        if before is None or after is None:
+            return
+        if after > before * (1 + tolerance) and after - before > floor:
+            found.append((name, before, after))
+
+    for name, before in baseline["requests"].items():
+        after = report["requests"].get(name, {})
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            check(f"{name} {key}", before.get(key), after.get(key), REGRESSION_FLOORS["ms"])
+        check(f"{name} errors", before["errors"], after.get("errors"), 0)
+
+    for mode, before in baseline["jobs"]["by_mode"].items():
+        after = report["jobs"]["by_mode"].get(mode, {})
+        for key in ("p50", "p95"):
+            check(
+                f"{mode} completion {key}",
+                before["completion_seconds"].get(key),
+                after.get("completion_seconds", {}).get(key),
+                REGRESSION_FLOORS["seconds"],
+            )
+        check(f"{mode} failed", before["failed"], after.get("failed"), 0)
+
+    check(
+        "lock contention",
+        baseline["jobs"]["lock_contention"],
+        report["jobs"]["lock_contention"],
+        REGRESSION_FLOORS["contention"],
+    )
+    return found
+
+
+def print_report(report):
+    print(f"{'request':<22}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["requests"].items():
+        print(
+            f"{name:<22}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats.get('p50_ms', 0):>10.1f}{stats.get('p95_ms', 0):>10.1f}{stats.get('p99_ms', 0):>10.1f}"
+        )
+
+    print(f"\n{'jobs':<10}{'run':>6}{'locked':>8}{'unchanged':>11}{'failed':>8}{'p50 s':>9}{'p95 s':>9}")
+    for mode, stats in report["jobs"]["by_mode"].items():
+        completion = stats["completion_seconds"]
+        print(
+            f"{mode:<10}{stats['triggered']:>6}{stats['locked']:>8}{stats['unchanged']:>11}"
+            f"{stats['failed']:>8}{completion.get('p50', 0):>9.2f}{completion.get('p95', 0):>9.2f}"
+        )
+    print(f"lock contention: {report['jobs']['lock_contention']}")
+    print(f"unfinished jobs: {report['jobs']['unfinished']}")
+    print(f"sheets requests: {report['sheets_requests']}")
+
+
+def run(args, dsn):
+    import uvicorn
+
+    from src.main import app
+
+    use_fake_redis(args.redis_url)
+    sheet = FakeWorksheet(EXPECTED_HEADERS, latency=args.sheets_latency)
+
+    # No lifespan, so no scheduler: every sync in the run is one we triggered.
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    stop_churn = threading.Event()
+    churner = threading.Thread(target=churn, args=(dsn, args.churn, stop_churn), daemon=True)
+    recorder = Recorder()
+    jobs = {}
+
+    with patch("src.sync.get_sheet", return_value=sheet):
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        if args.churn:
+            churner.start()
+
+        try:
+            port = server.servers[0].sockets[0].getsockname()[1]
+            asyncio.run(drive(f"http://127.0.0.1:{port}", args, recorder, jobs))
+        finally:
+            stop_churn.set()
+            stored = drain(jobs, args.drain_timeout)
+            server.should_exit = True
+            thread.join()
+            src.db.close_fetch_pool()
+
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "rows", "duration", "trigger_rate", "fast_ratio", "force",
+                "pollers", "poll_rate", "churn", "sheets_latency",
+            )
+        },
+        "requests": recorder.report(),
+        "jobs": summarise(stored, jobs),
+        "sheets_requests": dict(sheet.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000, help="products to seed")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--trigger-rate", type=float, default=1.0, help="POST /sync per second")
+    parser.add_argument("--fast-ratio", type=float, default=0.5, help="share of triggers that are fast syncs")
+    parser.add_argument("--force", action="store_true", help="full syncs skip the unchanged-catalogue check")
+    parser.add_argument("--pollers", type=int, default=10, help="concurrent status pollers")
+    parser.add_argument("--poll-rate", type=float, default=5.0, help="polls per second per poller")
+    parser.add_argument("--poll-window", type=int, default=20, help="pollers pick among this many newest jobs")
+    parser.add_argument("--churn", type=int, default=100, help="products repriced per second")
+    parser.add_argument("--sheets-latency", type=float, default=0.05, help="seconds per fake Sheets request")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for jobs after the load")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=os.getenv("TEST_DATABASE_URL"))
+    parser.add_argument("--redis-url", help="scratch Redis database to use instead of fakeredis; it is flushed")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the report as the new baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set TEST_DATABASE_URL or pass --database-url")
+
+    schema = f"feed_load_{uuid.uuid4().hex[:8]}"
+    separator = "&" if "?" in args.database_url else "?"
+    dsn = f"{args.database_url}{separator}options=-csearch_path%3D{schema}"
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+
+    try:
+        cur.execute(SCHEMA)
+        cur.execute(SEED, (args.rows,))
+        os.environ["DATABASE_URL"] = dsn
+        report = run(args, dsn)
+    finally:
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        cur.close()
+        conn.close()
+
+    print_report(report)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"]:
+            print("\nwarning: baseline was recorded with different settings")
+        found = regressions(report, baseline, args.tolerance)
+        if found:
+            print(f"\nregressions beyond {args.tolerance:.0%}:")
+            for name, before, after in found:
+                print(f"  {name}: {before} -> {after}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
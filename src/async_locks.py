@@ -0,0 +1,115 @@
+"""
+Async counterparts of the src.locks job queries, for the API handlers.
+
+They run on the event loop over a redis.asyncio connection pool, so a
+status poll never waits for a threadpool worker (those are busy running
+background syncs) or for one of the sync client's connections.
+"""
+
+import json
+import os
+import threading
+
+from src.locks import (
+    JOB_INDEX_KEY,
+    _decode_job,
+    _decode_jobs,
+    _history_range,
+    _job_key,
+    _next_cursor,
+    _plan_key,
+    _profile_key,
+    _queue_create_job,
+    summarise_jobs,
+)
+
+REDIS_ASYNC_MAX_CONNECTIONS = int(os.getenv("REDIS_ASYNC_MAX_CONNECTIONS", "50"))
+# How long a request waits for a free pooled connection before failing.
+REDIS_ASYNC_POOL_TIMEOUT = float(os.getenv("REDIS_ASYNC_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+
+
+class _LazyAsyncRedis:
+    """
+    Stands in for the async Redis client until it is first used, so the
+    pool is built inside the running event loop.
+    """
+
+    _client = None
+    _lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis.asyncio
+
+                    pool = redis.asyncio.BlockingConnectionPool.from_url(
+                        os.getenv("REDIS_URL"),
+                        decode_responses=True,
+                        max_connections=REDIS_ASYNC_MAX_CONNECTIONS,
+                        timeout=REDIS_ASYNC_POOL_TIMEOUT,
+                        socket_timeout=REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                    )
+                    self._client = redis.asyncio.Redis(connection_pool=pool)
+        return getattr(self._client, name)
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+            await client.connection_pool.disconnect()
+
+
+async_redis_client = _LazyAsyncRedis()
+
+
+async def close_async_redis():
+    await async_redis_client.close()
+
+
+async def create_job(job_id: str, **fields):
+    pipe = async_redis_client.pipeline()
+    _queue_create_job(pipe, job_id, fields)
+    await pipe.execute()
+
+
+async def get_job(job_id: str):
+    data = await async_redis_client.hgetall(_job_key(job_id))
+    if not data:
+        return None
+
+    return _decode_job(data)
+
+
+async def _get_jobs(job_ids):
+    pipe = async_redis_client.pipeline()
+    for job_id in job_ids:
+        pipe.hgetall(_job_key(job_id))
+    return _decode_jobs(job_ids, await pipe.execute())
+
+
+async def list_jobs(limit: int = 20, cursor: str | None = None):
+    args, kwargs = _history_range(limit, cursor)
+    entries = await async_redis_client.zrevrangebyscore(*args, **kwargs)
+
+    return {
+        "jobs": await _get_jobs([job_id for job_id, _ in entries]),
+        "next_cursor": _next_cursor(entries, limit),
+    }
+
+
+async def job_stats(last: int = 100):
+    job_ids = await async_redis_client.zrevrange(JOB_INDEX_KEY, 0, last - 1)
+    return summarise_jobs(await _get_jobs(job_ids))
+
+
+async def plan_exists(plan_id: str):
+    return bool(await async_redis_client.exists(_plan_key(plan_id)))
+
+
+async def get_profile(job_id: str):
+    data = await async_redis_client.get(_profile_key(job_id))
+    return json.loads(data) if data else None
@@ -0,0 +1,69 @@
+"""
+Command-line sync runner, for cron jobs that should not boot the API:
+
+    python -m src.cli sync [--mode full|fast] [--plan-id ID] [--force]
+
+The sync is tracked as a job exactly like an API or scheduled run. The
+heavy modules (the sync itself, database and Sheets clients) are only
+imported once the arguments have been parsed, and the API, ASGI server
+and scheduler are never imported at all.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import uuid
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+# Another sync held the lock; worth retrying later rather than alerting.
+EXIT_LOCKED = os.EX_TEMPFAIL
+
+
+def run_sync(mode="full", plan_id=None, force=False):
+    from src.locks import create_job
+    from src.runner import run_sync_job
+
+    job_id = str(uuid.uuid4())
+    fields = {"plan_id": plan_id} if plan_id else {}
+    create_job(job_id, trigger="cli", mode=mode, **fields)
+
+    try:
+        result = run_sync_job(job_id, mode, plan_id, force=force)
+    except Exception as e:
+        print(json.dumps({"job_id": job_id, "status": "failed", "error": str(e)}), file=sys.stderr)
+        return EXIT_FAILED
+
+    print(json.dumps({"job_id": job_id, "result": result}))
+    return EXIT_LOCKED if result.get("status") == "locked" else EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Google Merchant feed sync")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync = commands.add_parser("sync", help="run a sync and wait for it to finish")
+    sync.add_argument("--mode", choices=("full", "fast"), default="full")
+    sync.add_argument("--plan-id", help="apply a plan stored by an earlier dry run (full mode only)")
+    sync.add_argument("--force", action="store_true", help="sync even if the catalogue is unchanged")
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.plan_id and args.mode != "full":
+        parser.error("--plan-id is only supported for full syncs")
+    if args.force and args.mode != "full":
+        parser.error("--force is only supported for full syncs")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    return run_sync(args.mode, args.plan_id, args.force)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,66 +1,637 @@
+import contextvars
+import csv
+import io
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import NamedTuple
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
 
+from src.profiling import instrument_connection
 
-def fetch_products():
+logger = logging.getLogger(__name__)
+
+FEED_VIEW = "feed_products"
+
+PRODUCT_URL = "https://www.revoque.com.ng/products/"
+PLACEHOLDER_IMAGE = "https://www.revoque.com.ng/placeholder.jpg"
+
+FETCH_BATCH_SIZE = int(os.getenv("DB_FETCH_BATCH_SIZE", "5000"))
+
+# "copy" streams whole-catalogue reads out of COPY ... TO STDOUT as CSV
+# instead of fetching them through a cursor.
+FETCH_MODE = os.getenv("DB_FETCH_MODE", "cursor")
+COPY_BUFFER_SIZE = 1 << 20
+
+# Whole-catalogue reads are split into this many product-id ranges, each
+# fetched on its own connection. 1 reads everything on one connection.
+FETCH_PARTITIONS = int(os.getenv("DB_FETCH_PARTITIONS", "1"))
+
+# Feed reads go to DATABASE_REPLICA_URL when it is set, unless the replica
+# is down or cannot replay what the primary has committed within this long.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_CONNECT_TIMEOUT = 5
+REPLICA_POLL_SECONDS = 0.1
+
+# Per-statement limit on feed reads, in milliseconds. 0 means no limit.
+READ_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_READ_STATEMENT_TIMEOUT_MS", "0"))
+
+_FEED_SELECT = """
+    SELECT
+        p.id,
+        p.sku,
+        p.name AS title,
+        p.description,
+        v.price,
+        v.old_price,
+        pi.image AS image_url,
+        p.is_new,
+        v.color,
+        v.size,
+        v.age,
+        stock.inventory,
+        p.active AS is_active
+    FROM products p
+    LEFT JOIN LATERAL (
+        SELECT * FROM product_variants
+        WHERE product_id = p.id
+        ORDER BY id ASC
+        LIMIT 1
+    ) v ON true
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(SUM(inventory), 0) AS inventory FROM product_variants
+        WHERE product_id = p.id
+    ) stock ON true
+    LEFT JOIN LATERAL (
+        SELECT * FROM product_images
+        WHERE product_id = p.id
+        ORDER BY "order" ASC
+        LIMIT 1
+    ) pi ON true
+"""
+
+FEED_QUERY = _FEED_SELECT + "    WHERE p.active = TRUE\n"
+
+# Inactive products are kept, so callers can drop them from the feed.
+FEED_BY_ID_QUERY = _FEED_SELECT + "    WHERE p.id = ANY(%s)\n"
+FEED_BY_SKU_QUERY = _FEED_SELECT + "    WHERE p.sku = ANY(%s)\n"
+
+FEED_VIEW_QUERY = f"""
+    SELECT
+        id, sku, title, description, price, old_price, image_url,
+        is_new, color, size, age, inventory, is_active
+    FROM {FEED_VIEW}
+"""
+
+# Two-phase full fetch. Phase one hashes every feed row where it lives, so
+# only a SKU and an md5 per product cross the wire; phase two pulls full
+# rows for just the SKUs whose hash is new or has changed. Both wrap the
+# same feed source, so a hash always describes the row phase two returns.
+ROW_HASH_QUERY = "SELECT feed.sku, md5(feed::text) FROM ({source}) feed"
+CHANGED_ROWS_QUERY = "SELECT feed.* FROM ({source}) feed WHERE feed.sku = ANY(%s)"
+
+COPY_QUERY = "COPY ({source}) TO STDOUT WITH (FORMAT csv)"
+
+# Partitioned reads. The coordinating transaction exports its snapshot and
+# reads the id bounds from the primary key (or the view's id index), so
+# finding the ranges never runs the feed joins.
+PARTITION_BOUNDS_QUERY = "SELECT pg_export_snapshot(), min(id), max(id) FROM {table}"
+RANGE_FILTER = " WHERE feed.id BETWEEN %s AND %s"
+FEED_RANGE_QUERY = "SELECT feed.* FROM ({source}) feed" + RANGE_FILTER
+
+PRIMARY_LSN_QUERY = "SELECT pg_current_wal_lsn()"
+# True on a server that is not a standby, e.g. a replica URL pointing at the primary.
+REPLICA_CAUGHT_UP_QUERY = "SELECT NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= %s::pg_lsn"
+
+PRICE_AVAILABILITY_QUERY = """
+    SELECT
+        p.sku,
+        v.price,
+        stock.inventory
+    FROM products p
+    LEFT JOIN LATERAL (
+        SELECT price FROM product_variants
+        WHERE product_id = p.id
+        ORDER BY id ASC
+        LIMIT 1
+    ) v ON true
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(SUM(inventory), 0) AS inventory FROM product_variants
+        WHERE product_id = p.id
+    ) stock ON true
+    WHERE p.active = TRUE
+"""
+
+
+# Cumulative insert/update/delete counters of the tables the feed is read
+# from. Any committed change to them moves the counters, and reading them
+# costs about a millisecond however big the catalogue is.
+FINGERPRINT_QUERY = """
+    SELECT string_agg(relname || ':' || (n_tup_ins + n_tup_upd + n_tup_del), ',' ORDER BY relname)
+    FROM pg_stat_user_tables
+    WHERE relid = ANY(%s::regclass[])
+"""
+
+CHANGE_CHANNEL = "feed_product_changes"
+CHANGE_TRIGGER_TABLES = ("products", "product_variants", "product_images")
+
+# Notifies the id of the product a changed row belongs to. Postgres folds
+# identical notifications within a transaction, so editing every variant
+# of a product in one transaction sends its id once.
+CHANGE_NOTIFY_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION feed_notify_product_change() RETURNS trigger AS $$
+    DECLARE
+        changed RECORD;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed := OLD;
+        ELSE
+            changed := NEW;
+        END IF;
+
+        IF TG_TABLE_NAME = 'products' THEN
+            PERFORM pg_notify('{CHANGE_CHANNEL}', changed.id::text);
+        ELSE
+            PERFORM pg_notify('{CHANGE_CHANNEL}', changed.product_id::text);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def feed_view_enabled():
+    return os.getenv("FEED_MATERIALIZED_VIEW", "false").lower() in ("1", "true", "yes")
+
+
+def change_notify_enabled():
+    return os.getenv("FEED_CHANGE_NOTIFY", "false").lower() in ("1", "true", "yes")
+
+
+def _feed_source():
+    return FEED_VIEW_QUERY if feed_view_enabled() else FEED_QUERY
+
+
+def _connect():
+    return instrument_connection(psycopg2.connect(os.getenv("DATABASE_URL")))
+
+
+def _read_dsn(dsn):
+    """dsn with the feed read statement timeout added to any options it already has."""
+    if not READ_STATEMENT_TIMEOUT_MS:
+        return dsn
+    options = psycopg2.extensions.parse_dsn(dsn).get("options", "")
+    return psycopg2.extensions.make_dsn(
+        dsn, options=f"{options} -c statement_timeout={READ_STATEMENT_TIMEOUT_MS}".strip()
+    )
+
+
+# DSN -> pool for partitioned reads, one per server, created on first use.
+_fetch_pools = {}
+_fetch_pool_lock = threading.Lock()
+
+
+def _get_fetch_pool(size, dsn):
+    with _fetch_pool_lock:
+        pool = _fetch_pools.get(dsn)
+        if pool is None or pool.maxconn < size:
+            if pool is not None:
+                pool.closeall()
+            from psycopg2.pool import ThreadedConnectionPool
+
+            # minconn == maxconn: the pool only keeps minconn idle connections.
+            pool = _fetch_pools[dsn] = ThreadedConnectionPool(size, size, _read_dsn(dsn))
+        return pool
+
+
+def close_fetch_pool():
+    with _fetch_pool_lock:
+        for pool in _fetch_pools.values():
+            pool.closeall()
+        _fetch_pools.clear()
+
+
+# (DSN, connection) of the read transaction opened by feed_snapshot().
+_read_session = contextvars.ContextVar("feed_read_session", default=None)
+
+
+def _replica_connection(replica_url):
+    """
+    A connection to the replica once it has replayed everything committed
+    on the primary when the read starts, or None if it falls further behind
+    than REPLICA_MAX_LAG_SECONDS.
+    """
+    primary = _connect()
+    try:
+        cur = primary.cursor()
+        cur.execute(PRIMARY_LSN_QUERY)
+        lsn = cur.fetchone()[0]
+    finally:
+        primary.close()
+
+    conn = psycopg2.connect(_read_dsn(replica_url), connect_timeout=REPLICA_CONNECT_TIMEOUT)
+    deadline = time.monotonic() + REPLICA_MAX_LAG_SECONDS
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute(REPLICA_CAUGHT_UP_QUERY, (lsn,))
+            if cur.fetchone()[0]:
+                cur.close()
+                conn.rollback()
+                return conn
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(REPLICA_POLL_SECONDS)
+    except BaseException:
+        conn.close()
+        raise
+
+    conn.close()
+    logger.warning("Replica is over %ss behind the primary; reading from the primary", REPLICA_MAX_LAG_SECONDS)
+    return None
+
+
+def _read_connection():
+    """(DSN, connection) for feed reads: the replica when it is set, up and caught up, else the primary."""
+    replica_url = os.getenv("DATABASE_REPLICA_URL")
+    if replica_url:
+        try:
+            conn = _replica_connection(replica_url)
+        except psycopg2.OperationalError as e:
+            logger.warning("Replica unavailable, reading from the primary: %s", e)
+        else:
+            if conn is not None:
+                return replica_url, instrument_connection(conn)
+
+    dsn = os.getenv("DATABASE_URL")
+    return dsn, instrument_connection(psycopg2.connect(_read_dsn(dsn)))
+
+
+@contextmanager
+def feed_snapshot():
+    """
+    Run every feed read in the block in one READ ONLY REPEATABLE READ
+    transaction, on the replica when one is configured, so the reads of a
+    sync all see the same catalogue. Reads outside a block get a
+    transaction of their own; nested blocks join the outer one.
+    """
+    if _read_session.get() is not None:
+        yield
+        return
+
+    dsn, conn = _read_connection()
+    token = _read_session.set((dsn, conn))
+    try:
+        conn.set_session(isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        yield
+    finally:
+        _read_session.reset(token)
+        conn.close()
+
+
+@contextmanager
+def _feed_cursor():
+    """Cursor on the current feed_snapshot() connection, opening one for just this read if needed."""
+    session = _read_session.get()
+    if session is None:
+        with feed_snapshot(), _feed_cursor() as cur:
+            yield cur
+        return
+
+    cur = session[1].cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+def availability_for(inventory):
+    return "in_stock" if inventory and inventory > 0 else "out_of_stock"
+
+
+class ProductRecord(NamedTuple):
+    """
+    One feed product. A plain tuple underneath, so a million of these cost a
+    fraction of the equivalent dicts.
+    """
+
+    id: str
+    title: str
+    description: str
+    availability: str
+    link: str
+    image_link: str
+    price: float
+    condition: str
+    color: str
+    size: str
+    age_group: str
+    is_active: bool
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a feed query row (FEED_QUERY column order)."""
+        (
+            _, sku, title, description, price, _, image_url,
+            is_new, color, size, age, inventory, is_active,
+        ) = row
+        return cls(
+            sku,
+            title,
+            description or "",
+            availability_for(inventory),
+            PRODUCT_URL + sku,
+            image_url or PLACEHOLDER_IMAGE,
+            float(price) if price else 0.0,
+            "new" if is_new else "used",
+            color or "",
+            size or "",
+            age or "",
+            is_active,
+        )
+
+    @classmethod
+    def from_csv(cls, row):
+        """
+        Build a record from a COPY CSV row: FEED_QUERY column order, every
+        field as text, NULL as an empty string and booleans as t/f.
+        """
+        (
+            _, sku, title, description, price, _, image_url,
+            is_new, color, size, age, inventory, is_active,
+        ) = row
+        return cls(
+            sku,
+            title,
+            description,
+            availability_for(int(inventory) if inventory else 0),
+            PRODUCT_URL + sku,
+            image_url or PLACEHOLDER_IMAGE,
+            float(price) if price else 0.0,
+            "new" if is_new == "t" else "used",
+            color,
+            size,
+            age,
+            is_active == "t",
+        )
+
+
+def create_feed_view():
+    """
+    Create the feed_products materialized view and the unique index that
+    REFRESH ... CONCURRENTLY requires. Safe to call on every startup.
+    """
+    conn = _connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    try:
+        cur.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {FEED_VIEW} AS {FEED_QUERY}")
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {FEED_VIEW}_sku_idx ON {FEED_VIEW} (sku)")
+        # Lets partitioned fetches range-scan the view by product id.
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {FEED_VIEW}_id_idx ON {FEED_VIEW} (id)")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def refresh_feed_view():
+    """
+    Rebuild feed_products without blocking readers of the previous contents.
+    """
+    conn = _connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    try:
+        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {FEED_VIEW}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_change_triggers():
+    """
+    Install the triggers that NOTIFY CHANGE_CHANNEL with the product id on
+    every insert, update or delete in the catalogue tables. Safe to call on
+    every startup.
+    """
+    conn = _connect()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(CHANGE_NOTIFY_FUNCTION)
+        for table in CHANGE_TRIGGER_TABLES:
+            cur.execute(f"DROP TRIGGER IF EXISTS feed_notify_change ON {table}")
+            cur.execute(
+                f"CREATE TRIGGER feed_notify_change "
+                f"AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION feed_notify_product_change()"
+            )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def fetch_products(product_ids=None, skus=None):
     """
     Fetch products from PostgreSQL and map fields for Google Merchant feed.
+
+    With FEED_MATERIALIZED_VIEW enabled the rows are read from the
+    feed_products view instead of joining the live catalogue tables.
+    Rows come off a plain tuple cursor in batches and are turned straight
+    into ProductRecords, so no per-row dicts are ever built.
+
+    With product_ids or skus, only those products are read, always from the
+    live tables and including inactive ones. Otherwise the read is split
+    across connections when DB_FETCH_PARTITIONS is above 1, or streamed
+    through COPY when DB_FETCH_MODE is "copy".
+
+    Like every feed read, it runs on the replica when DATABASE_REPLICA_URL
+    is set, inside the caller's feed_snapshot() if there is one.
+    """
+    if product_ids is None and skus is None:
+        if FETCH_PARTITIONS > 1:
+            return fetch_partitioned(FEED_RANGE_QUERY, ProductRecord.from_row)
+        if FETCH_MODE == "copy":
+            return fetch_products_copy()
+
+    with _feed_cursor() as cur:
+        if product_ids is not None:
+            cur.execute(FEED_BY_ID_QUERY, (list(product_ids),))
+        elif skus is not None:
+            cur.execute(FEED_BY_SKU_QUERY, (list(skus),))
+        else:
+            cur.execute(_feed_source())
+
+        return _collect(cur, ProductRecord.from_row)
+
+
+def fetch_products_copy():
+    """
+    Whole-catalogue fetch through COPY ... TO STDOUT (FORMAT csv). The
+    server sends one text stream in large chunks instead of typed rows;
+    the csv module splits it and each row goes straight into a
+    ProductRecord, skipping psycopg2's per-value type conversion.
+    """
+    buffer = io.StringIO()
+    with _feed_cursor() as cur:
+        cur.copy_expert(COPY_QUERY.format(source=_feed_source()), buffer, size=COPY_BUFFER_SIZE)
+
+    buffer.seek(0)
+    return list(map(ProductRecord.from_csv, csv.reader(buffer)))
+
+
+def _collect(cur, convert=None):
+    rows = []
+    while batch := cur.fetchmany(FETCH_BATCH_SIZE):
+        rows.extend(batch if convert is None else map(convert, batch))
+    return rows
+
+
+def partition_ranges(low, high, partitions):
+    """Split low..high into at most `partitions` contiguous inclusive id ranges."""
+    step = -(-(high - low + 1) // partitions)
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def _fetch_range(pool, snapshot, query, bounds, convert):
+    conn = instrument_connection(pool.getconn())
+    try:
+        conn.set_session(isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        cur = conn.cursor()
+        # Must be the first statement of the transaction.
+        cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        cur.execute(query, bounds)
+        rows = _collect(cur, convert)
+        cur.close()
+        return rows
+    finally:
+        if not conn.closed:
+            conn.rollback()
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def fetch_partitioned(query, convert=None, partitions=None):
     """
-    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-        SELECT
-            p.id,
-            p.sku,
-            p.name AS title,
-            p.description,
-            v.price,
-            v.old_price,
-            pi.image AS image_url,
-            p.is_new,
-            v.color,
-            v.size,
-            v.age,
-            p.active AS is_active
-        FROM products p
-        LEFT JOIN LATERAL (
-            SELECT * FROM product_variants
-            WHERE product_id = p.id
-            ORDER BY id ASC
-            LIMIT 1
-        ) v ON true
-        LEFT JOIN LATERAL (
-            SELECT * FROM product_images
-            WHERE product_id = p.id
-            ORDER BY "order" ASC
-            LIMIT 1
-        ) pi ON true
-        WHERE p.active = TRUE
-    """)
-
-    rows = cur.fetchall()
+    Run a whole-catalogue query (with a {source} placeholder and a
+    RANGE_FILTER) as product-id ranges fetched concurrently on pooled
+    connections to the same server. Every range imports the snapshot
+    exported by the feed_snapshot() transaction, so together they read the
+    same catalogue as the sync's other reads. Results are concatenated in
+    id-range order.
+    """
+    session = _read_session.get()
+    if session is None:
+        with feed_snapshot():
+            return fetch_partitioned(query, convert, partitions)
+
+    # The snapshot's own transaction exports it, and stays open until
+    # every range has imported it.
+    dsn, coordinator = session
+    partitions = partitions or FETCH_PARTITIONS
+    query = query.format(source=_feed_source())
+    table = FEED_VIEW if feed_view_enabled() else "products"
+    pool = _get_fetch_pool(partitions, dsn)
+
+    cur = coordinator.cursor()
+    cur.execute(PARTITION_BOUNDS_QUERY.format(table=table))
+    snapshot, low, high = cur.fetchone()
+    cur.close()
+    if low is None:
+        return []
+
+    ranges = partition_ranges(low, high, partitions)
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="feed-fetch") as executor:
+        # Each range runs in a copy of this thread's context, so a
+        # profiled sync's ledger sees its queries too.
+        parts = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _fetch_range, pool, snapshot, query, bounds, convert,
+            )
+            for bounds in ranges
+        ]
+        return [row for part in parts for row in part.result()]
+
+
+def fetch_row_hashes():
+    """
+    Phase one of a full fetch: SKU -> md5 of its feed row, for every active
+    product, read from the same source as fetch_products().
+    """
+    if FETCH_PARTITIONS > 1:
+        return dict(fetch_partitioned(ROW_HASH_QUERY + RANGE_FILTER))
+
+    hashes = {}
+    with _feed_cursor() as cur:
+        cur.execute(ROW_HASH_QUERY.format(source=_feed_source()))
+        while rows := cur.fetchmany(FETCH_BATCH_SIZE):
+            hashes.update(rows)
+
+    return hashes
+
+
+def fetch_changed_products(skus):
+    """
+    Phase two of a full fetch: full records for the given SKUs, from the
+    same source and with the same active filter as fetch_products().
+    """
+    with _feed_cursor() as cur:
+        cur.execute(CHANGED_ROWS_QUERY.format(source=_feed_source()), (list(skus),))
+        return _collect(cur, ProductRecord.from_row)
+
+
+def feed_fingerprint():
+    """
+    Fingerprint of the tables fetch_products reads, so a sync can tell in
+    one round trip that nothing has changed since the last one.
+
+    The counters are only a change signal: edits to columns the feed does
+    not use, and rolled-back writes, move them too, which just means a
+    regular sync runs. Postgres publishes a backend's counters up to a few
+    seconds after it commits, so a change that lands too late for one run
+    is picked up by the next.
+
+    Always read on the primary: a standby keeps its own statistics, which
+    replayed writes do not move.
+    """
+    conn = _connect()
+    cur = conn.cursor()
+
+    tables = [FEED_VIEW] if feed_view_enabled() else list(CHANGE_TRIGGER_TABLES)
+    cur.execute(FINGERPRINT_QUERY, (tables,))
+    fingerprint = cur.fetchone()[0]
 
     cur.close()
     conn.close()
 
-    products = []
-    for row in rows:
-        products.append({
-            "id": row["sku"],
-            "title": row["title"],
-            "description": row["description"] or "",
-            "availability": "in_stock",
-            "link": f"https://www.revoque.com.ng/products/{row['sku']}",
-            "image link": row["image_url"] or "https://www.revoque.com.ng/placeholder.jpg",
-            "price": float(row["price"]) if row["price"] else 0.0,
-            "condition": "new" if row["is_new"] else "used",
-            "color": row["color"] or "",
-            "size": row["size"] or "",
-            "age group": row["age"] or "",
-            "is_active": row["is_active"]
-        })
-
-    return products
+    return fingerprint
+
+
+def fetch_price_availability():
+    """
+    Fetch only the fast-changing feed fields for the price/availability sync.
+
+    Always reads the live tables: the query is narrow and the point of the
+    fast lane is to not wait for the next view refresh.
+    """
+    with _feed_cursor() as cur:
+        cur.execute(PRICE_AVAILABILITY_QUERY)
+        rows = cur.fetchall()
+
+    return [
+        {
+            "id": sku,
+            "price": float(price) if price else 0.0,
+            "availability": availability_for(inventory),
+        }
+        for sku, price, inventory in rows
+    ]
@@ -0,0 +1,106 @@
+import logging
+import os
+import select
+import threading
+import time
+
+from src.db import CHANGE_CHANNEL, _connect
+from src.sync import sync_product_ids
+
+logger = logging.getLogger(__name__)
+
+CHANGE_WINDOW_SECONDS = float(os.getenv("FEED_CHANGE_WINDOW_SECONDS", "2"))
+RECONNECT_DELAY_SECONDS = 5
+
+# (thread, stop event) of the running listener, if any.
+_listener = None
+
+
+def listen(conn):
+    """Subscribe a connection to the catalogue change channel."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+    cur.close()
+
+
+def collect_changes(conn, stop, window=CHANGE_WINDOW_SECONDS, idle_timeout=1.0):
+    """
+    Wait up to idle_timeout for a change notification, then keep collecting
+    for `window` seconds so a burst of edits turns into a single write.
+    Returns the changed product ids, empty if nothing arrived.
+    """
+    product_ids = set()
+    deadline = None
+
+    while not stop.is_set():
+        timeout = idle_timeout if deadline is None else deadline - time.monotonic()
+        if timeout <= 0:
+            break
+
+        if select.select([conn], [], [], timeout)[0]:
+            conn.poll()
+            while conn.notifies:
+                product_ids.add(int(conn.notifies.pop(0).payload))
+            if product_ids and deadline is None:
+                deadline = time.monotonic() + window
+        elif deadline is None:
+            break
+
+    return product_ids
+
+
+def _run(stop):
+    # Survives reconnects and locked or failed syncs, so no change is dropped
+    # while this instance keeps listening.
+    pending = set()
+
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = _connect()
+            listen(conn)
+
+            while not stop.is_set():
+                pending = pending | collect_changes(conn, stop)
+                if not pending:
+                    continue
+
+                result = sync_product_ids(pending)
+                if result.get("status") == "locked":
+                    continue
+                logger.info("Synced %d changed products: %s", len(pending), result)
+                pending = set()
+        except Exception:
+            logger.exception("Change listener failed; retrying in %ss", RECONNECT_DELAY_SECONDS)
+            stop.wait(RECONNECT_DELAY_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_listener():
+    """Start the change listener thread unless one is already running."""
+    global _listener
+
+    if _listener and _listener[0].is_alive() and not _listener[1].is_set():
+        return
+
+    stop = threading.Event()
+    thread = threading.Thread(target=_run, args=(stop,), name="feed-change-listener", daemon=True)
+    thread.start()
+    _listener = (thread, stop)
+
+
+def stop_listener(timeout=None):
+    """Ask the listener to stop, waiting up to `timeout` seconds for it to finish."""
+    global _listener
+
+    if _listener is None:
+        return
+
+    thread, stop = _listener
+    stop.set()
+    if timeout:
+        thread.join(timeout)
+    _listener = None
@@ -1,17 +1,73 @@
 import os
+import threading
 from dotenv import load_dotenv
-import redis
 from src.jobs import JobStatus, JOB_TTL_SECONDS
 import json
+import math
 import time
 
 load_dotenv()
 
-redis_client = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True, max_connections=10)
+
+class _LazyRedis:
+    """
+    Stands in for the Redis client until it is first used, so importing this
+    module neither imports redis nor builds a connection pool.
+    """
+
+    _client = None
+    _lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+
+                    self._client = redis.from_url(
+                        os.getenv("REDIS_URL"), decode_responses=True, max_connections=10
+                    )
+        return getattr(self._client, name)
+
+
+redis_client = _LazyRedis()
+
+JOB_INDEX_KEY = "sync:jobs"
 
 LOCK_KEY = "merchant_feed_sync_lock"
 LOCK_TTL = 300  # seconds
 
+PLAN_TTL_SECONDS = int(os.getenv("SYNC_PLAN_TTL_SECONDS", "900"))
+CHECKPOINT_KEY = "sync:checkpoint"
+
+# Catalogue fingerprint as of the last successful full sync.
+FINGERPRINT_KEY = "sync:fingerprint"
+
+# Product id -> sheet row number, kept in step with every write that moves rows.
+ROW_INDEX_KEY = "sync:rows"
+ROW_INDEX_BATCH = 10000
+
+# SKU -> md5 of the feed row last written to the sheet, for the two-phase fetch.
+ROW_HASH_KEY = "sync:row_hashes"
+
+LEADER_KEY = "merchant_feed_scheduler_leader"
+LEADER_TTL = int(os.getenv("SCHEDULER_LEADER_TTL", "30"))  # seconds
+
+# Only the current holder may extend or drop the leader key.
+_RENEW_LEADER = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEADER = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 
 def acquire_lock():
     return redis_client.set(LOCK_KEY, "locked", nx=True, ex=LOCK_TTL)
@@ -21,31 +77,258 @@ def release_lock():
     redis_client.delete(LOCK_KEY)
 
 
-def create_job(job_id: str):
-    redis_client.hset(
-        f"sync:job:{job_id}",
+def acquire_leadership(instance_id: str):
+    """Become scheduler leader, or stay leader by renewing the key we already hold."""
+    if redis_client.set(LEADER_KEY, instance_id, nx=True, ex=LEADER_TTL):
+        return True
+    return bool(redis_client.eval(_RENEW_LEADER, 1, LEADER_KEY, instance_id, LEADER_TTL))
+
+
+def release_leadership(instance_id: str):
+    redis_client.eval(_RELEASE_LEADER, 1, LEADER_KEY, instance_id)
+
+
+def _job_key(job_id: str):
+    return f"sync:job:{job_id}"
+
+
+def _queue_create_job(pipe, job_id: str, fields):
+    created_at = time.time()
+    key = _job_key(job_id)
+
+    pipe.hset(
+        key,
         mapping={
             "status": JobStatus.pending,
-            "created_at": time.time(),
+            "created_at": created_at,
+            **fields,
         },
     )
-    redis_client.expire(f"sync:job:{job_id}", JOB_TTL_SECONDS)
+    pipe.expire(key, JOB_TTL_SECONDS)
+    pipe.zadd(JOB_INDEX_KEY, {job_id: created_at})
+    # Trim index entries older than any job hash that can still exist.
+    pipe.zremrangebyscore(JOB_INDEX_KEY, "-inf", f"({created_at - JOB_TTL_SECONDS}")
+
+
+def create_job(job_id: str, **fields):
+    pipe = redis_client.pipeline()
+    _queue_create_job(pipe, job_id, fields)
+    pipe.execute()
+
+# Job fields stored as JSON.
+JSON_JOB_FIELDS = ("result", "profile")
+
 
 def update_job(job_id: str, **fields):
-    if "result" in fields:
-        fields["result"] = json.dumps(fields["result"])
+    for name in JSON_JOB_FIELDS:
+        if name in fields:
+            fields[name] = json.dumps(fields[name])
+
+    key = _job_key(job_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping=fields)
+    pipe.expire(key, JOB_TTL_SECONDS)
+    pipe.execute()
 
-    redis_client.hset(f"sync:job:{job_id}", mapping=fields)
+
+def _decode_job(data):
+    for name in JSON_JOB_FIELDS:
+        if name in data:
+            data[name] = json.loads(data[name])
+    return data
 
 
 def get_job(job_id: str):
-    data = redis_client.hgetall(f"sync:job:{job_id}")
+    data = redis_client.hgetall(_job_key(job_id))
     if not data:
         return None
 
-    if "result" in data:
-        data["result"] = json.loads(data["result"])
+    return _decode_job(data)
 
-    return data
+
+def _decode_jobs(job_ids, results):
+    return [
+        {"job_id": job_id, **_decode_job(data)}
+        for job_id, data in zip(job_ids, results)
+        if data
+    ]
+
+
+def _get_jobs(job_ids):
+    pipe = redis_client.pipeline()
+    for job_id in job_ids:
+        pipe.hgetall(_job_key(job_id))
+    return _decode_jobs(job_ids, pipe.execute())
+
+
+def _history_range(limit: int, cursor: str | None):
+    """zrevrangebyscore arguments for one page of job history."""
+    return (
+        (JOB_INDEX_KEY, f"({cursor}" if cursor else "+inf", "-inf"),
+        {"start": 0, "num": limit, "withscores": True},
+    )
+
+
+def _next_cursor(entries, limit: int):
+    return repr(entries[-1][1]) if len(entries) == limit else None
+
+
+def list_jobs(limit: int = 20, cursor: str | None = None):
+    """
+    Newest jobs first. The cursor is the created_at of the last job on the
+    previous page; pass it back to get the next, older page.
+    """
+    args, kwargs = _history_range(limit, cursor)
+    entries = redis_client.zrevrangebyscore(*args, **kwargs)
+
+    return {
+        "jobs": _get_jobs([job_id for job_id, _ in entries]),
+        "next_cursor": _next_cursor(entries, limit),
+    }
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def summarise_jobs(jobs):
+    """Duration and throughput percentiles over decoded jobs."""
+    durations = []
+    rates = []
+    for job in jobs:
+        if job["status"] != JobStatus.success or "started_at" not in job:
+            continue
+        duration = float(job["finished_at"]) - float(job["started_at"])
+        durations.append(duration)
+
+        result = job.get("result") or {}
+        rows = sum(result.get(key, 0) for key in ("inserted", "updated", "deleted"))
+        if duration > 0:
+            rates.append(rows / duration)
+
+    durations.sort()
+    rates.sort()
+
+    return {
+        "jobs": len(jobs),
+        "succeeded": sum(job["status"] == JobStatus.success for job in jobs),
+        "failed": sum(job["status"] == JobStatus.failed for job in jobs),
+        "duration_seconds": {"p50": _percentile(durations, 50), "p95": _percentile(durations, 95)},
+        "rows_per_second": {"p50": _percentile(rates, 50), "p95": _percentile(rates, 95)},
+    }
+
+
+def job_stats(last: int = 100):
+    """Duration and throughput percentiles over the most recent jobs."""
+    return summarise_jobs(_get_jobs(redis_client.zrevrange(JOB_INDEX_KEY, 0, last - 1)))
+
+
+def _profile_key(job_id: str):
+    return f"sync:job:{job_id}:profile"
+
+
+def save_profile(job_id: str, report):
+    """Keep a profiled job's full report for as long as the job itself."""
+    redis_client.set(_profile_key(job_id), json.dumps(report), ex=JOB_TTL_SECONDS)
+
+
+def _plan_key(plan_id: str):
+    return f"sync:plan:{plan_id}"
+
+
+def save_plan(plan):
+    redis_client.set(_plan_key(plan["plan_id"]), json.dumps(plan), ex=PLAN_TTL_SECONDS)
+
+
+def plan_exists(plan_id: str):
+    return bool(redis_client.exists(_plan_key(plan_id)))
+
+
+def load_plan(plan_id: str):
+    data = redis_client.get(_plan_key(plan_id))
+    return json.loads(data) if data else None
+
+
+def delete_plan(plan_id: str):
+    redis_client.delete(_plan_key(plan_id))
+
+
+def save_checkpoint(checkpoint):
+    redis_client.set(CHECKPOINT_KEY, json.dumps(checkpoint), ex=PLAN_TTL_SECONDS)
+
+
+def load_checkpoint():
+    data = redis_client.get(CHECKPOINT_KEY)
+    return json.loads(data) if data else None
+
+
+def clear_checkpoint():
+    redis_client.delete(CHECKPOINT_KEY)
+
+
+def save_fingerprint(fingerprint):
+    redis_client.set(FINGERPRINT_KEY, fingerprint)
+
+
+def load_fingerprint():
+    return redis_client.get(FINGERPRINT_KEY)
+
+
+def clear_fingerprint():
+    redis_client.delete(FINGERPRINT_KEY)
+
+
+def save_row_index(ids):
+    """Replace the row index with the ids of the sheet's data rows, in row order."""
+    rows = {pid: row for row, pid in enumerate(ids, start=2) if pid}
+
+    pipe = redis_client.pipeline()
+    pipe.delete(ROW_INDEX_KEY)
+    items = list(rows.items())
+    for start in range(0, len(items), ROW_INDEX_BATCH):
+        pipe.hset(ROW_INDEX_KEY, mapping=dict(items[start:start + ROW_INDEX_BATCH]))
+    pipe.execute()
+
+
+def add_rows(rows):
+    redis_client.hset(ROW_INDEX_KEY, mapping=rows)
+
+
+def lookup_rows(ids):
+    """Row numbers of the given ids that are indexed, and how many rows the index holds."""
+    ids = list(ids)
+    pipe = redis_client.pipeline()
+    pipe.hmget(ROW_INDEX_KEY, ids)
+    pipe.hlen(ROW_INDEX_KEY)
+    rows, size = pipe.execute()
+    return {pid: int(row) for pid, row in zip(ids, rows) if row}, size
+
+
+def load_row_index():
+    return {pid: int(row) for pid, row in redis_client.hgetall(ROW_INDEX_KEY).items()}
+
+
+def clear_row_index():
+    redis_client.delete(ROW_INDEX_KEY)
+
+
+def load_row_hashes():
+    return redis_client.hgetall(ROW_HASH_KEY)
+
+
+def update_row_hashes(changed, removed):
+    """Record the hashes of rows a sync has written and forget the SKUs it dropped."""
+    pipe = redis_client.pipeline()
+    items = list(changed.items())
+    for start in range(0, len(items), ROW_INDEX_BATCH):
+        pipe.hset(ROW_HASH_KEY, mapping=dict(items[start:start + ROW_INDEX_BATCH]))
+    for start in range(0, len(removed), ROW_INDEX_BATCH):
+        pipe.hdel(ROW_HASH_KEY, *removed[start:start + ROW_INDEX_BATCH])
+    pipe.execute()
 
 
+def clear_row_hashes():
+    redis_client.delete(ROW_HASH_KEY)
@@ -1,76 +1,143 @@
-import time
 import uuid
 from contextlib import asynccontextmanager
+from typing import Literal
 
 from dotenv import load_dotenv
-from fastapi import BackgroundTasks, FastAPI, HTTPException
-
-from src.jobs import JobStatus
-from src.locks import create_job, get_job, update_job
-from src.scheduler import start_scheduler
-from src.sync import sync_products
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+
+from src.async_locks import (
+    close_async_redis,
+    create_job,
+    get_job,
+    get_profile,
+    job_stats,
+    list_jobs,
+    plan_exists,
+)
+from src.db import (
+    change_notify_enabled,
+    close_fetch_pool,
+    create_change_triggers,
+    create_feed_view,
+    feed_view_enabled,
+    refresh_feed_view,
+)
+from src.runner import run_sync_job
+from src.scheduler import start_scheduler, stop_scheduler
+from src.sync import dry_run_sync
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     load_dotenv()
+    if feed_view_enabled():
+        create_feed_view()
+    if change_notify_enabled():
+        create_change_triggers()
     start_scheduler()
     yield
+    stop_scheduler()
+    close_fetch_pool()
+    await close_async_redis()
 
 
 app = FastAPI(title="Google Merchant Feed Service", lifespan=lifespan)
 
-def run_sync_job(job_id: str):
-    update_job(
-        job_id,
-        status=JobStatus.running,
-        started_at=time.time(),
-        step="starting",
-    )
-
-    try:
-        update_job(job_id, step="syncing products")
-        result = sync_products()
-
-        update_job(
-            job_id,
-            status=JobStatus.success,
-            finished_at=time.time(),
-            step="completed",
-            result=result,
-        )
-
-    except Exception as e:
-        update_job(
-            job_id,
-            status=JobStatus.failed,
-            finished_at=time.time(),
-            error=str(e),
-        )
-        raise
+MAX_SYNC_SKUS = 1000
+
 
+class ProductSyncRequest(BaseModel):
+    skus: list[str] = Field(min_length=1, max_length=MAX_SYNC_SKUS)
 
+# Handlers are async and only touch Redis through the async client, so they
+# never queue behind background syncs for a threadpool worker.
 @app.post("/sync")
-def start_sync(background_tasks: BackgroundTasks):
+async def start_sync(
+    background_tasks: BackgroundTasks,
+    mode: Literal["full", "fast"] = "full",
+    dry_run: bool = False,
+    plan_id: str | None = None,
+    force: bool = False,
+    profile: bool = False,
+):
+    if (dry_run or plan_id) and mode != "full":
+        raise HTTPException(status_code=400, detail="Plans are only supported for full syncs")
+    if force and mode != "full":
+        raise HTTPException(status_code=400, detail="Only full syncs skip unchanged catalogues")
+
+    if dry_run and profile:
+        raise HTTPException(status_code=400, detail="Only sync jobs can be profiled")
+
+    if dry_run:
+        return await run_in_threadpool(dry_run_sync)
+
+    if plan_id and not await plan_exists(plan_id):
+        raise HTTPException(status_code=404, detail="Plan not found")
+
     job_id = str(uuid.uuid4())
 
-    create_job(job_id)
-    background_tasks.add_task(run_sync_job, job_id)
+    fields = {"plan_id": plan_id} if plan_id else {}
+    if profile:
+        fields["profiled"] = 1
+    await create_job(job_id, trigger="api", mode=mode, **fields)
+    background_tasks.add_task(run_sync_job, job_id, mode, plan_id, force=force, profile=profile)
 
     return {
         "job_id": job_id,
         "status": "started",
     }
 
+@app.post("/sync/products")
+async def sync_selected_products(request: ProductSyncRequest, background_tasks: BackgroundTasks):
+    skus = list(dict.fromkeys(request.skus))
+    job_id = str(uuid.uuid4())
+
+    await create_job(job_id, trigger="api", mode="products", sku_count=len(skus))
+    background_tasks.add_task(run_sync_job, job_id, "products", skus=skus)
+
+    return {
+        "job_id": job_id,
+        "status": "started",
+    }
+
+@app.get("/sync")
+async def sync_history(limit: int = Query(20, ge=1, le=100), cursor: str | None = None):
+    return await list_jobs(limit, cursor)
+
+# Declared before /sync/{job_id}, which would otherwise match "stats".
+@app.get("/sync/stats")
+async def sync_stats(last: int = Query(100, ge=1, le=1000)):
+    return await job_stats(last)
+
 @app.get("/sync/{job_id}")
-def sync_status(job_id: str):
-    job = get_job(job_id)
+async def sync_status(job_id: str):
+    job = await get_job(job_id)
 
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
     return job
 
+@app.get("/sync/{job_id}/profile")
+async def sync_profile(job_id: str):
+    report = await get_profile(job_id)
+
+    if not report:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return report
+
+@app.post("/feed/refresh")
+async def refresh_feed(background_tasks: BackgroundTasks):
+    if not feed_view_enabled():
+        raise HTTPException(status_code=409, detail="Feed view is not enabled")
+
+    background_tasks.add_task(refresh_feed_view)
+
+    return {"status": "refreshing"}
+
 @app.get("/")
-def health():
+async def health():
     return {"status": "ok"}
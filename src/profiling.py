@@ -0,0 +1,172 @@
+"""
+Opt-in profiling of a single sync job.
+
+Inside profiled(), the job's thread runs under cProfile with tracemalloc
+tracking peak memory, and every outbound Sheets request and database query
+made from that thread is written to a call ledger. Nothing is recorded
+outside profiled(); the hooks only look up a context variable.
+"""
+
+import cProfile
+import contextvars
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+# Entries beyond this are only counted in the totals.
+LEDGER_LIMIT = 5000
+TOP_FUNCTIONS = 50
+SUMMARY_FUNCTIONS = 5
+
+_ledger = contextvars.ContextVar("sync_call_ledger", default=None)
+
+
+def ledger_active():
+    return _ledger.get() is not None
+
+
+def record_call(kind, operation, seconds, **sizes):
+    """Add one outbound call to the active ledger, if the current job is profiled."""
+    ledger = _ledger.get()
+    if ledger is None:
+        return
+
+    totals = ledger["totals"].setdefault(kind, {"calls": 0, "seconds": 0.0})
+    totals["calls"] += 1
+    totals["seconds"] += seconds
+    for key, value in sizes.items():
+        if isinstance(value, int) and key != "status":
+            totals[key] = totals.get(key, 0) + value
+
+    if len(ledger["calls"]) < LEDGER_LIMIT:
+        ledger["calls"].append({
+            "kind": kind,
+            "operation": operation,
+            "at": round(time.perf_counter() - ledger["started"], 6),
+            "seconds": round(seconds, 6),
+            **sizes,
+        })
+
+
+def record_sheets_response(response, *args, **kwargs):
+    """requests response hook: ledger entry for one Sheets API call."""
+    if not ledger_active():
+        return
+
+    request = response.request
+    path = request.path_url.split("?", 1)[0]
+    body = request.body or b""
+    record_call(
+        "sheets",
+        f"{request.method} {path}",
+        # Time to the response headers; the body is read right after the hook.
+        response.elapsed.total_seconds(),
+        status=response.status_code,
+        bytes_sent=len(body),
+        bytes_received=len(response.content),
+    )
+
+
+class LedgerCursor(psycopg2.extensions.cursor):
+    """Cursor that writes each query and COPY it runs to the ledger."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_call(
+                "db", _operation(query), time.perf_counter() - started, rows=max(self.rowcount, 0)
+            )
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_call(
+                "db", _operation(sql), time.perf_counter() - started,
+                rows=max(self.rowcount, 0), bytes_received=file.tell(),
+            )
+
+
+def _operation(query):
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    return " ".join(str(query).split())[:120]
+
+
+def instrument_connection(conn):
+    """Give a (possibly pooled) connection ledger cursors while a profiled job runs."""
+    conn.cursor_factory = LedgerCursor if ledger_active() else psycopg2.extensions.cursor
+    return conn
+
+
+def _functions(profiler):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            "function": f"{name} ({'/'.join(filename.split('/')[-2:])}:{line})",
+            "calls": calls,
+            "total_seconds": round(total, 6),
+            "cumulative_seconds": round(cumulative, 6),
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _) in rows[:TOP_FUNCTIONS]
+    ]
+
+
+@contextmanager
+def profiled():
+    """
+    Profile the block. Yields a dict that is filled in when the block
+    exits, even by an exception, with "summary" (small enough to store with
+    the job) and the full "ledger" and "functions" lists.
+
+    cProfile only sees the calling thread, and tracemalloc counts every
+    thread's allocations, so a concurrent fast-lane sync inflates the peak.
+    """
+    report = {}
+    ledger = {"started": time.perf_counter(), "calls": [], "totals": {}}
+    token = _ledger.set(ledger)
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    else:
+        tracemalloc.reset_peak()
+
+    profiler = cProfile.Profile()
+    cpu_started = time.thread_time()
+    profiler.enable()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        wall = time.perf_counter() - ledger["started"]
+        cpu = time.thread_time() - cpu_started
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+        _ledger.reset(token)
+
+        functions = _functions(profiler)
+        totals = ledger["totals"]
+        outbound = sum(kind["seconds"] for kind in totals.values())
+
+        report["summary"] = {
+            "wall_seconds": round(wall, 6),
+            "cpu_seconds": round(cpu, 6),
+            "peak_memory_bytes": peak,
+            "calls": totals,
+            # Time spent neither waiting on Sheets nor on Postgres: row
+            # building, diffing, JSON encoding and the profiler's own cost.
+            "local_seconds": round(max(wall - outbound, 0.0), 6),
+            "top_functions": functions[:SUMMARY_FUNCTIONS],
+            "ledger_truncated": sum(kind["calls"] for kind in totals.values()) > len(ledger["calls"]),
+        }
+        report["ledger"] = ledger["calls"]
+        report["functions"] = functions
@@ -0,0 +1,75 @@
+import time
+from contextlib import nullcontext
+
+from src.jobs import JobStatus
+from src.locks import save_profile, update_job
+from src.profiling import profiled
+from src.sheets import reset_sheets_cache
+from src.sync import sync_price_availability, sync_products, sync_skus
+
+
+STEPS = {
+    "fast": "syncing prices and availability",
+    "products": "syncing selected products",
+    "full": "syncing products",
+}
+
+
+def _run(mode, plan_id, skus, force):
+    if mode == "fast":
+        return sync_price_availability()
+    if mode == "products":
+        return sync_skus(skus)
+    return sync_products(plan_id=plan_id, force=force)
+
+
+def _profile_fields(job_id, report):
+    """Store the full profile on its own key and return the summary to keep on the job."""
+    if not report:
+        return {}
+    save_profile(job_id, report)
+    return {"profile": report["summary"]}
+
+
+def run_sync_job(
+    job_id: str,
+    mode: str = "full",
+    plan_id: str | None = None,
+    skus: list[str] | None = None,
+    force: bool = False,
+    profile: bool = False,
+):
+    update_job(
+        job_id,
+        status=JobStatus.running,
+        started_at=time.time(),
+        step=STEPS[mode],
+    )
+
+    report = None
+    try:
+        with profiled() if profile else nullcontext() as report:
+            result = _run(mode, plan_id, skus, force)
+
+        update_job(
+            job_id,
+            status=JobStatus.success,
+            finished_at=time.time(),
+            step="completed",
+            result=result,
+            **_profile_fields(job_id, report),
+        )
+        return result
+
+    except Exception as e:
+        update_job(
+            job_id,
+            status=JobStatus.failed,
+            finished_at=time.time(),
+            error=str(e),
+            **_profile_fields(job_id, report),
+        )
+        # A stale worksheet handle or dead session would fail every later
+        # sync too, so start the next one from fresh credentials.
+        reset_sheets_cache()
+        raise
@@ -1,9 +1,140 @@
+import logging
+import os
+import socket
+import uuid
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from src.db import change_notify_enabled, feed_view_enabled, refresh_feed_view
+from src.listener import RECONNECT_DELAY_SECONDS, start_listener, stop_listener
+from src.locks import LEADER_TTL, acquire_leadership, create_job, release_leadership
+from src.runner import run_sync_job
 
-from src.sync import sync_products
+logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
 
+# Unique per process, so every uvicorn worker in every pod competes separately.
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+ELECTION_JOB_ID = "leader-election"
+SCHEDULED_JOB_IDS = ("full-sync", "fast-sync", "feed-view-refresh")
+
+
+def build_trigger(cron=None, interval_minutes=None, jitter=None):
+    """
+    Build a cron trigger from a standard 5-field crontab expression, or an
+    interval trigger when no expression is given. Jitter is in seconds.
+    """
+    jitter = jitter or None
+    if cron:
+        values = cron.split()
+        if len(values) != 5:
+            raise ValueError(f"Wrong number of cron fields; got {len(values)}, expected 5")
+        minute, hour, day, month, day_of_week = values
+        return CronTrigger(
+            minute=minute,
+            hour=hour,
+            day=day,
+            month=month,
+            day_of_week=day_of_week,
+            jitter=jitter,
+        )
+    return IntervalTrigger(minutes=interval_minutes, jitter=jitter)
+
+
+def run_scheduled_sync(mode="full"):
+    """Run a scheduled sync through the job system so it is tracked like API runs."""
+    job_id = str(uuid.uuid4())
+    create_job(job_id, trigger="schedule", mode=mode)
+    run_sync_job(job_id, mode)
+
+
+def _add_scheduled_jobs():
+    jitter = int(os.getenv("SYNC_JITTER_SECONDS", "0"))
+
+    scheduler.add_job(
+        run_scheduled_sync,
+        build_trigger(
+            os.getenv("SYNC_CRON"),
+            int(os.getenv("SYNC_INTERVAL_MINUTES", "300")),
+            jitter,
+        ),
+        id="full-sync",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        run_scheduled_sync,
+        build_trigger(
+            os.getenv("FAST_SYNC_CRON"),
+            int(os.getenv("FAST_SYNC_INTERVAL_MINUTES", "5")),
+            jitter,
+        ),
+        args=("fast",),
+        id="fast-sync",
+        replace_existing=True,
+    )
+    if feed_view_enabled():
+        scheduler.add_job(
+            refresh_feed_view,
+            build_trigger(interval_minutes=int(os.getenv("FEED_VIEW_REFRESH_MINUTES", "15"))),
+            id="feed-view-refresh",
+            replace_existing=True,
+        )
+
+
+def _remove_scheduled_jobs():
+    for job_id in SCHEDULED_JOB_IDS:
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+
+
+def elect_leader():
+    """
+    Claim or renew scheduler leadership. Only the leader holds the sync jobs
+    and the change listener; every other process just keeps trying in case
+    the leader goes away.
+    """
+    try:
+        leader = acquire_leadership(INSTANCE_ID)
+    except Exception:
+        logger.exception("Scheduler leader election failed")
+        leader = False
+
+    scheduling = scheduler.get_job("full-sync") is not None
+
+    if leader and not scheduling:
+        logger.info("Instance %s is now the scheduler leader", INSTANCE_ID)
+        _add_scheduled_jobs()
+        if change_notify_enabled():
+            start_listener()
+    elif not leader and scheduling:
+        logger.info("Instance %s lost scheduler leadership", INSTANCE_ID)
+        _remove_scheduled_jobs()
+        stop_listener()
+
+    return leader
+
+
 def start_scheduler():
-    scheduler.add_job(sync_products, "interval", minutes=300)
+    scheduler.add_job(
+        elect_leader,
+        "interval",
+        seconds=max(1, LEADER_TTL // 3),
+        id=ELECTION_JOB_ID,
+        replace_existing=True,
+    )
     scheduler.start()
+    elect_leader()
+
+
+def stop_scheduler():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    stop_listener(timeout=RECONNECT_DELAY_SECONDS)
+    try:
+        release_leadership(INSTANCE_ID)
+    except Exception:
+        logger.exception("Failed to release scheduler leadership")
@@ -1,18 +1,105 @@
-import gspread
-from google.oauth2.service_account import Credentials
+import logging
+import threading
+import time
+
 import os, json, base64
 
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+SHEETS_HTTP_POOL_SIZE = int(os.getenv("SHEETS_HTTP_POOL_SIZE", "10"))
+
+# Google APIs only gzip responses for clients that ask for it in both headers.
+USER_AGENT = "google-merchant-feed-service (gzip)"
+
+_client = None
+_worksheets = {}
+_cache_lock = threading.Lock()
+
+
+def _authorized_session(creds):
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+
+    from src.profiling import record_sheets_response
+
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=SHEETS_HTTP_POOL_SIZE, pool_maxsize=SHEETS_HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip", "User-Agent": USER_AGENT})
+    # No-op unless the calling thread is running a profiled sync.
+    session.hooks["response"].append(record_sheets_response)
+    return session
+
+
+def get_client():
+    """
+    Process-wide gspread client. The credentials refresh their token only
+    when it expires, and the session keeps its connections alive between syncs.
+    gspread and the Google auth libraries are imported on first use.
+    """
+    global _client
+
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    with _cache_lock:
+        if _client is None:
+            key_b64 = os.environ["GOOGLE_SERVICE_ACCOUNT_B64"]
+            creds_dict = json.loads(base64.b64decode(key_b64))
+            creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+            _client = gspread.authorize(creds, session=_authorized_session(creds))
+        return _client
+
 
 def get_sheet():
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+    spreadsheet_id = os.getenv("SPREADSHEET_ID")
+    sheet_name = os.getenv("SHEET_NAME", "Sheet1")
+    key = (spreadsheet_id, sheet_name)
+
+    started = time.perf_counter()
+    sheet = _worksheets.get(key)
+    cached = sheet is not None
+
+    if not cached:
+        sheet = get_client().open_by_key(spreadsheet_id).worksheet(sheet_name)
+        with _cache_lock:
+            sheet = _worksheets.setdefault(key, sheet)
+
+    logger.info(
+        "Opened worksheet %s in %.3fs (cached=%s)",
+        sheet_name, time.perf_counter() - started, cached,
+    )
+    return sheet
+
 
-    key_b64 = os.environ["GOOGLE_SERVICE_ACCOUNT_B64"]
-    creds_dict = json.loads(base64.b64decode(key_b64))
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    client = gspread.authorize(creds)
-    return client.open_by_key(os.getenv("SPREADSHEET_ID")).worksheet(os.getenv("SHEET_NAME", "Sheet1"))
+def reset_sheets_cache():
+    """Drop the cached client and worksheets, e.g. after the sheet was recreated."""
+    global _client
+
+    with _cache_lock:
+        if _client is not None:
+            _client.http_client.session.close()
+        _client = None
+        _worksheets.clear()
 
 
 def get_existing_rows(sheet):
     rows = sheet.get_all_records()
     return {str(row["id"]): idx + 2 for idx, row in enumerate(rows)}
+
+
+def get_existing_values(sheet):
+    """Map each product id in the sheet to its row number and current cell values."""
+    rows = sheet.get_all_values()
+    return {str(row[0]): (idx + 2, row) for idx, row in enumerate(rows[1:]) if row}
+
+
+def column_letter(index):
+    """Convert a 1-based column index to its A1 letters (1 -> A, 27 -> AA)."""
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
@@ -1,6 +1,42 @@
-from src.db import fetch_products
-from src.locks import acquire_lock, release_lock
-from src.sheets import get_existing_rows, get_sheet
+import hashlib
+import json
+import os
+import time
+import uuid
+from operator import itemgetter
+
+from src.db import (
+    ProductRecord,
+    feed_fingerprint,
+    feed_snapshot,
+    fetch_changed_products,
+    fetch_price_availability,
+    fetch_products,
+    fetch_row_hashes,
+)
+from src.locks import (
+    PLAN_TTL_SECONDS,
+    acquire_lock,
+    add_rows,
+    clear_checkpoint,
+    clear_fingerprint,
+    clear_row_hashes,
+    clear_row_index,
+    delete_plan,
+    load_checkpoint,
+    load_fingerprint,
+    load_plan,
+    load_row_hashes,
+    load_row_index,
+    lookup_rows,
+    release_lock,
+    save_checkpoint,
+    save_fingerprint,
+    save_plan,
+    save_row_index,
+    update_row_hashes,
+)
+from src.sheets import column_letter, get_existing_values, get_sheet
 
 EXPECTED_HEADERS = [
     "id", "title", "description", "availability", "link", "image link", "price",
@@ -10,100 +46,573 @@ EXPECTED_HEADERS = [
     "min energy efficiency class", "max energy efficiency class", "item group id", "sell on google quantity"
 ]
 
+FAST_SYNC_HEADERS = ("price", "availability")
+
+WRITE_BATCH_RANGES = int(os.getenv("SHEETS_WRITE_BATCH_RANGES", "500"))
+APPEND_BATCH_ROWS = int(os.getenv("SHEETS_APPEND_BATCH_ROWS", "5000"))
+
+# Sheets API default quota for write requests per minute per user.
+WRITE_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_WRITE_REQUESTS_PER_MINUTE", "60"))
+
 def get_headers(sheet):
     return sheet.row_values(1)
 
 
-def build_row_for_sheet(product, headers):
-    row = []
+def format_price(price):
+    return f"{price} NGN"
+
+
+def _price_cell(product):
+    return format_price(product.price)
+
+
+def _field(name):
+    return ProductRecord._fields.index(name)
+
+
+# Where each feed column comes from: a ProductRecord field index, a
+# formatter called with the record, or a constant cell value.
+HEADER_SOURCES = {
+    "id": _field("id"),
+    "title": _field("title"),
+    "description": _field("description"),
+    "availability": _field("availability"),
+    "link": _field("link"),
+    "image link": _field("image_link"),
+    "price": _price_cell,
+    "identifier exists": "no",
+    "gtin": "",
+    "mpn": "",
+    "brand": "Revoque",
+    "product highlight": "",
+    "product detail": "",
+    "additional image link": "",
+    "condition": _field("condition"),
+    "adult": "no",
+    "color": _field("color"),
+    "size": _field("size"),
+    "gender": "female",
+    "material": "100% Cotton",
+    "pattern": "",
+    "age group": _field("age_group"),
+    "multipack": "1",
+    "is bundle": "no",
+    "unit pricing measure": "",
+    "unit pricing base measure": "",
+    "energy efficiency class": "",
+    "min energy efficiency class": "",
+    "max energy efficiency class": "",
+    "item group id": "",
+    "sell on google quantity": "1",
+}
+
+
+def build_header_plan(headers):
+    """Resolve the sheet headers once, so building each row is a flat loop."""
+    return tuple(HEADER_SOURCES.get(header, "") for header in headers)
+
+
+def build_row(product, plan):
+    return [
+        product[source] if source.__class__ is int
+        else source if source.__class__ is str
+        else source(product)
+        for source in plan
+    ]
 
-    for header in headers:
-        row.append(map_product_to_header(product, header))
 
-    return row
+def build_row_for_sheet(product, headers):
+    return build_row(product, build_header_plan(headers))
 
 
 def map_product_to_header(p, header):
-    mapping = {
-        "id": p["id"],
-        "title": p["title"],
-        "description": p["description"],
-        "availability": "in_stock",
-        "link": p["link"],
-        "image link": p["image link"],
-        "price": f"{p['price']} NGN",
-        "identifier exists": "no",
-        "gtin": "",
-        "mpn": "",
-        "brand": "Revoque",
-        "product highlight": "",
-        "product detail": "",
-        "additional image link": "",
-        "condition": p["condition"],
-        "adult": "no",
-        "color": p["color"] or "",
-        "size": p["size"] or "",
-        "gender": "female",
-        "material": "100% Cotton",
-        "pattern": "",
-        "age group": p["age group"] or "",
-        "multipack": "1",
-        "is bundle": "no",
-        "unit pricing measure": "",
-        "unit pricing base measure": "",
-        "energy efficiency class": "",
-        "min energy efficiency class": "",
-        "max energy efficiency class": "",
-        "item group id": "",
-        "sell on google quantity": "1",
+    return build_row(p, build_header_plan((header,)))[0]
+
+
+def diff_row(old, new):
+    """Return inclusive (start, end) column runs where the new row differs from the old one."""
+    changed = [
+        col for col, value in enumerate(new)
+        if col >= len(old) or _cell(value) != old[col]
+    ]
+    return contiguous_runs(changed)
+
+
+def _cell(value):
+    return "" if value is None else str(value)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_changed(row_hashes, known_hashes, existing):
+    """
+    Phase two of a full fetch: only the products whose row hash differs from
+    the one stored when their row was last written, or that are missing
+    from the sheet. With no stored hashes the whole catalogue is fetched.
+    """
+    if not known_hashes:
+        return fetch_products()
+
+    wanted = [
+        sku for sku, row_hash in row_hashes.items()
+        if known_hashes.get(sku) != row_hash or sku not in existing
+    ]
+    return fetch_changed_products(wanted) if wanted else []
+
+
+def plan_sync(sheet, products=None, row_hashes=None):
+    """
+    Read and diff phases of a full sync: work out every write needed to bring
+    the sheet in line with the catalogue, without touching the sheet.
+
+    Given the phase-one row hashes, only new and changed products are
+    fetched and diffed; the rest are taken to match the sheet already.
+    """
+    headers = get_headers(sheet)
+    existing = get_existing_values(sheet)
+    known_hashes = {}
+    if row_hashes is not None:
+        known_hashes = load_row_hashes()
+        products = fetch_changed(row_hashes, known_hashes, existing)
+    elif products is None:
+        products = fetch_products()
+    header_plan = build_header_plan(headers)
+
+    to_insert = []
+    to_update = []
+    updated_rows = 0
+    active_ids = set(row_hashes or ())
+
+    for p in products:
+        row = build_row(p, header_plan)
+        pid = p.id
+        active_ids.add(pid)
+
+        if pid not in existing:
+            to_insert.append(row)
+            continue
+
+        idx, old = existing[pid]
+        runs = diff_row(old, row)
+        if runs:
+            updated_rows += 1
+        for start, end in runs:
+            to_update.append({
+                "range": f"{column_letter(start + 1)}{idx}:{column_letter(end + 1)}{idx}",
+                "values": [row[start:end + 1]],
+            })
+
+    stale = sorted(idx for pid, (idx, _) in existing.items() if pid not in active_ids)
+
+    row_ids = [""] * (max((idx for idx, _ in existing.values()), default=1) - 1)
+    for pid, (idx, _) in existing.items():
+        row_ids[idx - 2] = pid
+
+    plan = {
+        "plan_id": str(uuid.uuid4()),
+        "created_at": time.time(),
+        "headers": headers,
+        "sheet_rows": len(existing),
+        # Id of every data row, so the row index can be rebuilt once the plan is applied.
+        "row_ids": row_ids,
+        "catalogue_digest": (
+            catalogue_digest(products) if row_hashes is None else row_hashes_digest(row_hashes)
+        ),
+        "updates": to_update,
+        # Bottom-up, so each deletion leaves the rows above it where they were.
+        "deletes": list(reversed(contiguous_runs(stale))),
+        "inserts": to_insert,
+        "counts": {
+            "inserted": len(to_insert),
+            "updated": updated_rows,
+            "unchanged": len(active_ids) - len(to_insert) - updated_rows,
+            "updated_cells": sum(len(update["values"][0]) for update in to_update),
+            "deleted": len(stale),
+        },
+    }
+
+    if row_hashes is not None:
+        # Stored once the plan is applied, so a failed run fetches these again.
+        plan["row_hashes"] = {
+            "changed": {p.id: row_hashes[p.id] for p in products if p.id in row_hashes},
+            "removed": [sku for sku in known_hashes if sku not in row_hashes],
+        }
+
+    return plan
+
+
+def catalogue_digest(products):
+    """Fingerprint of the fetched catalogue, to tell whether a stored plan is still current."""
+    digest = hashlib.blake2b(digest_size=16)
+    for product in products:
+        digest.update(repr(product).encode())
+    return digest.hexdigest()
+
+
+def row_hashes_digest(row_hashes):
+    """catalogue_digest for a two-phase fetch, taken over the phase-one row hashes."""
+    digest = hashlib.blake2b(digest_size=16)
+    for sku in sorted(row_hashes):
+        digest.update(f"{sku}:{row_hashes[sku]}\n".encode())
+    return digest.hexdigest()
+
+
+def plan_chunks(plan):
+    """
+    Split a plan's writes into the ordered requests apply_plan sends, each
+    paired with how it changes the number of data rows in the sheet.
+    """
+    # Cell writes address rows by number, so they go out before any
+    # deletion shifts the rows below it.
+    for batch in _chunks(plan["updates"], WRITE_BATCH_RANGES):
+        yield "batch_update", batch, 0
+    for start, end in plan["deletes"]:
+        yield "delete_rows", (start, end), start - end - 1
+    for batch in _chunks(plan["inserts"], APPEND_BATCH_ROWS):
+        yield "append_rows", batch, len(batch)
+
+
+def estimate_plan(plan):
+    """Count the write requests a plan needs and how long the quota makes them take."""
+    requests = {"batch_update": 0, "delete_rows": 0, "append_rows": 0}
+    for kind, _, _ in plan_chunks(plan):
+        requests[kind] += 1
+    write_requests = sum(requests.values())
+
+    return {
+        "write_requests": write_requests,
+        "requests": requests,
+        "payload_bytes": len(json.dumps(plan["updates"])) + len(json.dumps(plan["inserts"])),
+        "estimated_seconds": round(write_requests * 60 / WRITE_REQUESTS_PER_MINUTE, 1),
+    }
+
+
+def _send(sheet, kind, payload):
+    if kind == "batch_update":
+        sheet.batch_update(payload, value_input_option="RAW")
+    elif kind == "delete_rows":
+        first, last = payload
+        if first == last:
+            sheet.delete_rows(first)
+        else:
+            sheet.delete_rows(first, last)
+    else:
+        sheet.append_rows(payload, value_input_option="RAW")
+
+
+def apply_plan(sheet, plan, start_chunk=0):
+    """
+    Write phase of a full sync. Progress is checkpointed after every request,
+    so a failed run can be resumed from the first chunk it did not apply.
+    The row index is dropped while rows move and rebuilt once all are applied.
+    """
+    sheet_rows = plan["sheet_rows"]
+    clear_row_index()
+
+    for index, (kind, payload, row_delta) in enumerate(plan_chunks(plan)):
+        sheet_rows += row_delta
+        if index < start_chunk:
+            continue
+
+        _send(sheet, kind, payload)
+
+        save_checkpoint({
+            "plan_id": plan["plan_id"],
+            "chunk": index,
+            "sheet_rows": sheet_rows,
+        })
+
+    if "row_ids" in plan:
+        save_row_index(applied_row_ids(plan))
+
+    return dict(plan["counts"])
+
+
+def applied_row_ids(plan):
+    """Ids of the sheet's data rows, in order, after the plan has been applied."""
+    deleted = {row for start, end in plan["deletes"] for row in range(start, end + 1)}
+    kept = [pid for row, pid in enumerate(plan["row_ids"], start=2) if row not in deleted]
+    return kept + [row[0] for row in plan["inserts"]]
+
+
+def count_sheet_rows(sheet):
+    return len(sheet.col_values(1)) - 1
+
+
+def _resume_point(sheet, plan):
+    """
+    First chunk of the plan still to apply, or None when the sheet no longer
+    looks the way the plan (or its last checkpoint) left it.
+    """
+    checkpoint = load_checkpoint()
+    if checkpoint and checkpoint["plan_id"] == plan["plan_id"]:
+        start, expected_rows = checkpoint["chunk"] + 1, checkpoint["sheet_rows"]
+    else:
+        start, expected_rows = 0, plan["sheet_rows"]
+
+    if get_headers(sheet) != plan["headers"] or count_sheet_rows(sheet) != expected_rows:
+        return None
+    return start
+
+
+def _resumable_plan(sheet, digest):
+    """The plan of an interrupted sync, if it can still be resumed as-is."""
+    checkpoint = load_checkpoint()
+    if not checkpoint:
+        return None, 0
+
+    plan = load_plan(checkpoint["plan_id"])
+    if plan and plan["catalogue_digest"] == digest:
+        start = _resume_point(sheet, plan)
+        if start is not None:
+            return plan, start
+
+    clear_checkpoint()
+    delete_plan(checkpoint["plan_id"])
+    return None, 0
+
+
+def dry_run_sync():
+    """
+    Plan a full sync without writing anything, and keep the plan so a later
+    sync_products(plan_id=...) can apply it without repeating the reads.
+    """
+    fingerprint = feed_fingerprint()
+    with feed_snapshot():
+        plan = plan_sync(get_sheet(), row_hashes=fetch_row_hashes())
+    plan["fingerprint"] = fingerprint
+    save_plan(plan)
+
+    return {
+        "plan_id": plan["plan_id"],
+        "expires_in": PLAN_TTL_SECONDS,
+        **plan["counts"],
+        "estimate": estimate_plan(plan),
+    }
+
+
+def sync_products(plan_id=None, force=False):
+    """
+    Full sync. Unless forced, or resuming an interrupted run, it first
+    compares the catalogue fingerprint with the one stored by the last
+    successful sync and stops there when nothing has changed.
+    """
+    if not acquire_lock():
+        return {"status": "locked"}
+
+    try:
+        if plan_id:
+            plan = load_plan(plan_id)
+            if plan is None:
+                raise ValueError(f"Sync plan {plan_id} not found or expired")
+            sheet = get_sheet()
+            start = _resume_point(sheet, plan)
+            if start is None:
+                delete_plan(plan_id)
+                raise ValueError(f"Sheet changed since sync plan {plan_id} was made")
+        else:
+            # Taken before the fetch, so edits made during the sync are picked up next time.
+            fingerprint = feed_fingerprint()
+            if not force and not load_checkpoint() and fingerprint == load_fingerprint():
+                return {"status": "unchanged"}
+
+            if force:
+                # Re-fetch and re-diff every row, not just the changed ones.
+                clear_row_hashes()
+
+            sheet = get_sheet()
+            # Both fetch phases read one snapshot, so phase two returns
+            # exactly the rows phase one hashed.
+            with feed_snapshot():
+                row_hashes = fetch_row_hashes()
+                plan, start = _resumable_plan(sheet, row_hashes_digest(row_hashes))
+                if plan is None:
+                    plan = plan_sync(sheet, row_hashes=row_hashes)
+            plan["fingerprint"] = fingerprint
+            save_plan(plan)
+
+        result = apply_plan(sheet, plan, start)
+
+        # Plans are single-use: once applied, the reads they were built from are stale.
+        clear_checkpoint()
+        delete_plan(plan["plan_id"])
+
+        if plan.get("fingerprint"):
+            save_fingerprint(plan["fingerprint"])
+        else:
+            clear_fingerprint()
+
+        if "row_hashes" in plan:
+            update_row_hashes(plan["row_hashes"]["changed"], plan["row_hashes"]["removed"])
+
+        return {**result, "resumed_from": start or None}
+    finally:
+        release_lock()
+
+
+def find_rows(sheet, ids):
+    """
+    Sheet rows of the given ids, and the number of data rows, from the row
+    index. The id cells at the indexed rows are read back in one request;
+    if any of them disagree, or there is no index, it is rebuilt from the
+    sheet's id column.
+    """
+    rows, row_count = lookup_rows(ids)
+
+    if row_count:
+        indexed = sorted(rows.items(), key=itemgetter(1))
+        cells = sheet.batch_get([f"A{row}" for _, row in indexed]) if indexed else []
+        if all(cell and cell[0] and str(cell[0][0]) == pid for (pid, _), cell in zip(indexed, cells)):
+            return rows, row_count
+
+    sheet_ids = [str(pid) for pid in sheet.col_values(1)[1:]]
+    save_row_index(sheet_ids)
+    wanted = set(ids)
+    return {pid: row for row, pid in enumerate(sheet_ids, start=2) if pid in wanted}, len(sheet_ids)
+
+
+def upsert_products(sheet, products):
+    """
+    Write just these products: rewrite the rows already in the sheet, append
+    new ones and delete inactive ones, finding rows through the row index
+    and keeping it in step. Nothing else in the sheet is read or touched;
+    products removed from the catalogue entirely are left to the next full
+    sync.
+    """
+    if not products:
+        return {"inserted": 0, "updated": 0, "deleted": 0}
+
+    headers = get_headers(sheet)
+    header_plan = build_header_plan(headers)
+    last_column = column_letter(len(headers))
+    rows, row_count = find_rows(sheet, [p.id for p in products])
+
+    updates = []
+    inserts = []
+    stale = []
+
+    for p in products:
+        idx = rows.get(p.id)
+        if not p.is_active:
+            if idx:
+                stale.append(idx)
+            continue
+
+        row = build_row(p, header_plan)
+        if idx is None:
+            inserts.append(row)
+        else:
+            updates.append({"range": f"A{idx}:{last_column}{idx}", "values": [row]})
+
+    writes = {
+        "updates": updates,
+        "deletes": list(reversed(contiguous_runs(sorted(stale)))),
+        "inserts": inserts,
     }
+    for kind, payload, _ in plan_chunks(writes):
+        _send(sheet, kind, payload)
+
+    inserted_ids = [row[0] for row in inserts]
+    if stale:
+        # Deleting rows moves every row below them, so renumber the whole index.
+        deleted = set(stale)
+        index = sorted(load_row_index().items(), key=itemgetter(1))
+        save_row_index([pid for pid, row in index if row not in deleted] + inserted_ids)
+    elif inserts:
+        add_rows({pid: row_count + 2 + offset for offset, pid in enumerate(inserted_ids)})
+
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(stale)}
+
+
+def _upsert_selected(requested, **selection):
+    if not acquire_lock():
+        return {"status": "locked"}
+
+    try:
+        products = fetch_products(**selection)
+        return {
+            "mode": "products",
+            **upsert_products(get_sheet(), products),
+            "missing": requested - len(products),
+        }
+    finally:
+        release_lock()
 
-    return mapping.get(header, "")
 
+def sync_product_ids(product_ids):
+    """Near-real-time lane: upsert the products behind a batch of change notifications."""
+    return _upsert_selected(len(set(product_ids)), product_ids=product_ids)
 
-def sync_products():
+
+def sync_skus(skus):
+    """Upsert just the given SKUs, e.g. straight after an admin edit."""
+    return _upsert_selected(len(set(skus)), skus=skus)
+
+
+def contiguous_runs(indices):
+    """Group sorted integers into inclusive (start, end) runs."""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return [tuple(run) for run in runs]
+
+
+def sync_price_availability():
+    """
+    Fast lane: rewrite only the price and availability cells of rows already
+    in the sheet. Inserts and deletes are left to the full sync.
+    """
     if not acquire_lock():
         return {"status": "locked"}
 
     try:
         sheet = get_sheet()
         headers = get_headers(sheet)
-        existing = get_existing_rows(sheet)
-        products = fetch_products()
+        columns = [headers.index(h) + 1 for h in ("id", *FAST_SYNC_HEADERS)]
 
-        to_insert = []
-        to_update = []
-        active_ids = set()
+        id_values, *current_columns = sheet.batch_get(
+            [f"{column_letter(c)}2:{column_letter(c)}" for c in columns]
+        )
+        products = {p["id"]: p for p in fetch_price_availability()}
 
-        for p in products:
-            row = build_row_for_sheet(p, headers)
-            pid = str(p["id"])
-            active_ids.add(pid)
+        ids = [row[0] if row else "" for row in id_values]
+        data = []
+        changed_rows = set()
 
-            if pid in existing:
-                to_update.append((existing[pid], row))
-            else:
-                to_insert.append(row)
+        for header, column, current in zip(FAST_SYNC_HEADERS, columns[1:], current_columns):
+            current = [row[0] if row else "" for row in current]
+            current += [""] * (len(ids) - len(current))
+            changed = {}
 
-        if to_insert:
-            sheet.append_rows(to_insert, value_input_option="RAW")
+            for offset, pid in enumerate(ids):
+                product = products.get(str(pid))
+                if product is None:
+                    continue
+                value = format_price(product["price"]) if header == "price" else product[header]
+                if value != current[offset]:
+                    changed[offset] = value
 
-        for idx, row in to_update:
-            sheet.update(
-                # [row],
-                f"A{idx}:{chr(64 + len(headers))}{idx}",
-                [row],
-                value_input_option="RAW",
-            )
+            letter = column_letter(column)
+            for start, end in contiguous_runs(sorted(changed)):
+                data.append({
+                    "range": f"{letter}{start + 2}:{letter}{end + 2}",
+                    "values": [[changed[offset]] for offset in range(start, end + 1)],
+                })
+            changed_rows.update(changed)
 
-        for pid, idx in existing.items():
-            if pid not in active_ids:
-                sheet.delete_rows(idx)
+        if data:
+            sheet.batch_update(data, value_input_option="RAW")
 
         return {
-            "inserted": len(to_insert),
-            "updated": len(to_update),
-            "deleted": max(0, len(existing) - len(active_ids)),
+            "mode": "fast",
+            "updated": len(changed_rows),
+            "missing": len(products.keys() - set(map(str, ids))),
         }
     finally:
         release_lock()
@@ -1,24 +1,38 @@
+import os
+import uuid
 from unittest.mock import MagicMock
 
 import pytest
 
+from src.db import ProductRecord
+from src.sheets import reset_sheets_cache
+
+
+@pytest.fixture(autouse=True)
+def sheets_cache():
+    """Start every test without a cached Sheets client or worksheet."""
+    reset_sheets_cache()
+    yield
+    reset_sheets_cache()
+
 
 @pytest.fixture
 def mock_product():
     """Sample product data structure."""
-    return {
-        "id": "SKU-001",
-        "title": "Test Product",
-        "description": "A test product description",
-        "link": "https://www.revoque.com.ng/products/SKU-001",
-        "image link": "https://example.com/image.jpg",
-        "price": 1000.0,
-        "condition": "new",
-        "color": "Red",
-        "size": "M",
-        "age group": "adult",
-        "is_active": True,
-    }
+    return ProductRecord(
+        id="SKU-001",
+        title="Test Product",
+        description="A test product description",
+        availability="in_stock",
+        link="https://www.revoque.com.ng/products/SKU-001",
+        image_link="https://example.com/image.jpg",
+        price=1000.0,
+        condition="new",
+        color="Red",
+        size="M",
+        age_group="adult",
+        is_active=True,
+    )
 
 
 @pytest.fixture
@@ -26,14 +40,13 @@ def mock_products(mock_product):
     """Multiple sample products."""
     return [
         mock_product,
-        {
-            **mock_product,
-            "id": "SKU-002",
-            "title": "Another Product",
-            "price": 2000.0,
-            "color": "Blue",
-            "condition": "used",
-        },
+        mock_product._replace(
+            id="SKU-002",
+            title="Another Product",
+            price=2000.0,
+            color="Blue",
+            condition="used",
+        ),
     ]
 
 
@@ -104,6 +117,7 @@ def mock_redis_client():
     redis_client.delete = MagicMock()
     redis_client.hset = MagicMock()
     redis_client.hgetall.return_value = {}
+    redis_client.get.return_value = None
     redis_client.expire = MagicMock()
     return redis_client
 
@@ -116,3 +130,103 @@ def mock_db_connection():
     conn.cursor.return_value = cur
     cur.fetchall.return_value = []
     return conn, cur
+
+
+CATALOGUE_SCHEMA = """
+    CREATE TABLE products (
+        id SERIAL PRIMARY KEY,
+        sku VARCHAR UNIQUE NOT NULL,
+        name VARCHAR NOT NULL,
+        description TEXT,
+        active BOOLEAN DEFAULT TRUE,
+        is_new BOOLEAN DEFAULT FALSE
+    );
+    CREATE TABLE product_variants (
+        id SERIAL PRIMARY KEY,
+        product_id INTEGER REFERENCES products(id),
+        price DECIMAL(10, 2),
+        old_price DECIMAL(10, 2),
+        color VARCHAR,
+        size VARCHAR,
+        age VARCHAR,
+        inventory INTEGER DEFAULT 0
+    );
+    CREATE TABLE product_images (
+        id SERIAL PRIMARY KEY,
+        product_id INTEGER REFERENCES products(id),
+        image VARCHAR NOT NULL,
+        "order" INTEGER DEFAULT 0
+    );
+"""
+
+
+@pytest.fixture
+def pg_database_url(monkeypatch):
+    """
+    Throwaway catalogue schema on the Postgres at TEST_DATABASE_URL.
+
+    DATABASE_URL is pointed at the schema through search_path, so the code
+    under test runs its queries unchanged.
+    """
+    base_url = os.getenv("TEST_DATABASE_URL")
+    if not base_url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    import psycopg2
+
+    schema = f"feed_test_{uuid.uuid4().hex[:8]}"
+    conn = psycopg2.connect(base_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+    cur.execute(CATALOGUE_SCHEMA)
+
+    separator = "&" if "?" in base_url else "?"
+    url = f"{base_url}{separator}options=-csearch_path%3D{schema}"
+    monkeypatch.setenv("DATABASE_URL", url)
+
+    yield url
+
+    cur.execute(f"DROP SCHEMA {schema} CASCADE")
+    cur.close()
+    conn.close()
+
+
+@pytest.fixture
+def pg_cursor(pg_database_url):
+    """Autocommit cursor on the throwaway catalogue schema, for seeding."""
+    import psycopg2
+
+    conn = psycopg2.connect(pg_database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    yield cur
+    cur.close()
+    conn.close()
+
+
+@pytest.fixture
+def seed_product(pg_cursor):
+    """Insert an active-by-default product with one variant and an optional image."""
+
+    def seed(sku, name="Product", active=True, price="1000.00", inventory=2, image=None):
+        pg_cursor.execute(
+            "INSERT INTO products (sku, name, description, active, is_new) "
+            "VALUES (%s, %s, 'desc', %s, TRUE) RETURNING id",
+            (sku, name, active),
+        )
+        product_id = pg_cursor.fetchone()[0]
+        pg_cursor.execute(
+            "INSERT INTO product_variants (product_id, price, color, size, age, inventory) "
+            "VALUES (%s, %s, 'Red', 'M', 'adult', %s)",
+            (product_id, price, inventory),
+        )
+        if image:
+            pg_cursor.execute(
+                "INSERT INTO product_images (product_id, image) VALUES (%s, %s)",
+                (product_id, image),
+            )
+        return product_id
+
+    return seed
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.async_locks import (
+    _LazyAsyncRedis,
+    create_job,
+    get_job,
+    job_stats,
+    list_jobs,
+    plan_exists,
+)
+from src.jobs import JOB_TTL_SECONDS, JobStatus
+from src.locks import JOB_INDEX_KEY
+
+
+@pytest.fixture
+def async_redis(monkeypatch):
+    """Async Redis client whose commands and pipeline execute are awaitable."""
+    client = MagicMock()
+    for command in ("hgetall", "zrevrangebyscore", "zrevrange", "exists"):
+        setattr(client, command, AsyncMock())
+    client.pipeline.return_value.execute = AsyncMock()
+    monkeypatch.setattr("src.async_locks.async_redis_client", client)
+    return client
+
+
+class TestLazyAsyncRedisClient:
+    """Tests for the lazily created async Redis client."""
+
+    def test_pool_settings(self, monkeypatch):
+        """Test that the pool is bounded, blocking and uses the configured timeouts."""
+        monkeypatch.setenv("REDIS_URL", "redis://localhost:6379")
+        client = _LazyAsyncRedis()
+
+        with patch("redis.asyncio.BlockingConnectionPool.from_url") as mock_from_url:
+            client.get
+            client.get
+
+        mock_from_url.assert_called_once_with(
+            "redis://localhost:6379",
+            decode_responses=True,
+            max_connections=50,
+            timeout=5.0,
+            socket_timeout=5.0,
+            socket_connect_timeout=2.0,
+        )
+
+    def test_close_without_client(self):
+        """Test that shutting down before any request is a no-op."""
+        asyncio.run(_LazyAsyncRedis().close())
+
+
+class TestAsyncJobs:
+    """Tests for the async job queries."""
+
+    def test_create_job(self, async_redis):
+        """Test that the job hash and index entry are written in one pipeline."""
+        pipe = async_redis.pipeline.return_value
+
+        asyncio.run(create_job("job-1", trigger="api", mode="full"))
+
+        mapping = pipe.hset.call_args.kwargs["mapping"]
+        assert mapping["status"] == JobStatus.pending
+        assert mapping["trigger"] == "api"
+        pipe.expire.assert_called_once_with("sync:job:job-1", JOB_TTL_SECONDS)
+        pipe.zadd.assert_called_once()
+        pipe.execute.assert_awaited_once()
+
+    def test_get_job(self, async_redis):
+        """Test that the stored result is decoded."""
+        async_redis.hgetall.return_value = {
+            "status": JobStatus.success,
+            "result": json.dumps({"updated": 2}),
+        }
+
+        job = asyncio.run(get_job("job-1"))
+
+        async_redis.hgetall.assert_awaited_once_with("sync:job:job-1")
+        assert job["result"] == {"updated": 2}
+
+    def test_get_missing_job(self, async_redis):
+        """Test that an unknown job is None."""
+        async_redis.hgetall.return_value = {}
+
+        assert asyncio.run(get_job("job-404")) is None
+
+    def test_list_jobs(self, async_redis):
+        """Test that a page is read from the index and fetched in one pipeline."""
+        async_redis.zrevrangebyscore.return_value = [("job-2", 200.0), ("job-1", 100.0)]
+        async_redis.pipeline.return_value.execute.return_value = [
+            {"status": JobStatus.running},
+            {},
+        ]
+
+        page = asyncio.run(list_jobs(limit=2, cursor="300.0"))
+
+        async_redis.zrevrangebyscore.assert_awaited_once_with(
+            JOB_INDEX_KEY, "(300.0", "-inf", start=0, num=2, withscores=True
+        )
+        assert page == {
+            "jobs": [{"job_id": "job-2", "status": JobStatus.running}],
+            "next_cursor": "100.0",
+        }
+
+    def test_job_stats(self, async_redis):
+        """Test that stats are summarised the same way as the sync client's."""
+        async_redis.zrevrange.return_value = ["job-1"]
+        async_redis.pipeline.return_value.execute.return_value = [{
+            "status": JobStatus.success,
+            "started_at": "100.0",
+            "finished_at": "104.0",
+            "result": json.dumps({"inserted": 40}),
+        }]
+
+        stats = asyncio.run(job_stats(last=10))
+
+        async_redis.zrevrange.assert_awaited_once_with(JOB_INDEX_KEY, 0, 9)
+        assert stats["duration_seconds"] == {"p50": 4.0, "p95": 4.0}
+        assert stats["rows_per_second"] == {"p50": 10.0, "p95": 10.0}
+
+    def test_plan_exists(self, async_redis):
+        """Test that plans are looked up by key."""
+        async_redis.exists.return_value = 1
+
+        assert asyncio.run(plan_exists("plan-1")) is True
+        async_redis.exists.assert_awaited_once_with("sync:plan:plan-1")
@@ -0,0 +1,108 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.cli import EXIT_FAILED, EXIT_LOCKED, EXIT_OK, main
+
+
+class TestSyncCommand:
+    """Tests for the sync command."""
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_success(self, mock_create_job, mock_run_sync_job, capsys):
+        """Test that a CLI sync is tracked as a job and exits cleanly."""
+        mock_run_sync_job.return_value = {"inserted": 1, "updated": 2, "deleted": 0}
+
+        assert main(["sync"]) == EXIT_OK
+
+        job_id = mock_create_job.call_args[0][0]
+        mock_create_job.assert_called_once_with(job_id, trigger="cli", mode="full")
+        mock_run_sync_job.assert_called_once_with(job_id, "full", None, force=False)
+        output = json.loads(capsys.readouterr().out)
+        assert output == {"job_id": job_id, "result": {"inserted": 1, "updated": 2, "deleted": 0}}
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_fast_mode_with_plan_rejected(self, mock_create_job, mock_run_sync_job):
+        """Test that plans are refused for fast syncs before anything runs."""
+        with pytest.raises(SystemExit) as exc:
+            main(["sync", "--mode", "fast", "--plan-id", "plan-1"])
+
+        assert exc.value.code == 2
+        mock_create_job.assert_not_called()
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_with_plan(self, mock_create_job, mock_run_sync_job):
+        """Test applying a stored plan from the command line."""
+        mock_run_sync_job.return_value = {"inserted": 0, "updated": 0, "deleted": 0}
+
+        assert main(["sync", "--plan-id", "plan-1"]) == EXIT_OK
+
+        job_id = mock_create_job.call_args[0][0]
+        mock_create_job.assert_called_once_with(job_id, trigger="cli", mode="full", plan_id="plan-1")
+        mock_run_sync_job.assert_called_once_with(job_id, "full", "plan-1", force=False)
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_force(self, mock_create_job, mock_run_sync_job):
+        """Test that --force skips the unchanged-catalogue check."""
+        mock_run_sync_job.return_value = {"inserted": 0, "updated": 0, "deleted": 0}
+
+        assert main(["sync", "--force"]) == EXIT_OK
+
+        assert mock_run_sync_job.call_args[1] == {"force": True}
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_unchanged(self, mock_create_job, mock_run_sync_job):
+        """Test that a sync skipped for an unchanged catalogue is a success."""
+        mock_run_sync_job.return_value = {"status": "unchanged"}
+
+        assert main(["sync"]) == EXIT_OK
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_locked(self, mock_create_job, mock_run_sync_job):
+        """Test that losing the lock to another sync is a retryable exit."""
+        mock_run_sync_job.return_value = {"status": "locked"}
+
+        assert main(["sync"]) == EXIT_LOCKED
+
+    @patch("src.runner.run_sync_job")
+    @patch("src.locks.create_job")
+    def test_sync_failure(self, mock_create_job, mock_run_sync_job, capsys):
+        """Test that a failed sync exits non-zero and reports the error."""
+        mock_run_sync_job.side_effect = Exception("Sheet not found")
+
+        assert main(["sync"]) == EXIT_FAILED
+
+        error = json.loads(capsys.readouterr().err)
+        assert error["status"] == "failed"
+        assert error["error"] == "Sheet not found"
+
+
+class TestColdStart:
+    """Tests for what the CLI imports."""
+
+    def test_cli_does_not_import_api_or_heavy_clients(self):
+        """Test that starting the CLI skips the API stack and connects nowhere."""
+        code = (
+            "import sys, src.cli, src.runner; "
+            "print(sorted(m for m in ('fastapi', 'uvicorn', 'apscheduler', 'redis', 'gspread') "
+            "if m in sys.modules))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).resolve().parents[1],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+        assert output.strip() == "[]"
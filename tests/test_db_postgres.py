@@ -0,0 +1,267 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.db import (
+    close_fetch_pool,
+    feed_fingerprint,
+    feed_snapshot,
+    fetch_changed_products,
+    fetch_price_availability,
+    fetch_products,
+    fetch_products_copy,
+    fetch_row_hashes,
+)
+
+
+class TestInventoryAvailability:
+    """Tests for inventory-aware availability against a local Postgres."""
+
+    def test_availability_sums_all_variants(self, pg_cursor, seed_product):
+        """Test that stock on any variant keeps a product in stock."""
+        product_id = seed_product("SKU-001", inventory=0)
+        pg_cursor.execute(
+            "INSERT INTO product_variants (product_id, price, inventory) VALUES (%s, 900, 4)",
+            (product_id,),
+        )
+        seed_product("SKU-002", inventory=0)
+
+        availability = {p.id: p.availability for p in fetch_products()}
+
+        assert availability == {"SKU-001": "in_stock", "SKU-002": "out_of_stock"}
+
+    def test_fast_lane_matches_full_fetch(self, seed_product):
+        """Test that the narrow query agrees with fetch_products on price and stock."""
+        seed_product("SKU-001", price="1500.00", inventory=3)
+        seed_product("SKU-002", price="250.50", inventory=0)
+        seed_product("SKU-003", active=False)
+
+        full = {p.id: (p.price, p.availability) for p in fetch_products()}
+        fast = {p["id"]: (p["price"], p["availability"]) for p in fetch_price_availability()}
+
+        assert fast == full
+        assert fast["SKU-002"] == (250.5, "out_of_stock")
+
+
+class TestTargetedFetch:
+    """Tests for fetching selected products against a local Postgres."""
+
+    def test_fetch_by_sku(self, seed_product):
+        """Test that only the requested SKUs come back, inactive ones included."""
+        seed_product("SKU-001")
+        seed_product("SKU-002")
+        seed_product("SKU-003", active=False)
+
+        products = fetch_products(skus=["SKU-001", "SKU-003", "SKU-404"])
+
+        assert sorted((p.id, p.is_active) for p in products) == [("SKU-001", True), ("SKU-003", False)]
+
+
+class TestTwoPhaseFetch:
+    """Tests for row hashes and changed-row fetches against a local Postgres."""
+
+    def test_hash_follows_feed_fields(self, pg_cursor, seed_product):
+        """Test that a product's hash moves with its feed row and nothing else's does."""
+        product_id = seed_product("SKU-001")
+        seed_product("SKU-002")
+        seed_product("SKU-003", active=False)
+        before = fetch_row_hashes()
+
+        pg_cursor.execute("UPDATE product_variants SET inventory = 0 WHERE product_id = %s", (product_id,))
+        after = fetch_row_hashes()
+
+        assert set(before) == {"SKU-001", "SKU-002"}
+        assert after["SKU-001"] != before["SKU-001"]
+        assert after["SKU-002"] == before["SKU-002"]
+
+    def test_changed_rows_match_full_fetch(self, seed_product):
+        """Test that phase two returns the same records as a full fetch, active only."""
+        seed_product("SKU-001", image="a.jpg")
+        seed_product("SKU-002")
+        seed_product("SKU-003", active=False)
+
+        changed = fetch_changed_products(["SKU-001", "SKU-003", "SKU-404"])
+        full = {p.id: p for p in fetch_products()}
+
+        assert changed == [full["SKU-001"]]
+
+
+class TestCopyExport:
+    """Tests for the COPY-based catalogue export against a local Postgres."""
+
+    def test_matches_cursor_fetch(self, pg_cursor, seed_product):
+        """Test that COPY rows parse into the same records as the cursor fetch."""
+        seed_product("SKU-001", image="a.jpg")
+        seed_product("SKU-002", price="0", inventory=0)
+        seed_product("SKU-003", active=False)
+        pg_cursor.execute(
+            "INSERT INTO products (sku, name, description) VALUES "
+            "('SKU-004', 'Quoted, \"odd\" name', %s), ('SKU-005', 'No variant', NULL)",
+            ('Line one,\nline "two"',),
+        )
+
+        products = fetch_products_copy()
+
+        assert sorted(products) == sorted(fetch_products())
+        assert len(products) == 4
+
+    def test_fetch_mode_copy(self, seed_product, monkeypatch):
+        """Test that DB_FETCH_MODE=copy routes whole-catalogue fetches through COPY."""
+        seed_product("SKU-001")
+        monkeypatch.setattr("src.db.FETCH_MODE", "copy")
+
+        with patch("src.db.fetch_products_copy", wraps=fetch_products_copy) as copy:
+            assert [p.id for p in fetch_products()] == ["SKU-001"]
+            fetch_products(skus=["SKU-001"])
+
+        copy.assert_called_once()
+
+
+class TestPartitionedFetch:
+    """Tests for the parallel range-partitioned fetch against a local Postgres."""
+
+    @pytest.fixture
+    def catalogue(self, seed_product, monkeypatch):
+        """Twenty products, with every fifth inactive, read in three partitions."""
+        for i in range(20):
+            seed_product(f"SKU-{i:03}", active=i % 5 != 0, image=f"{i}.jpg")
+        monkeypatch.setattr("src.db.FETCH_PARTITIONS", 1)
+        expected = fetch_products()
+        hashes = fetch_row_hashes()
+
+        monkeypatch.setattr("src.db.FETCH_PARTITIONS", 3)
+        yield expected, hashes
+        close_fetch_pool()
+
+    def test_matches_single_connection_fetch(self, catalogue):
+        """Test that the merged partitions are the same records, in product id order."""
+        expected, _ = catalogue
+
+        products = fetch_products()
+
+        assert sorted(products) == sorted(expected)
+        assert [p.id for p in products] == sorted(p.id for p in products)
+
+    def test_row_hashes(self, catalogue):
+        """Test that phase-one hashes come out the same when partitioned."""
+        _, hashes = catalogue
+
+        assert fetch_row_hashes() == hashes
+
+    def test_reads_one_snapshot(self, catalogue, pg_database_url, monkeypatch):
+        """Test that a commit landing after the snapshot is exported is seen by no partition."""
+        import src.db
+
+        expected, _ = catalogue
+        split = src.db.partition_ranges
+
+        def split_after_write(low, high, partitions):
+            _write(pg_database_url, "UPDATE products SET name = 'Renamed'")
+            return split(low, high, partitions)
+
+        monkeypatch.setattr("src.db.partition_ranges", split_after_write)
+
+        assert sorted(fetch_products()) == sorted(expected)
+        assert {p.title for p in fetch_products()} == {"Renamed"}
+
+
+
+class TestFeedSnapshot:
+    """Tests for the per-sync read transaction against a local Postgres."""
+
+    def test_reads_share_one_snapshot(self, pg_database_url, seed_product):
+        """Test that a commit between two reads in one snapshot is seen by neither."""
+        seed_product("SKU-001")
+        seed_product("SKU-002")
+
+        with feed_snapshot():
+            hashes = fetch_row_hashes()
+            _write(pg_database_url, "UPDATE products SET name = 'Renamed'")
+            changed = fetch_changed_products(list(hashes))
+
+        assert {p.title for p in changed} == {"Product"}
+        assert {p.title for p in fetch_products()} == {"Renamed"}
+
+    def test_read_only(self, pg_database_url):
+        """Test that the snapshot transaction refuses writes."""
+        import psycopg2
+        import src.db
+
+        with feed_snapshot(), src.db._feed_cursor() as cur:
+            with pytest.raises(psycopg2.errors.ReadOnlySqlTransaction):
+                cur.execute("INSERT INTO products (sku, name) VALUES ('SKU-001', 'Product')")
+
+    def test_statement_timeout(self, pg_database_url, monkeypatch):
+        """Test that a feed read running past DB_READ_STATEMENT_TIMEOUT_MS is cancelled."""
+        import psycopg2
+        import src.db
+
+        monkeypatch.setattr("src.db.READ_STATEMENT_TIMEOUT_MS", 50)
+
+        with feed_snapshot(), src.db._feed_cursor() as cur:
+            with pytest.raises(psycopg2.errors.QueryCanceled):
+                cur.execute("SELECT pg_sleep(1)")
+
+    def test_replica_that_is_not_a_standby(self, pg_database_url, seed_product, monkeypatch):
+        """Test that a replica URL pointing at a primary-mode server counts as caught up."""
+        seed_product("SKU-001")
+        monkeypatch.setenv("DATABASE_REPLICA_URL", pg_database_url)
+
+        with patch("src.db.logger") as logger:
+            assert [p.id for p in fetch_products()] == ["SKU-001"]
+
+        logger.warning.assert_not_called()
+
+
+def _write(pg_database_url, sql, params=()):
+    """Run a write on its own connection and close it, so its table counters are published."""
+    import psycopg2
+
+    conn = psycopg2.connect(pg_database_url)
+    conn.autocommit = True
+    conn.cursor().execute(sql, params)
+    conn.close()
+
+
+def _fingerprint_after_writes(previous=None, timeout=5):
+    """Counters reach pg_stat a moment after the writing backend exits."""
+    deadline = time.monotonic() + timeout
+    fingerprint = feed_fingerprint()
+    while fingerprint == previous and time.monotonic() < deadline:
+        time.sleep(0.05)
+        fingerprint = feed_fingerprint()
+    return fingerprint
+
+
+class TestFeedFingerprint:
+    """Tests for the catalogue fingerprint against a local Postgres."""
+
+    def test_stable_until_catalogue_changes(self, pg_database_url):
+        """Test that the fingerprint only moves when a catalogue table is written."""
+        empty = feed_fingerprint()
+        _write(pg_database_url, "INSERT INTO products (sku, name) VALUES ('SKU-001', 'Product')")
+        before = _fingerprint_after_writes(empty)
+
+        assert before != empty
+        assert feed_fingerprint() == before
+
+        _write(pg_database_url, "UPDATE products SET name = 'Renamed' WHERE sku = 'SKU-001'")
+
+        assert _fingerprint_after_writes(before) != before
+
+    def test_deactivation_changes_fingerprint(self, pg_database_url):
+        """Test that a product leaving the feed changes the fingerprint."""
+        empty = feed_fingerprint()
+        _write(pg_database_url, "INSERT INTO products (sku, name) VALUES ('SKU-001', 'Product')")
+        before = _fingerprint_after_writes(empty)
+
+        _write(pg_database_url, "UPDATE products SET active = FALSE WHERE sku = 'SKU-001'")
+
+        assert _fingerprint_after_writes(before) != before
+
+    def test_covers_catalogue_tables(self, pg_cursor):
+        """Test that every table the feed is read from is part of the fingerprint."""
+        assert [part.split(":")[0] for part in feed_fingerprint().split(",")] == [
+            "product_images", "product_variants", "products",
+        ]
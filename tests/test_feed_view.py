@@ -0,0 +1,47 @@
+import pytest
+
+from src.db import FEED_VIEW, create_feed_view, fetch_products, refresh_feed_view
+
+
+@pytest.fixture
+def feed_view(pg_cursor, seed_product, monkeypatch):
+    seed_product("SKU-001", image="https://example.com/1.jpg")
+    seed_product("SKU-002", active=False)
+    create_feed_view()
+    monkeypatch.setenv("FEED_MATERIALIZED_VIEW", "true")
+    return pg_cursor
+
+
+class TestFeedView:
+    """Tests for the feed_products materialized view against a local Postgres."""
+
+    def test_view_matches_live_query(self, feed_view, monkeypatch):
+        """Test that reading the view returns the same products as the live join."""
+        from_view = fetch_products()
+        monkeypatch.setenv("FEED_MATERIALIZED_VIEW", "false")
+        from_tables = fetch_products()
+
+        assert from_view == from_tables
+        assert [p.id for p in from_view] == ["SKU-001"]
+
+    def test_view_is_stale_until_refreshed(self, feed_view, seed_product):
+        """Test that catalogue changes only show up after a refresh."""
+        seed_product("SKU-003")
+
+        assert {p.id for p in fetch_products()} == {"SKU-001"}
+
+        refresh_feed_view()
+
+        assert {p.id for p in fetch_products()} == {"SKU-001", "SKU-003"}
+
+    def test_create_feed_view_is_idempotent(self, feed_view):
+        """Test that creating the view twice keeps its indexes in place."""
+        create_feed_view()
+
+        feed_view.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", (FEED_VIEW,)
+        )
+        assert sorted(row[0] for row in feed_view.fetchall()) == [
+            f"{FEED_VIEW}_id_idx",
+            f"{FEED_VIEW}_sku_idx",
+        ]
@@ -0,0 +1,109 @@
+import select
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.db import create_change_triggers, fetch_products
+from src.listener import _run, collect_changes, listen
+
+
+@pytest.fixture
+def listening_conn(pg_database_url):
+    """A connection subscribed to the change channel, with the triggers installed."""
+    import psycopg2
+
+    create_change_triggers()
+    conn = psycopg2.connect(pg_database_url)
+    listen(conn)
+    yield conn
+    conn.close()
+
+
+class TestChangeTriggers:
+    """Tests for the change notification triggers against a local Postgres."""
+
+    def test_changes_notify_product_id(self, listening_conn, pg_cursor, seed_product):
+        """Test that edits to any catalogue table notify the owning product id."""
+        product_id = seed_product("SKU-001")
+        other_id = seed_product("SKU-002")
+        collect_changes(listening_conn, threading.Event(), window=0.1)
+
+        pg_cursor.execute("UPDATE product_variants SET inventory = 0 WHERE product_id = %s", (product_id,))
+        pg_cursor.execute("UPDATE products SET name = 'Renamed' WHERE id = %s", (other_id,))
+
+        assert collect_changes(listening_conn, threading.Event(), window=0.1) == {product_id, other_id}
+
+    def test_no_changes(self, listening_conn):
+        """Test that an idle channel returns no ids once the idle timeout passes."""
+        assert collect_changes(listening_conn, threading.Event(), idle_timeout=0.1) == set()
+
+    def test_create_change_triggers_is_idempotent(self, listening_conn, pg_cursor, seed_product):
+        """Test that reinstalling the triggers does not double the notifications."""
+        create_change_triggers()
+
+        product_id = seed_product("SKU-001")  # one product row, one variant row
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            select.select([listening_conn], [], [], 0.05)
+            listening_conn.poll()
+
+        assert [n.payload for n in listening_conn.notifies] == [str(product_id)] * 2
+
+    def test_deactivated_product_is_fetched(self, pg_cursor, seed_product):
+        """Test that a targeted fetch returns inactive products so they can be dropped."""
+        product_id = seed_product("SKU-001", active=False)
+
+        products = fetch_products(product_ids=[product_id])
+
+        assert [(p.id, p.is_active) for p in products] == [("SKU-001", False)]
+
+
+class TestListenerLoop:
+    """Tests for the listener thread loop."""
+
+    @patch("src.listener.sync_product_ids")
+    @patch("src.listener.collect_changes")
+    @patch("src.listener._connect")
+    def test_locked_changes_are_retried(self, mock_connect, mock_collect, mock_sync):
+        """Test that ids are kept and merged with later ones while another sync holds the lock."""
+        stop = threading.Event()
+
+        def collect(conn, stop_event):
+            if mock_collect.call_count == 3:
+                stop.set()
+            return {mock_collect.call_count}
+
+        mock_collect.side_effect = collect
+        mock_sync.side_effect = [{"status": "locked"}, {"updated": 2}, {"updated": 1}]
+
+        _run(stop)
+
+        assert [call[0][0] for call in mock_sync.call_args_list] == [{1}, {1, 2}, {3}]
+        mock_connect.return_value.close.assert_called_once()
+
+    @patch("src.listener.RECONNECT_DELAY_SECONDS", 0)
+    @patch("src.listener.sync_product_ids")
+    @patch("src.listener.collect_changes")
+    @patch("src.listener._connect")
+    def test_reconnects_after_failure(self, mock_connect, mock_collect, mock_sync):
+        """Test that a dropped connection is replaced and pending ids survive."""
+        stop = threading.Event()
+        first, second = MagicMock(), MagicMock()
+        mock_connect.side_effect = [first, second]
+
+        def collect(conn, stop_event):
+            if conn is first:
+                return {1}
+            stop.set()
+            return set()
+
+        mock_collect.side_effect = collect
+        mock_sync.side_effect = [Exception("sheet unavailable"), {"updated": 1}]
+
+        _run(stop)
+
+        assert [call[0][0] for call in mock_sync.call_args_list] == [{1}, {1}]
+        first.close.assert_called_once()
+        second.close.assert_called_once()
@@ -4,16 +4,54 @@ from unittest.mock import MagicMock, patch
 
 from src.jobs import JOB_TTL_SECONDS, JobStatus
 from src.locks import (
+    CHECKPOINT_KEY,
+    JOB_INDEX_KEY,
+    LEADER_KEY,
+    LEADER_TTL,
     LOCK_KEY,
     LOCK_TTL,
+    PLAN_TTL_SECONDS,
+    ROW_HASH_KEY,
+    ROW_INDEX_KEY,
+    _LazyRedis,
+    acquire_leadership,
     acquire_lock,
+    clear_checkpoint,
     create_job,
+    delete_plan,
     get_job,
+    job_stats,
+    list_jobs,
+    load_checkpoint,
+    load_plan,
+    lookup_rows,
+    release_leadership,
     release_lock,
+    save_checkpoint,
+    save_plan,
+    save_profile,
+    update_row_hashes,
+    save_row_index,
     update_job,
 )
 
 
+class TestLazyRedisClient:
+    """Tests for the lazily created Redis client."""
+
+    def test_client_created_on_first_use(self):
+        """Test that no client exists until a command is sent."""
+        client = _LazyRedis()
+        assert client._client is None
+
+        with patch("redis.from_url") as mock_from_url:
+            client.ping()
+            client.ping()
+
+        mock_from_url.assert_called_once()
+        assert mock_from_url.return_value.ping.call_count == 2
+
+
 class TestAcquireLock:
     """Tests for acquire_lock function."""
 
@@ -49,6 +87,48 @@ class TestReleaseLock:
         mock_redis.delete.assert_called_once_with(LOCK_KEY)
 
 
+class TestLeadership:
+    """Tests for scheduler leader election helpers."""
+
+    @patch("src.locks.redis_client")
+    def test_acquire_leadership_when_free(self, mock_redis):
+        """Test that a free leader key is claimed with a TTL."""
+        mock_redis.set.return_value = True
+
+        assert acquire_leadership("pod-a:1") is True
+
+        mock_redis.set.assert_called_once_with(LEADER_KEY, "pod-a:1", nx=True, ex=LEADER_TTL)
+        mock_redis.eval.assert_not_called()
+
+    @patch("src.locks.redis_client")
+    def test_acquire_leadership_renews_own_key(self, mock_redis):
+        """Test that the current leader keeps leadership by renewing its key."""
+        mock_redis.set.return_value = None
+        mock_redis.eval.return_value = 1
+
+        assert acquire_leadership("pod-a:1") is True
+
+        args = mock_redis.eval.call_args[0]
+        assert args[1:] == (1, LEADER_KEY, "pod-a:1", LEADER_TTL)
+
+    @patch("src.locks.redis_client")
+    def test_acquire_leadership_held_by_other(self, mock_redis):
+        """Test that another instance's key is neither taken nor renewed."""
+        mock_redis.set.return_value = None
+        mock_redis.eval.return_value = 0
+
+        assert acquire_leadership("pod-b:7") is False
+
+    @patch("src.locks.redis_client")
+    def test_release_leadership_only_own_key(self, mock_redis):
+        """Test that leadership is released with a compare-and-delete."""
+        release_leadership("pod-a:1")
+
+        args = mock_redis.eval.call_args[0]
+        assert "del" in args[0]
+        assert args[1:] == (1, LEADER_KEY, "pod-a:1")
+
+
 class TestCreateJob:
     """Tests for create_job function."""
 
@@ -56,21 +136,45 @@ class TestCreateJob:
     def test_create_job(self, mock_redis):
         """Test job creation."""
         job_id = "test-job-123"
-        mock_redis.hset = MagicMock()
-        mock_redis.expire = MagicMock()
+        pipe = mock_redis.pipeline.return_value
 
         create_job(job_id)
 
         # Verify hset was called with correct parameters
-        mock_redis.hset.assert_called_once()
-        call_args = mock_redis.hset.call_args
+        pipe.hset.assert_called_once()
+        call_args = pipe.hset.call_args
         assert call_args[0][0] == f"sync:job:{job_id}"
         assert "status" in call_args[1]["mapping"]
         assert call_args[1]["mapping"]["status"] == JobStatus.pending
         assert "created_at" in call_args[1]["mapping"]
 
         # Verify expire was called
-        mock_redis.expire.assert_called_once_with(f"sync:job:{job_id}", JOB_TTL_SECONDS)
+        pipe.expire.assert_called_once_with(f"sync:job:{job_id}", JOB_TTL_SECONDS)
+        pipe.execute.assert_called_once()
+        mock_redis.hset.assert_not_called()
+
+    @patch("src.locks.redis_client")
+    def test_create_job_indexes_job(self, mock_redis):
+        """Test that new jobs are added to the history index by creation time."""
+        pipe = mock_redis.pipeline.return_value
+
+        create_job("test-job-123")
+
+        created_at = pipe.hset.call_args[1]["mapping"]["created_at"]
+        pipe.zadd.assert_called_once_with(JOB_INDEX_KEY, {"test-job-123": created_at})
+        pipe.zremrangebyscore.assert_called_once_with(
+            JOB_INDEX_KEY, "-inf", f"({created_at - JOB_TTL_SECONDS}"
+        )
+
+    @patch("src.locks.redis_client")
+    def test_create_job_with_extra_fields(self, mock_redis):
+        """Test that callers can record how a job was triggered."""
+        create_job("test-job-123", trigger="schedule", mode="fast")
+
+        mapping = mock_redis.pipeline.return_value.hset.call_args[1]["mapping"]
+        assert mapping["trigger"] == "schedule"
+        assert mapping["mode"] == "fast"
+        assert mapping["status"] == JobStatus.pending
 
 
 class TestUpdateJob:
@@ -80,34 +184,64 @@ class TestUpdateJob:
     def test_update_job_basic_fields(self, mock_redis):
         """Test updating job with basic fields."""
         job_id = "test-job-123"
-        mock_redis.hset = MagicMock()
+        pipe = mock_redis.pipeline.return_value
 
         update_job(job_id, status=JobStatus.running, step="syncing")
 
-        mock_redis.hset.assert_called_once()
-        call_args = mock_redis.hset.call_args
+        pipe.hset.assert_called_once()
+        call_args = pipe.hset.call_args
         assert call_args[0][0] == f"sync:job:{job_id}"
         assert call_args[1]["mapping"]["status"] == JobStatus.running
         assert call_args[1]["mapping"]["step"] == "syncing"
+        pipe.execute.assert_called_once()
+
+    @patch("src.locks.redis_client")
+    def test_update_job_refreshes_ttl(self, mock_redis):
+        """Test that a long-running job does not expire while it is updated."""
+        pipe = mock_redis.pipeline.return_value
+
+        update_job("test-job-123", step="syncing")
+
+        pipe.expire.assert_called_once_with("sync:job:test-job-123", JOB_TTL_SECONDS)
 
     @patch("src.locks.redis_client")
     def test_update_job_with_result(self, mock_redis):
         """Test updating job with result (should be JSON encoded)."""
         job_id = "test-job-123"
-        mock_redis.hset = MagicMock()
+        pipe = mock_redis.pipeline.return_value
         result = {"inserted": 10, "updated": 5, "deleted": 2}
 
         update_job(job_id, result=result)
 
-        mock_redis.hset.assert_called_once()
-        call_args = mock_redis.hset.call_args
+        pipe.hset.assert_called_once()
+        call_args = pipe.hset.call_args
         assert call_args[1]["mapping"]["result"] == json.dumps(result)
 
+    @patch("src.locks.redis_client")
+    def test_update_job_with_profile(self, mock_redis):
+        """Test that a profile summary is JSON encoded and decoded with the job."""
+        summary = {"wall_seconds": 1.5, "calls": {"db": {"calls": 2}}}
+
+        update_job("test-job-123", profile=summary)
+
+        mapping = mock_redis.pipeline.return_value.hset.call_args[1]["mapping"]
+        mock_redis.hgetall.return_value = dict(mapping)
+        assert get_job("test-job-123")["profile"] == summary
+
+    @patch("src.locks.redis_client")
+    def test_save_profile(self, mock_redis):
+        """Test that the full profile expires with its job."""
+        save_profile("test-job-123", {"summary": {}})
+
+        mock_redis.set.assert_called_once_with(
+            "sync:job:test-job-123:profile", json.dumps({"summary": {}}), ex=JOB_TTL_SECONDS
+        )
+
     @patch("src.locks.redis_client")
     def test_update_job_multiple_fields(self, mock_redis):
         """Test updating job with multiple fields."""
         job_id = "test-job-123"
-        mock_redis.hset = MagicMock()
+        pipe = mock_redis.pipeline.return_value
         current_time = time.time()
 
         update_job(
@@ -118,8 +252,8 @@ class TestUpdateJob:
             error=None,
         )
 
-        mock_redis.hset.assert_called_once()
-        call_args = mock_redis.hset.call_args
+        pipe.hset.assert_called_once()
+        call_args = pipe.hset.call_args
         mapping = call_args[1]["mapping"]
         assert mapping["status"] == JobStatus.success
         assert mapping["finished_at"] == current_time
@@ -187,3 +321,215 @@ class TestGetJob:
 
         assert result == mock_data
         assert "result" not in result
+
+
+class TestListJobs:
+    """Tests for list_jobs function."""
+
+    @patch("src.locks.redis_client")
+    def test_list_jobs_newest_first(self, mock_redis):
+        """Test that jobs are read from the index in one pipelined round trip."""
+        mock_redis.zrevrangebyscore.return_value = [("job-2", 200.0), ("job-1", 100.0)]
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [
+            {"status": JobStatus.running},
+            {"status": JobStatus.success, "result": json.dumps({"updated": 1})},
+        ]
+
+        page = list_jobs(limit=2)
+
+        mock_redis.zrevrangebyscore.assert_called_once_with(
+            JOB_INDEX_KEY, "+inf", "-inf", start=0, num=2, withscores=True
+        )
+        assert [job["job_id"] for job in page["jobs"]] == ["job-2", "job-1"]
+        assert page["jobs"][1]["result"] == {"updated": 1}
+        assert page["next_cursor"] == "100.0"
+        mock_redis.hgetall.assert_not_called()
+
+    @patch("src.locks.redis_client")
+    def test_list_jobs_cursor(self, mock_redis):
+        """Test that the cursor pages past the last job already returned."""
+        mock_redis.zrevrangebyscore.return_value = [("job-1", 100.0)]
+        mock_redis.pipeline.return_value.execute.return_value = [{"status": JobStatus.success}]
+
+        page = list_jobs(limit=2, cursor="200.0")
+
+        assert mock_redis.zrevrangebyscore.call_args[0][1] == "(200.0"
+        assert page["next_cursor"] is None
+
+    @patch("src.locks.redis_client")
+    def test_list_jobs_skips_expired(self, mock_redis):
+        """Test that index entries whose job hash expired are left out."""
+        mock_redis.zrevrangebyscore.return_value = [("job-2", 200.0), ("job-1", 100.0)]
+        mock_redis.pipeline.return_value.execute.return_value = [{}, {"status": JobStatus.success}]
+
+        page = list_jobs(limit=5)
+
+        assert [job["job_id"] for job in page["jobs"]] == ["job-1"]
+
+
+class TestJobStats:
+    """Tests for job_stats function."""
+
+    @patch("src.locks.redis_client")
+    def test_job_stats(self, mock_redis):
+        """Test duration and throughput percentiles over successful jobs."""
+        def job(duration, rows):
+            return {
+                "status": JobStatus.success,
+                "started_at": "100.0",
+                "finished_at": str(100.0 + duration),
+                "result": json.dumps({"inserted": rows, "updated": 0, "deleted": 0}),
+            }
+
+        mock_redis.zrevrange.return_value = ["a", "b", "c", "d"]
+        mock_redis.pipeline.return_value.execute.return_value = [
+            job(10, 100),
+            job(20, 100),
+            job(40, 100),
+            {"status": JobStatus.failed, "started_at": "100.0", "finished_at": "101.0"},
+        ]
+
+        stats = job_stats(last=4)
+
+        mock_redis.zrevrange.assert_called_once_with(JOB_INDEX_KEY, 0, 3)
+        assert stats["jobs"] == 4
+        assert stats["succeeded"] == 3
+        assert stats["failed"] == 1
+        assert stats["duration_seconds"] == {"p50": 20.0, "p95": 40.0}
+        assert stats["rows_per_second"] == {"p50": 5.0, "p95": 10.0}
+
+    @patch("src.locks.redis_client")
+    def test_job_stats_no_jobs(self, mock_redis):
+        """Test that stats are empty rather than failing without history."""
+        mock_redis.zrevrange.return_value = []
+        mock_redis.pipeline.return_value.execute.return_value = []
+
+        stats = job_stats()
+
+        assert stats["jobs"] == 0
+        assert stats["duration_seconds"] == {"p50": None, "p95": None}
+
+
+class TestSyncPlans:
+    """Tests for stored sync plans."""
+
+    @patch("src.locks.redis_client")
+    def test_save_plan_with_ttl(self, mock_redis):
+        """Test that plans are stored as JSON and expire."""
+        plan = {"plan_id": "plan-1", "updates": [], "deletes": [], "inserts": []}
+
+        save_plan(plan)
+
+        mock_redis.set.assert_called_once_with(
+            "sync:plan:plan-1", json.dumps(plan), ex=PLAN_TTL_SECONDS
+        )
+
+    @patch("src.locks.redis_client")
+    def test_load_plan(self, mock_redis):
+        """Test that stored plans are decoded, and missing ones return None."""
+        mock_redis.get.return_value = json.dumps({"plan_id": "plan-1"})
+        assert load_plan("plan-1") == {"plan_id": "plan-1"}
+
+        mock_redis.get.return_value = None
+        assert load_plan("plan-2") is None
+
+    @patch("src.locks.redis_client")
+    def test_delete_plan(self, mock_redis):
+        """Test that applied plans are removed."""
+        delete_plan("plan-1")
+
+        mock_redis.delete.assert_called_once_with("sync:plan:plan-1")
+
+
+class TestCheckpoints:
+    """Tests for sync write-phase checkpoints."""
+
+    @patch("src.locks.redis_client")
+    def test_checkpoint_round_trip(self, mock_redis):
+        """Test that checkpoints are stored as JSON with the plan TTL."""
+        checkpoint = {"plan_id": "plan-1", "chunk": 4, "sheet_rows": 100}
+
+        save_checkpoint(checkpoint)
+
+        mock_redis.set.assert_called_once_with(
+            CHECKPOINT_KEY, json.dumps(checkpoint), ex=PLAN_TTL_SECONDS
+        )
+        mock_redis.get.return_value = json.dumps(checkpoint)
+        assert load_checkpoint() == checkpoint
+
+    @patch("src.locks.redis_client")
+    def test_no_checkpoint(self, mock_redis):
+        """Test that a missing checkpoint loads as None."""
+        mock_redis.get.return_value = None
+
+        assert load_checkpoint() is None
+
+    @patch("src.locks.redis_client")
+    def test_clear_checkpoint(self, mock_redis):
+        """Test that completed syncs remove their checkpoint."""
+        clear_checkpoint()
+
+        mock_redis.delete.assert_called_once_with(CHECKPOINT_KEY)
+
+
+class TestRowIndex:
+    """Tests for the id -> row index."""
+
+    @patch("src.locks.redis_client")
+    def test_save_row_index_replaces_atomically(self, mock_redis):
+        """Test that the index is rebuilt in one pipeline and skips blank rows."""
+        pipe = mock_redis.pipeline.return_value
+
+        save_row_index(["SKU-001", "", "SKU-003"])
+
+        pipe.delete.assert_called_once_with(ROW_INDEX_KEY)
+        pipe.hset.assert_called_once_with(ROW_INDEX_KEY, mapping={"SKU-001": 2, "SKU-003": 4})
+        pipe.execute.assert_called_once()
+
+    @patch("src.locks.redis_client")
+    def test_save_empty_row_index(self, mock_redis):
+        """Test that an empty sheet just clears the index."""
+        pipe = mock_redis.pipeline.return_value
+
+        save_row_index([])
+
+        pipe.delete.assert_called_once_with(ROW_INDEX_KEY)
+        pipe.hset.assert_not_called()
+
+    @patch("src.locks.redis_client")
+    def test_lookup_rows(self, mock_redis):
+        """Test that only the requested ids are read, with the index size."""
+        mock_redis.pipeline.return_value.execute.return_value = [["2", None], 5]
+
+        rows, size = lookup_rows(["SKU-001", "SKU-404"])
+
+        mock_redis.pipeline.return_value.hmget.assert_called_once_with(ROW_INDEX_KEY, ["SKU-001", "SKU-404"])
+        assert rows == {"SKU-001": 2}
+        assert size == 5
+        mock_redis.hgetall.assert_not_called()
+
+
+class TestRowHashes:
+    """Tests for the stored per-SKU row hashes."""
+
+    @patch("src.locks.redis_client")
+    def test_update_row_hashes(self, mock_redis):
+        """Test that changed hashes are set and dropped SKUs removed in one pipeline."""
+        pipe = mock_redis.pipeline.return_value
+
+        update_row_hashes({"SKU-001": "a1"}, ["SKU-002", "SKU-003"])
+
+        pipe.hset.assert_called_once_with(ROW_HASH_KEY, mapping={"SKU-001": "a1"})
+        pipe.hdel.assert_called_once_with(ROW_HASH_KEY, "SKU-002", "SKU-003")
+        pipe.execute.assert_called_once()
+
+    @patch("src.locks.redis_client")
+    def test_update_nothing(self, mock_redis):
+        """Test that an empty update sends no commands with empty arguments."""
+        pipe = mock_redis.pipeline.return_value
+
+        update_row_hashes({}, [])
+
+        pipe.hset.assert_not_called()
+        pipe.hdel.assert_not_called()
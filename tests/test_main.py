@@ -1,3 +1,4 @@
+import threading
 import time
 import uuid
 from unittest.mock import patch
@@ -6,7 +7,7 @@ import pytest
 from fastapi.testclient import TestClient
 
 from src.jobs import JobStatus
-from src.main import app, run_sync_job
+from src.main import app
 
 
 @pytest.fixture
@@ -49,6 +50,110 @@ class TestStartSyncEndpoint:
         assert mock_create_job.call_args[0][0] == data["job_id"]
 
 
+    @patch("src.main.run_sync_job")
+    @patch("src.main.create_job")
+    def test_start_sync_fast_mode(self, mock_create_job, mock_run_sync_job):
+        """Test that the sync mode is passed through to the background job."""
+        client = TestClient(app)
+        response = client.post("/sync?mode=fast")
+
+        assert response.status_code == 200
+        mock_run_sync_job.assert_called_once_with(response.json()["job_id"], "fast", None, force=False, profile=False)
+
+    @patch("src.main.create_job")
+    def test_start_sync_rejects_unknown_mode(self, mock_create_job):
+        """Test that unknown sync modes are rejected before a job is created."""
+        client = TestClient(app)
+        response = client.post("/sync?mode=turbo")
+
+        assert response.status_code == 422
+        mock_create_job.assert_not_called()
+
+    @patch("src.main.create_job")
+    def test_force_rejected_for_fast_mode(self, mock_create_job, client):
+        """Test that force is only accepted for full syncs."""
+        response = client.post("/sync?mode=fast&force=true")
+
+        assert response.status_code == 400
+        mock_create_job.assert_not_called()
+
+    @patch("src.main.run_sync_job")
+    @patch("src.main.create_job")
+    def test_force_full_sync(self, mock_create_job, mock_run_sync_job, client):
+        """Test that force is passed through to the job."""
+        response = client.post("/sync?force=true")
+
+        mock_run_sync_job.assert_called_once_with(response.json()["job_id"], "full", None, force=True, profile=False)
+
+
+class TestDryRunEndpoint:
+    """Tests for planning and applying syncs through /sync."""
+
+    @patch("src.main.create_job")
+    @patch("src.main.dry_run_sync")
+    def test_dry_run_returns_plan_without_job(self, mock_dry_run, mock_create_job):
+        """Test that a dry run returns the plan synchronously and starts no job."""
+        plan = {"plan_id": "plan-1", "inserted": 2, "estimate": {"write_requests": 3}}
+        mock_dry_run.return_value = plan
+
+        client = TestClient(app)
+        response = client.post("/sync?dry_run=true")
+
+        assert response.status_code == 200
+        assert response.json() == plan
+        mock_create_job.assert_not_called()
+
+    @patch("src.main.close_async_redis")
+    @patch("src.main.stop_scheduler")
+    @patch("src.main.start_scheduler")
+    @patch("src.main.get_job")
+    @patch("src.main.dry_run_sync")
+    def test_dry_run_runs_off_event_loop(
+        self, mock_dry_run, mock_get_job, mock_start, mock_stop, mock_close, client
+    ):
+        """Test that planning runs in a worker thread while handlers stay on the loop."""
+        threads = {}
+        mock_dry_run.side_effect = lambda: threads.update(plan=threading.current_thread()) or {}
+        mock_get_job.side_effect = lambda job_id: threads.update(status=threading.current_thread())
+
+        with client:  # one event loop for both requests
+            client.post("/sync?dry_run=true")
+            client.get("/sync/job-1")
+
+        assert threads["plan"] is not threads["status"]
+
+    @patch("src.main.dry_run_sync")
+    def test_dry_run_rejected_for_fast_mode(self, mock_dry_run):
+        """Test that only full syncs can be planned."""
+        client = TestClient(app)
+        response = client.post("/sync?dry_run=true&mode=fast")
+
+        assert response.status_code == 400
+        mock_dry_run.assert_not_called()
+
+    @patch("src.main.run_sync_job")
+    @patch("src.main.create_job")
+    @patch("src.main.plan_exists", return_value=True)
+    def test_apply_stored_plan(self, mock_plan_exists, mock_create_job, mock_run_sync_job):
+        """Test that a stored plan is applied by a tracked job."""
+        client = TestClient(app)
+        response = client.post("/sync?plan_id=plan-1")
+
+        job_id = response.json()["job_id"]
+        mock_create_job.assert_called_once_with(job_id, trigger="api", mode="full", plan_id="plan-1")
+        mock_run_sync_job.assert_called_once_with(job_id, "full", "plan-1", force=False, profile=False)
+
+    @patch("src.main.create_job")
+    @patch("src.main.plan_exists", return_value=False)
+    def test_apply_unknown_plan(self, mock_plan_exists, mock_create_job):
+        """Test that expired or unknown plans are rejected up front."""
+        client = TestClient(app)
+        response = client.post("/sync?plan_id=missing")
+
+        assert response.status_code == 404
+        mock_create_job.assert_not_called()
+
+
 class TestSyncStatusEndpoint:
     """Tests for /sync/{job_id} endpoint."""
 
@@ -111,60 +216,125 @@ class TestSyncStatusEndpoint:
         assert data["result"]["inserted"] == 10
 
 
-class TestRunSyncJob:
-    """Tests for run_sync_job function."""
+class TestProfileEndpoints:
+    """Tests for profiled syncs and their reports."""
 
-    @patch("src.main.sync_products")
-    @patch("src.main.update_job")
-    def test_run_sync_job_success(self, mock_update_job, mock_sync_products):
-        """Test successful sync job execution."""
-        job_id = str(uuid.uuid4())
-        sync_result = {
-            "inserted": 10,
-            "updated": 5,
-            "deleted": 2,
-        }
-        mock_sync_products.return_value = sync_result
+    @patch("src.main.run_sync_job")
+    @patch("src.main.create_job")
+    def test_profiled_sync(self, mock_create_job, mock_run_sync_job, client):
+        """Test that profile=true is passed to the job and marked on it."""
+        response = client.post("/sync?profile=true")
 
-        run_sync_job(job_id)
+        job_id = response.json()["job_id"]
+        mock_create_job.assert_called_once_with(job_id, trigger="api", mode="full", profiled=1)
+        mock_run_sync_job.assert_called_once_with(job_id, "full", None, force=False, profile=True)
 
-        # Verify job status updates
-        assert mock_update_job.call_count >= 3  # At least: starting, syncing, completed
+    @patch("src.main.dry_run_sync")
+    def test_profile_rejected_for_dry_run(self, mock_dry_run, client):
+        """Test that a dry run, which has no job, cannot be profiled."""
+        response = client.post("/sync?dry_run=true&profile=true")
 
-        # Check final update with success status
-        final_call = mock_update_job.call_args_list[-1]
-        assert final_call[1]["status"] == JobStatus.success
-        assert final_call[1]["result"] == sync_result
-        assert "finished_at" in final_call[1]
+        assert response.status_code == 400
+        mock_dry_run.assert_not_called()
 
-    @patch("src.main.sync_products")
-    @patch("src.main.update_job")
-    def test_run_sync_job_failure(self, mock_update_job, mock_sync_products):
-        """Test sync job execution with error."""
-        job_id = str(uuid.uuid4())
-        error_message = "Database connection failed"
-        mock_sync_products.side_effect = Exception(error_message)
+    @patch("src.main.get_profile")
+    def test_get_profile(self, mock_get_profile, client):
+        """Test that the full report is returned."""
+        mock_get_profile.return_value = {"summary": {"wall_seconds": 2.0}, "ledger": [], "functions": []}
+
+        response = client.get("/sync/job-1/profile")
 
-        with pytest.raises(Exception, match=error_message):
-            run_sync_job(job_id)
+        assert response.status_code == 200
+        assert response.json()["summary"] == {"wall_seconds": 2.0}
+        mock_get_profile.assert_called_once_with("job-1")
 
-        # Verify job status was updated to failed
-        final_call = mock_update_job.call_args_list[-1]
-        assert final_call[1]["status"] == JobStatus.failed
-        assert final_call[1]["error"] == error_message
-        assert "finished_at" in final_call[1]
+    @patch("src.main.get_profile", return_value=None)
+    def test_profile_not_found(self, mock_get_profile, client):
+        """Test that jobs run without profiling have no report."""
+        response = client.get("/sync/job-1/profile")
+
+        assert response.status_code == 404
+
+
+class TestSyncProductsEndpoint:
+    """Tests for the targeted SKU sync endpoint."""
+
+    @patch("src.main.run_sync_job")
+    @patch("src.main.create_job")
+    def test_sync_products_starts_job(self, mock_create_job, mock_run_sync_job, client):
+        """Test that the listed SKUs are synced as a products job, without duplicates."""
+        response = client.post("/sync/products", json={"skus": ["SKU-001", "SKU-002", "SKU-001"]})
+
+        assert response.status_code == 200
+        job_id = response.json()["job_id"]
+        mock_create_job.assert_called_once_with(job_id, trigger="api", mode="products", sku_count=2)
+        mock_run_sync_job.assert_called_once_with(job_id, "products", skus=["SKU-001", "SKU-002"])
+
+    @patch("src.main.create_job")
+    def test_sync_products_requires_skus(self, mock_create_job, client):
+        """Test that an empty SKU list is rejected."""
+        response = client.post("/sync/products", json={"skus": []})
+
+        assert response.status_code == 422
+        mock_create_job.assert_not_called()
 
-    @patch("src.main.sync_products")
-    @patch("src.main.update_job")
-    def test_run_sync_job_updates_step(self, mock_update_job, mock_sync_products):
-        """Test that job step is updated during execution."""
-        job_id = str(uuid.uuid4())
-        mock_sync_products.return_value = {"inserted": 0, "updated": 0, "deleted": 0}
 
-        run_sync_job(job_id)
+class TestSyncHistoryEndpoints:
+    """Tests for job history and stats endpoints."""
+
+    @patch("src.main.list_jobs")
+    def test_list_jobs(self, mock_list_jobs, client):
+        """Test paging through recent jobs."""
+        mock_list_jobs.return_value = {"jobs": [{"job_id": "job-1"}], "next_cursor": None}
+
+        response = client.get("/sync?limit=5&cursor=100.0")
+
+        assert response.status_code == 200
+        assert response.json()["jobs"] == [{"job_id": "job-1"}]
+        mock_list_jobs.assert_called_once_with(5, "100.0")
+
+    @patch("src.main.list_jobs")
+    def test_list_jobs_limit_bounds(self, mock_list_jobs, client):
+        """Test that oversized pages are rejected."""
+        response = client.get("/sync?limit=1000")
+
+        assert response.status_code == 422
+        mock_list_jobs.assert_not_called()
+
+    @patch("src.main.get_job")
+    @patch("src.main.job_stats")
+    def test_stats_not_treated_as_job_id(self, mock_job_stats, mock_get_job, client):
+        """Test that /sync/stats is routed to the stats endpoint."""
+        mock_job_stats.return_value = {"jobs": 3}
+
+        response = client.get("/sync/stats?last=50")
+
+        assert response.status_code == 200
+        assert response.json() == {"jobs": 3}
+        mock_job_stats.assert_called_once_with(50)
+        mock_get_job.assert_not_called()
+
+
+class TestRefreshFeedEndpoint:
+    """Tests for /feed/refresh endpoint."""
+
+    @patch("src.main.refresh_feed_view")
+    @patch("src.main.feed_view_enabled", return_value=True)
+    def test_refresh_feed_schedules_refresh(self, mock_enabled, mock_refresh):
+        """Test that a change signal refreshes the feed view in the background."""
+        client = TestClient(app)
+        response = client.post("/feed/refresh")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "refreshing"}
+        mock_refresh.assert_called_once()
+
+    @patch("src.main.refresh_feed_view")
+    @patch("src.main.feed_view_enabled", return_value=False)
+    def test_refresh_feed_rejected_when_disabled(self, mock_enabled, mock_refresh):
+        """Test that refreshing is refused when the view mode is off."""
+        client = TestClient(app)
+        response = client.post("/feed/refresh")
 
-        # Verify step updates
-        calls = [call[1].get("step") for call in mock_update_job.call_args_list if "step" in call[1]]
-        assert "starting" in calls
-        assert "syncing products" in calls
-        assert "completed" in calls
+        assert response.status_code == 409
+        mock_refresh.assert_not_called()
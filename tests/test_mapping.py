@@ -1,4 +1,5 @@
-from src.sync import build_row_for_sheet, map_product_to_header
+from src.db import ProductRecord
+from src.sync import build_header_plan, build_row, build_row_for_sheet, map_product_to_header
 
 
 class TestMapProductToHeader:
@@ -17,14 +18,17 @@ class TestMapProductToHeader:
         assert map_product_to_header(mock_product, "price") == "1000.0 NGN"
 
     def test_availability_mapping(self, mock_product):
-        """Test availability is always in_stock."""
+        """Test availability comes from the product's inventory status."""
         assert map_product_to_header(mock_product, "availability") == "in_stock"
 
+        sold_out = mock_product._replace(availability="out_of_stock")
+        assert map_product_to_header(sold_out, "availability") == "out_of_stock"
+
     def test_condition_mapping(self, mock_product):
         """Test condition mapping."""
         assert map_product_to_header(mock_product, "condition") == "new"
 
-        used_product = {**mock_product, "condition": "used"}
+        used_product = mock_product._replace(condition="used")
         assert map_product_to_header(used_product, "condition") == "used"
 
     def test_optional_fields(self, mock_product):
@@ -33,20 +37,9 @@ class TestMapProductToHeader:
         assert map_product_to_header(mock_product, "size") == "M"
         assert map_product_to_header(mock_product, "age group") == "adult"
 
-    def test_empty_optional_fields(self):
-        """Test optional fields with None/empty values."""
-        product = {
-            "id": "SKU-001",
-            "title": "Test",
-            "description": "",
-            "link": "https://example.com",
-            "image link": "",
-            "price": 100.0,
-            "condition": "new",
-            "color": None,
-            "size": None,
-            "age group": None,
-        }
+    def test_empty_optional_fields(self, mock_product):
+        """Test optional fields with empty values."""
+        product = mock_product._replace(color="", size="", age_group="")
         assert map_product_to_header(product, "color") == ""
         assert map_product_to_header(product, "size") == ""
         assert map_product_to_header(product, "age group") == ""
@@ -100,20 +93,40 @@ class TestBuildRowForSheet:
 
     def test_build_row_with_empty_product(self, mock_headers):
         """Test building row with minimal product data."""
-        minimal_product = {
-            "id": "SKU-001",
-            "title": "Minimal",
-            "description": "",
-            "link": "",
-            "image link": "",
-            "price": 0.0,
-            "condition": "new",
-            "color": None,
-            "size": None,
-            "age group": None,
-        }
+        minimal_product = ProductRecord(
+            id="SKU-001",
+            title="Minimal",
+            description="",
+            availability="in_stock",
+            link="",
+            image_link="",
+            price=0.0,
+            condition="new",
+            color="",
+            size="",
+            age_group="",
+            is_active=True,
+        )
 
         row = build_row_for_sheet(minimal_product, mock_headers)
         assert len(row) == len(mock_headers)
         assert row[0] == "SKU-001"
         assert row[1] == "Minimal"
+
+
+class TestHeaderPlan:
+    """Tests for build_header_plan and build_row."""
+
+    def test_plan_resolves_each_header_once(self, mock_headers):
+        """Test that the plan has one source per header and unknown headers become blank."""
+        plan = build_header_plan([*mock_headers, "unknown_field"])
+
+        assert len(plan) == len(mock_headers) + 1
+        assert plan[-1] == ""
+
+    def test_build_row_matches_build_row_for_sheet(self, mock_products, mock_headers):
+        """Test that a reused plan builds the same rows as building per product."""
+        plan = build_header_plan(mock_headers)
+
+        for product in mock_products:
+            assert build_row(product, plan) == build_row_for_sheet(product, mock_headers)
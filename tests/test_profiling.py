@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+import pytest
+import requests
+
+from src.db import fetch_products
+from src.profiling import profiled, record_call, record_sheets_response
+
+
+def _sheets_response(method="POST", path="/v4/spreadsheets/abc/values:batchUpdate", body=b"{}"):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"ok": true}'
+    response.elapsed = timedelta(milliseconds=250)
+    response.request = requests.Request(
+        method, f"https://sheets.googleapis.com{path}?alt=json", data=body
+    ).prepare()
+    return response
+
+
+class TestProfiled:
+    """Tests for profiling a block and its call ledger."""
+
+    def test_sheets_calls_recorded(self):
+        """Test that Sheets responses are ledgered with duration and payload sizes."""
+        with profiled() as report:
+            record_sheets_response(_sheets_response(body=b"x" * 40))
+
+        (call,) = report["ledger"]
+        assert call["kind"] == "sheets"
+        assert call["operation"] == "POST /v4/spreadsheets/abc/values:batchUpdate"
+        assert call["seconds"] == 0.25
+        assert (call["status"], call["bytes_sent"], call["bytes_received"]) == (200, 40, 12)
+        assert report["summary"]["calls"]["sheets"] == {
+            "calls": 1, "seconds": 0.25, "bytes_sent": 40, "bytes_received": 12,
+        }
+
+    def test_nothing_recorded_outside(self):
+        """Test that calls made before or after the block are not ledgered."""
+        record_sheets_response(_sheets_response())
+        with profiled() as report:
+            pass
+        record_call("db", "SELECT 1", 0.1)
+
+        assert report["ledger"] == []
+        assert report["summary"]["calls"] == {}
+
+    def test_summary(self):
+        """Test that the summary has timings, peak memory and the hottest functions."""
+        def build():
+            return [str(i) * 10 for i in range(20000)]
+
+        with profiled() as report:
+            build()
+
+        summary = report["summary"]
+        assert summary["wall_seconds"] >= summary["local_seconds"] > 0
+        assert summary["peak_memory_bytes"] > 20000 * 10
+        assert any("build" in f["function"] for f in report["functions"])
+        assert len(summary["top_functions"]) <= 5
+
+    def test_report_filled_on_failure(self):
+        """Test that a failing block still produces its report."""
+        with pytest.raises(RuntimeError):
+            with profiled() as report:
+                record_call("db", "SELECT 1", 0.5, rows=1)
+                raise RuntimeError("boom")
+
+        assert report["summary"]["calls"]["db"] == {"calls": 1, "seconds": 0.5, "rows": 1}
+
+    def test_ledger_truncated(self, monkeypatch):
+        """Test that calls beyond the ledger limit still count in the totals."""
+        monkeypatch.setattr("src.profiling.LEDGER_LIMIT", 2)
+
+        with profiled() as report:
+            for _ in range(3):
+                record_call("db", "SELECT 1", 0.1)
+
+        assert len(report["ledger"]) == 2
+        assert report["summary"]["calls"]["db"]["calls"] == 3
+        assert report["summary"]["ledger_truncated"] is True
+
+
+class TestDatabaseLedger:
+    """Tests for ledgering queries against a local Postgres."""
+
+    def test_queries_recorded(self, seed_product):
+        """Test that a profiled fetch records its query and row count."""
+        seed_product("SKU-001")
+        seed_product("SKU-002")
+
+        fetch_products()
+        with profiled() as report:
+            fetch_products()
+        fetch_products()
+
+        (call,) = report["ledger"]
+        assert call["kind"] == "db"
+        assert call["operation"].startswith("SELECT p.id, p.sku")
+        assert call["rows"] == 2
+
+    def test_copy_recorded(self, seed_product):
+        """Test that COPY exports record the bytes they streamed."""
+        from src.db import fetch_products_copy
+
+        seed_product("SKU-001")
+
+        with profiled() as report:
+            fetch_products_copy()
+
+        (call,) = report["ledger"]
+        assert call["operation"].startswith("COPY")
+        assert call["bytes_received"] > 0
@@ -0,0 +1,177 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from src.jobs import JobStatus
+from src.runner import run_sync_job
+
+
+class TestRunSyncJob:
+    """Tests for run_sync_job function."""
+
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_success(self, mock_update_job, mock_sync_products):
+        """Test successful sync job execution."""
+        job_id = str(uuid.uuid4())
+        sync_result = {
+            "inserted": 10,
+            "updated": 5,
+            "deleted": 2,
+        }
+        mock_sync_products.return_value = sync_result
+
+        run_sync_job(job_id)
+
+        # Verify job status updates
+        # One write when the job starts running, one when it finishes.
+        assert mock_update_job.call_count == 2
+
+        # Check final update with success status
+        final_call = mock_update_job.call_args_list[-1]
+        assert final_call[1]["status"] == JobStatus.success
+        assert final_call[1]["result"] == sync_result
+        assert "finished_at" in final_call[1]
+
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_failure(self, mock_update_job, mock_sync_products):
+        """Test sync job execution with error."""
+        job_id = str(uuid.uuid4())
+        error_message = "Database connection failed"
+        mock_sync_products.side_effect = Exception(error_message)
+
+        with pytest.raises(Exception, match=error_message):
+            run_sync_job(job_id)
+
+        # Verify job status was updated to failed
+        final_call = mock_update_job.call_args_list[-1]
+        assert final_call[1]["status"] == JobStatus.failed
+        assert final_call[1]["error"] == error_message
+        assert "finished_at" in final_call[1]
+
+    @patch("src.runner.reset_sheets_cache")
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_failure_resets_sheets_cache(
+        self, mock_update_job, mock_sync_products, mock_reset
+    ):
+        """Test that a failed sync does not leave a stale Sheets client cached."""
+        mock_sync_products.side_effect = Exception("Sheet not found")
+
+        with pytest.raises(Exception):
+            run_sync_job(str(uuid.uuid4()))
+
+        mock_reset.assert_called_once()
+
+    @patch("src.runner.reset_sheets_cache")
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_success_keeps_sheets_cache(
+        self, mock_update_job, mock_sync_products, mock_reset
+    ):
+        """Test that successful syncs keep reusing the cached client."""
+        mock_sync_products.return_value = {"inserted": 0, "updated": 0, "deleted": 0}
+
+        run_sync_job(str(uuid.uuid4()))
+
+        mock_reset.assert_not_called()
+
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_updates_step(self, mock_update_job, mock_sync_products):
+        """Test that job step is updated during execution."""
+        job_id = str(uuid.uuid4())
+        mock_sync_products.return_value = {"inserted": 0, "updated": 0, "deleted": 0}
+
+        run_sync_job(job_id)
+
+        # Verify step updates
+        calls = [call[1].get("step") for call in mock_update_job.call_args_list if "step" in call[1]]
+        assert calls[0] == "syncing products"
+        assert "completed" in calls
+
+    @patch("src.runner.sync_products")
+    @patch("src.runner.sync_price_availability")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_fast_mode(self, mock_update_job, mock_fast_sync, mock_sync_products):
+        """Test that fast mode runs the price/availability lane only."""
+        job_id = str(uuid.uuid4())
+        mock_fast_sync.return_value = {"mode": "fast", "updated": 3, "missing": 0}
+
+        run_sync_job(job_id, "fast")
+
+        mock_fast_sync.assert_called_once()
+        mock_sync_products.assert_not_called()
+        final_call = mock_update_job.call_args_list[-1]
+        assert final_call[1]["result"] == {"mode": "fast", "updated": 3, "missing": 0}
+
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_reports_resumed_from(self, mock_update_job, mock_sync_products):
+        """Test that a resumed sync's starting chunk ends up in the job result."""
+        mock_sync_products.return_value = {"inserted": 0, "updated": 3, "resumed_from": 7}
+
+        run_sync_job(str(uuid.uuid4()))
+
+        assert mock_update_job.call_args_list[-1][1]["result"]["resumed_from"] == 7
+
+    @patch("src.runner.sync_skus")
+    @patch("src.runner.update_job")
+    def test_run_sync_job_products_mode(self, mock_update_job, mock_sync_skus):
+        """Test that a targeted job upserts only the requested SKUs."""
+        mock_sync_skus.return_value = {"mode": "products", "updated": 2}
+
+        run_sync_job("job-1", "products", skus=["SKU-001", "SKU-002"])
+
+        mock_sync_skus.assert_called_once_with(["SKU-001", "SKU-002"])
+        assert mock_update_job.call_args_list[0][1]["step"] == "syncing selected products"
+        assert mock_update_job.call_args_list[-1][1]["result"] == {"mode": "products", "updated": 2}
+
+
+class TestProfiledJob:
+    """Tests for running a job with profile=True."""
+
+    @patch("src.runner.save_profile")
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_profile_stored_with_job(self, mock_update_job, mock_sync_products, mock_save):
+        """Test that the summary goes on the job and the full report on its own key."""
+        mock_sync_products.return_value = {"updated": 1}
+
+        run_sync_job("job-1", profile=True)
+
+        job_id, report = mock_save.call_args[0]
+        assert job_id == "job-1"
+        assert {"summary", "ledger", "functions"} <= set(report)
+        final = mock_update_job.call_args_list[-1][1]
+        assert final["status"] == JobStatus.success
+        assert final["profile"] == report["summary"]
+
+    @patch("src.runner.save_profile")
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_failed_job_keeps_profile(self, mock_update_job, mock_sync_products, mock_save):
+        """Test that a failed sync is profiled too, since slow failures need it most."""
+        mock_sync_products.side_effect = Exception("429")
+
+        with pytest.raises(Exception):
+            run_sync_job("job-1", profile=True)
+
+        mock_save.assert_called_once()
+        final = mock_update_job.call_args_list[-1][1]
+        assert final["status"] == JobStatus.failed
+        assert "wall_seconds" in final["profile"]
+
+    @patch("src.runner.save_profile")
+    @patch("src.runner.sync_products")
+    @patch("src.runner.update_job")
+    def test_unprofiled_job(self, mock_update_job, mock_sync_products, mock_save):
+        """Test that jobs are not profiled by default."""
+        mock_sync_products.return_value = {"updated": 1}
+
+        run_sync_job("job-1")
+
+        mock_save.assert_not_called()
+        assert "profile" not in mock_update_job.call_args_list[-1][1]
@@ -0,0 +1,130 @@
+from unittest.mock import patch
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from src import scheduler as scheduler_module
+from src.scheduler import INSTANCE_ID, build_trigger, elect_leader, run_scheduled_sync
+
+
+@pytest.fixture
+def fresh_scheduler(monkeypatch):
+    """A scheduler that is never started, so jobs are only registered."""
+    fresh = BackgroundScheduler()
+    monkeypatch.setattr(scheduler_module, "scheduler", fresh)
+    return fresh
+
+
+class TestBuildTrigger:
+    """Tests for build_trigger function."""
+
+    def test_interval_trigger(self):
+        """Test that an interval trigger is used when no cron expression is set."""
+        trigger = build_trigger(None, 300, 30)
+
+        assert isinstance(trigger, IntervalTrigger)
+        assert trigger.interval.total_seconds() == 300 * 60
+        assert trigger.jitter == 30
+
+    def test_cron_trigger_with_jitter(self):
+        """Test that a crontab expression becomes a cron trigger with jitter."""
+        trigger = build_trigger("0 */5 * * *", 300, 45)
+
+        assert isinstance(trigger, CronTrigger)
+        assert str(trigger.fields[5]) == "*/5"  # hour
+        assert trigger.jitter == 45
+
+    def test_zero_jitter_disables_jitter(self):
+        """Test that a jitter of 0 means no jitter at all."""
+        assert build_trigger(None, 5, 0).jitter is None
+
+    def test_invalid_cron(self):
+        """Test that malformed crontab expressions are rejected."""
+        with pytest.raises(ValueError, match="expected 5"):
+            build_trigger("0 */5 * *", 300, 0)
+
+
+class TestElectLeader:
+    """Tests for elect_leader function."""
+
+    @patch("src.scheduler.acquire_leadership", return_value=True)
+    def test_leader_schedules_sync_jobs(self, mock_acquire, fresh_scheduler, monkeypatch):
+        """Test that winning the election registers the sync jobs."""
+        monkeypatch.setenv("SYNC_CRON", "0 3 * * *")
+        monkeypatch.setenv("SYNC_JITTER_SECONDS", "120")
+
+        assert elect_leader() is True
+
+        mock_acquire.assert_called_once_with(INSTANCE_ID)
+        full_sync = fresh_scheduler.get_job("full-sync")
+        assert isinstance(full_sync.trigger, CronTrigger)
+        assert full_sync.trigger.jitter == 120
+        assert fresh_scheduler.get_job("fast-sync").args == ("fast",)
+
+    @patch("src.scheduler.acquire_leadership", return_value=False)
+    def test_follower_schedules_nothing(self, mock_acquire, fresh_scheduler):
+        """Test that processes that lose the election register no sync jobs."""
+        assert elect_leader() is False
+
+        assert fresh_scheduler.get_jobs() == []
+
+    @patch("src.scheduler.acquire_leadership")
+    def test_lost_leadership_removes_jobs(self, mock_acquire, fresh_scheduler):
+        """Test that a leader that fails to renew stops scheduling syncs."""
+        mock_acquire.return_value = True
+        elect_leader()
+        mock_acquire.return_value = False
+        elect_leader()
+
+        assert fresh_scheduler.get_job("full-sync") is None
+        assert fresh_scheduler.get_job("fast-sync") is None
+
+    @patch("src.scheduler.stop_listener")
+    @patch("src.scheduler.start_listener")
+    @patch("src.scheduler.acquire_leadership")
+    def test_change_listener_follows_leadership(
+        self, mock_acquire, mock_start, mock_stop, fresh_scheduler, monkeypatch
+    ):
+        """Test that only the leader listens for catalogue changes."""
+        monkeypatch.setenv("FEED_CHANGE_NOTIFY", "true")
+        mock_acquire.return_value = True
+        elect_leader()
+        elect_leader()
+
+        mock_start.assert_called_once()
+        mock_stop.assert_not_called()
+
+        mock_acquire.return_value = False
+        elect_leader()
+
+        mock_stop.assert_called_once()
+
+    @patch("src.scheduler.start_listener")
+    @patch("src.scheduler.acquire_leadership", return_value=True)
+    def test_change_listener_disabled_by_default(self, mock_acquire, mock_start, fresh_scheduler):
+        """Test that no listener runs unless change notifications are enabled."""
+        elect_leader()
+
+        mock_start.assert_not_called()
+
+    @patch("src.scheduler.acquire_leadership", side_effect=ConnectionError("redis down"))
+    def test_redis_errors_mean_not_leader(self, mock_acquire, fresh_scheduler):
+        """Test that an unreachable Redis never leaves two leaders scheduling."""
+        assert elect_leader() is False
+        assert fresh_scheduler.get_jobs() == []
+
+
+class TestRunScheduledSync:
+    """Tests for run_scheduled_sync function."""
+
+    @patch("src.scheduler.run_sync_job")
+    @patch("src.scheduler.create_job")
+    def test_scheduled_run_goes_through_job_system(self, mock_create_job, mock_run_sync_job):
+        """Test that scheduled runs get a job record and run via run_sync_job."""
+        run_scheduled_sync("fast")
+
+        job_id = mock_create_job.call_args[0][0]
+        mock_create_job.assert_called_once_with(job_id, trigger="schedule", mode="fast")
+        mock_run_sync_job.assert_called_once_with(job_id, "fast")
@@ -3,15 +3,27 @@ import json
 import os
 from unittest.mock import MagicMock, patch
 
-from src.sheets import get_existing_rows, get_sheet
+import pytest
+
+from src.profiling import record_sheets_response
+from src.sheets import (
+    SHEETS_HTTP_POOL_SIZE,
+    USER_AGENT,
+    _authorized_session,
+    column_letter,
+    get_existing_rows,
+    get_existing_values,
+    get_sheet,
+    reset_sheets_cache,
+)
 
 
 class TestGetSheet:
     """Tests for get_sheet function."""
 
     @patch("src.sheets.os.getenv")
-    @patch("src.sheets.gspread.authorize")
-    @patch("src.sheets.Credentials.from_service_account_info")
+    @patch("gspread.authorize")
+    @patch("google.oauth2.service_account.Credentials.from_service_account_info")
     def test_get_sheet_success(
         self, mock_creds_from_info, mock_authorize, mock_getenv
     ):
@@ -46,13 +58,14 @@ class TestGetSheet:
 
         assert result == mock_worksheet
         mock_creds_from_info.assert_called_once()
-        mock_authorize.assert_called_once_with(mock_creds)
+        mock_authorize.assert_called_once()
+        assert mock_authorize.call_args[0][0] == mock_creds
         mock_client.open_by_key.assert_called_once_with("test-spreadsheet-id")
         mock_client.open_by_key.return_value.worksheet.assert_called_once_with("Sheet1")
 
     @patch("src.sheets.os.getenv")
-    @patch("src.sheets.gspread.authorize")
-    @patch("src.sheets.Credentials.from_service_account_info")
+    @patch("gspread.authorize")
+    @patch("google.oauth2.service_account.Credentials.from_service_account_info")
     def test_get_sheet_default_sheet_name(
         self, mock_creds_from_info, mock_authorize, mock_getenv
     ):
@@ -78,6 +91,71 @@ class TestGetSheet:
         mock_client.open_by_key.return_value.worksheet.assert_called_once_with("Sheet1")
 
 
+class TestSheetsClientCache:
+    """Tests for the process-wide client and worksheet cache."""
+
+    @pytest.fixture
+    def mock_authorize(self):
+        env = {
+            "GOOGLE_SERVICE_ACCOUNT_B64": base64.b64encode(b'{"type": "service_account"}').decode(),
+            "SPREADSHEET_ID": "test-spreadsheet-id",
+        }
+        with patch.dict(os.environ, env), \
+                patch("google.oauth2.service_account.Credentials.from_service_account_info"), \
+                patch("gspread.authorize") as mock_authorize:
+            yield mock_authorize
+
+    def test_client_and_worksheet_reused(self, mock_authorize):
+        """Test that repeated syncs do not re-authorize or re-open the sheet."""
+        first = get_sheet()
+        second = get_sheet()
+
+        assert first is second
+        mock_authorize.assert_called_once()
+        mock_authorize.return_value.open_by_key.assert_called_once_with("test-spreadsheet-id")
+
+    def test_worksheets_cached_per_sheet_name(self, mock_authorize):
+        """Test that each sheet name gets its own worksheet handle on one client."""
+        spreadsheet = mock_authorize.return_value.open_by_key.return_value
+        spreadsheet.worksheet.side_effect = lambda name: MagicMock(name=name)
+
+        with patch.dict(os.environ, {"SHEET_NAME": "Sheet1"}):
+            sheet1 = get_sheet()
+        with patch.dict(os.environ, {"SHEET_NAME": "Sheet2"}):
+            sheet2 = get_sheet()
+            assert get_sheet() is sheet2
+
+        assert sheet1 is not sheet2
+        mock_authorize.assert_called_once()
+        assert spreadsheet.worksheet.call_count == 2
+
+    def test_reset_sheets_cache(self, mock_authorize):
+        """Test that a reset forces fresh credentials and handles."""
+        get_sheet()
+        session = mock_authorize.return_value.http_client.session
+
+        reset_sheets_cache()
+        get_sheet()
+
+        session.close.assert_called_once()
+        assert mock_authorize.call_count == 2
+
+    def test_authorized_session(self):
+        """Test the pooled keep-alive session asks for gzip responses."""
+        session = _authorized_session(MagicMock())
+
+        adapter = session.get_adapter("https://sheets.googleapis.com")
+        assert adapter._pool_maxsize == SHEETS_HTTP_POOL_SIZE
+        assert session.headers["Accept-Encoding"] == "gzip"
+        assert session.headers["User-Agent"] == USER_AGENT
+
+    def test_authorized_session_ledgers_profiled_calls(self):
+        """Test that the session reports its responses to a profiled sync's ledger."""
+        session = _authorized_session(MagicMock())
+
+        assert record_sheets_response in session.hooks["response"]
+
+
 class TestGetExistingRows:
     """Tests for get_existing_rows function."""
 
@@ -121,3 +199,48 @@ class TestGetExistingRows:
         assert "123" in result
         assert result["123"] == 2
         assert result["SKU-002"] == 3
+
+
+
+class TestGetExistingValues:
+    """Tests for get_existing_values function."""
+
+    def test_maps_ids_to_row_and_values(self):
+        """Test that each id maps to its sheet row number and cell values."""
+        mock_sheet = MagicMock()
+        mock_sheet.get_all_values.return_value = [
+            ["id", "title"],
+            ["SKU-001", "Product 1"],
+            ["SKU-002", "Product 2"],
+        ]
+
+        result = get_existing_values(mock_sheet)
+
+        assert result == {
+            "SKU-001": (2, ["SKU-001", "Product 1"]),
+            "SKU-002": (3, ["SKU-002", "Product 2"]),
+        }
+
+    def test_empty_sheet(self):
+        """Test that a sheet with only headers has no existing rows."""
+        mock_sheet = MagicMock()
+        mock_sheet.get_all_values.return_value = [["id", "title"]]
+
+        assert get_existing_values(mock_sheet) == {}
+
+
+class TestColumnLetter:
+    """Tests for column_letter function."""
+
+    def test_single_letters(self):
+        """Test the first 26 columns."""
+        assert column_letter(1) == "A"
+        assert column_letter(7) == "G"
+        assert column_letter(26) == "Z"
+
+    def test_double_letters(self):
+        """Test columns past Z, as used by the 31-column feed."""
+        assert column_letter(27) == "AA"
+        assert column_letter(31) == "AE"
+        assert column_letter(52) == "AZ"
+        assert column_letter(53) == "BA"
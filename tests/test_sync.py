@@ -1,8 +1,56 @@
+import json
+from contextlib import nullcontext
 from unittest.mock import patch
 
 import pytest
 
-from src.sync import get_headers, sync_products
+from src.locks import CHECKPOINT_KEY, FINGERPRINT_KEY
+from src.sync import (
+    applied_row_ids,
+    build_row_for_sheet,
+    contiguous_runs,
+    diff_row,
+    dry_run_sync,
+    estimate_plan,
+    get_headers,
+    plan_sync,
+    sync_price_availability,
+    sync_product_ids,
+    sync_products,
+    sync_skus,
+    upsert_products,
+)
+
+
+@pytest.fixture(autouse=True)
+def redis_client(mock_redis_client, monkeypatch):
+    """Keep plans and checkpoints written during a sync away from a real Redis."""
+    monkeypatch.setattr("src.locks.redis_client", mock_redis_client)
+    return mock_redis_client
+
+
+@pytest.fixture(autouse=True)
+def fingerprint(monkeypatch):
+    """Catalogue fingerprint without a database; nothing has been synced yet."""
+    monkeypatch.setattr("src.sync.feed_fingerprint", lambda: "2:12345")
+    return "2:12345"
+
+
+@pytest.fixture(autouse=True)
+def row_hashes(monkeypatch):
+    """
+    Phase-one row hashes without a database. None are stored in Redis yet,
+    so phase two fetches the whole (patched) catalogue.
+    """
+    hashes = {}
+    monkeypatch.setattr("src.sync.fetch_row_hashes", lambda: dict(hashes))
+    return hashes
+
+
+@pytest.fixture(autouse=True)
+def feed_snapshot(monkeypatch):
+    """No read transaction to open; the feed reads themselves are patched."""
+    monkeypatch.setattr("src.sync.feed_snapshot", nullcontext)
 
 
 class TestGetHeaders:
@@ -21,14 +69,14 @@ class TestSyncProducts:
     @patch("src.sync.release_lock")
     @patch("src.sync.acquire_lock")
     @patch("src.sync.fetch_products")
-    @patch("src.sync.get_existing_rows")
+    @patch("src.sync.get_existing_values")
     @patch("src.sync.get_headers")
     @patch("src.sync.get_sheet")
     def test_sync_products_inserts_new_products(
         self,
         mock_get_sheet,
         mock_get_headers,
-        mock_get_existing_rows,
+        mock_get_existing_values,
         mock_fetch_products,
         mock_acquire_lock,
         mock_release_lock,
@@ -40,7 +88,7 @@ class TestSyncProducts:
         mock_acquire_lock.return_value = True
         mock_get_sheet.return_value = mock_sheet
         mock_get_headers.return_value = mock_headers
-        mock_get_existing_rows.return_value = {}  # No existing products
+        mock_get_existing_values.return_value = {}  # No existing products
         mock_fetch_products.return_value = mock_products
 
         result = sync_products()
@@ -55,27 +103,29 @@ class TestSyncProducts:
     @patch("src.sync.release_lock")
     @patch("src.sync.acquire_lock")
     @patch("src.sync.fetch_products")
-    @patch("src.sync.get_existing_rows")
+    @patch("src.sync.get_existing_values")
     @patch("src.sync.get_headers")
     @patch("src.sync.get_sheet")
     def test_sync_products_updates_existing_products(
         self,
         mock_get_sheet,
         mock_get_headers,
-        mock_get_existing_rows,
+        mock_get_existing_values,
         mock_fetch_products,
         mock_acquire_lock,
         mock_release_lock,
         mock_sheet,
         mock_headers,
         mock_products,
-        mock_existing_rows,
+        mock_product,
     ):
         """Test that existing products are updated."""
         mock_acquire_lock.return_value = True
         mock_get_sheet.return_value = mock_sheet
         mock_get_headers.return_value = mock_headers
-        mock_get_existing_rows.return_value = {"SKU-001": 2}  # One existing product
+        # One existing product whose sheet row predates a price change
+        old_row = build_row_for_sheet(mock_product._replace(price=900.0), mock_headers)
+        mock_get_existing_values.return_value = {"SKU-001": (2, old_row)}
         mock_fetch_products.return_value = mock_products
 
         result = sync_products()
@@ -84,46 +134,42 @@ class TestSyncProducts:
         assert result["updated"] == 1  # SKU-001 is updated
         assert result["deleted"] == 0
         mock_sheet.append_rows.assert_called_once()
-        mock_sheet.update.assert_called_once()
+        mock_sheet.batch_update.assert_called_once()
         mock_acquire_lock.assert_called_once()
         mock_release_lock.assert_called_once()
 
     @patch("src.sync.release_lock")
     @patch("src.sync.acquire_lock")
     @patch("src.sync.fetch_products")
-    @patch("src.sync.get_existing_rows")
+    @patch("src.sync.get_existing_values")
     @patch("src.sync.get_headers")
     @patch("src.sync.get_sheet")
     def test_sync_products_deletes_inactive_products(
         self,
         mock_get_sheet,
         mock_get_headers,
-        mock_get_existing_rows,
+        mock_get_existing_values,
         mock_fetch_products,
         mock_acquire_lock,
         mock_release_lock,
         mock_sheet,
         mock_headers,
         mock_products,
-        mock_existing_rows,
     ):
         """Test that inactive products are deleted."""
         mock_acquire_lock.return_value = True
         mock_get_sheet.return_value = mock_sheet
         mock_get_headers.return_value = mock_headers
         # SKU-003 exists in sheet but not in fetched products
-        mock_get_existing_rows.return_value = {"SKU-003": 3}
+        mock_get_existing_values.return_value = {"SKU-003": (2, ["SKU-003"])}
         mock_fetch_products.return_value = mock_products  # Only SKU-001 and SKU-002
 
         result = sync_products()
 
         assert result["inserted"] == 2
         assert result["updated"] == 0
-        # Note: The formula max(0, len(existing) - len(active_ids)) calculates:
-        # max(0, 1 - 2) = 0, but SKU-003 is actually deleted
-        # The deletion still happens, but the count is calculated incorrectly
-        assert result["deleted"] == max(0, len({"SKU-003": 3}) - len({"SKU-001", "SKU-002"}))
-        mock_sheet.delete_rows.assert_called_once_with(3)
+        assert result["deleted"] == 1
+        mock_sheet.delete_rows.assert_called_once_with(2)
         mock_acquire_lock.assert_called_once()
         mock_release_lock.assert_called_once()
 
@@ -140,14 +186,14 @@ class TestSyncProducts:
     @patch("src.sync.release_lock")
     @patch("src.sync.acquire_lock")
     @patch("src.sync.fetch_products")
-    @patch("src.sync.get_existing_rows")
+    @patch("src.sync.get_existing_values")
     @patch("src.sync.get_headers")
     @patch("src.sync.get_sheet")
     def test_sync_products_handles_empty_product_list(
         self,
         mock_get_sheet,
         mock_get_headers,
-        mock_get_existing_rows,
+        mock_get_existing_values,
         mock_fetch_products,
         mock_acquire_lock,
         mock_release_lock,
@@ -158,7 +204,7 @@ class TestSyncProducts:
         mock_acquire_lock.return_value = True
         mock_get_sheet.return_value = mock_sheet
         mock_get_headers.return_value = mock_headers
-        mock_get_existing_rows.return_value = {}
+        mock_get_existing_values.return_value = {}
         mock_fetch_products.return_value = []
 
         result = sync_products()
@@ -173,14 +219,14 @@ class TestSyncProducts:
     @patch("src.sync.release_lock")
     @patch("src.sync.acquire_lock")
     @patch("src.sync.fetch_products")
-    @patch("src.sync.get_existing_rows")
+    @patch("src.sync.get_existing_values")
     @patch("src.sync.get_headers")
     @patch("src.sync.get_sheet")
     def test_sync_products_releases_lock_on_exception(
         self,
         mock_get_sheet,
         mock_get_headers,
-        mock_get_existing_rows,
+        mock_get_existing_values,
         mock_fetch_products,
         mock_acquire_lock,
         mock_release_lock,
@@ -199,14 +245,14 @@ class TestSyncProducts:
     @patch("src.sync.release_lock")
     @patch("src.sync.acquire_lock")
     @patch("src.sync.fetch_products")
-    @patch("src.sync.get_existing_rows")
+    @patch("src.sync.get_existing_values")
     @patch("src.sync.get_headers")
     @patch("src.sync.get_sheet")
     def test_sync_products_handles_mixed_operations(
         self,
         mock_get_sheet,
         mock_get_headers,
-        mock_get_existing_rows,
+        mock_get_existing_values,
         mock_fetch_products,
         mock_acquire_lock,
         mock_release_lock,
@@ -219,17 +265,863 @@ class TestSyncProducts:
         mock_get_sheet.return_value = mock_sheet
         mock_get_headers.return_value = mock_headers
         # SKU-001 exists, SKU-002 is new, SKU-003 should be deleted
-        mock_get_existing_rows.return_value = {"SKU-001": 2, "SKU-003": 3}
-        mock_fetch_products.return_value = [mock_product, {**mock_product, "id": "SKU-002"}]
+        mock_get_existing_values.return_value = {
+            "SKU-001": (2, ["SKU-001", "Old title"]),
+            "SKU-003": (3, ["SKU-003"]),
+        }
+        mock_fetch_products.return_value = [mock_product, mock_product._replace(id="SKU-002")]
 
         result = sync_products()
 
         assert result["inserted"] == 1  # SKU-002
         assert result["updated"] == 1  # SKU-001
-        # Note: The formula max(0, len(existing) - len(active_ids)) calculates:
-        # max(0, 2 - 2) = 0, but SKU-003 is actually deleted
-        # The deletion still happens, but the count is calculated incorrectly
-        assert result["deleted"] == max(0, len({"SKU-001": 2, "SKU-003": 3}) - len({"SKU-001", "SKU-002"}))
+        assert result["deleted"] == 1  # SKU-003
         mock_sheet.append_rows.assert_called_once()
-        mock_sheet.update.assert_called_once()
+        mock_sheet.batch_update.assert_called_once()
         mock_sheet.delete_rows.assert_called_once_with(3)
+
+
+
+class TestCellDiff:
+    """Tests for cell-level diff writes in sync_products."""
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.get_existing_values")
+    @patch("src.sync.get_headers")
+    @patch("src.sync.get_sheet")
+    def test_price_change_writes_single_cell(
+        self,
+        mock_get_sheet,
+        mock_get_headers,
+        mock_get_existing_values,
+        mock_fetch_products,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_sheet,
+        mock_headers,
+        mock_product,
+    ):
+        """Test that a price change sends one cell instead of the whole row."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_get_headers.return_value = mock_headers
+        old_row = build_row_for_sheet(mock_product._replace(price=900.0), mock_headers)
+        mock_get_existing_values.return_value = {"SKU-001": (5, old_row)}
+        mock_fetch_products.return_value = [mock_product]
+
+        result = sync_products()
+
+        mock_sheet.batch_update.assert_called_once_with(
+            [{"range": "G5:G5", "values": [["1000.0 NGN"]]}],
+            value_input_option="RAW",
+        )
+        mock_sheet.update.assert_not_called()
+        assert result["updated"] == 1
+        assert result["updated_cells"] == 1
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.get_existing_values")
+    @patch("src.sync.get_headers")
+    @patch("src.sync.get_sheet")
+    def test_unchanged_rows_are_not_written(
+        self,
+        mock_get_sheet,
+        mock_get_headers,
+        mock_get_existing_values,
+        mock_fetch_products,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_sheet,
+        mock_headers,
+        mock_product,
+    ):
+        """Test that rows matching the sheet make no write requests."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_get_headers.return_value = mock_headers
+        row = build_row_for_sheet(mock_product, mock_headers)
+        mock_get_existing_values.return_value = {"SKU-001": (2, row)}
+        mock_fetch_products.return_value = [mock_product]
+
+        result = sync_products()
+
+        mock_sheet.batch_update.assert_not_called()
+        assert result["updated"] == 0
+        assert result["unchanged"] == 1
+
+    @patch("src.sync.WRITE_BATCH_RANGES", 2)
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.get_existing_values")
+    @patch("src.sync.get_headers")
+    @patch("src.sync.get_sheet")
+    def test_ranges_are_sent_in_batches(
+        self,
+        mock_get_sheet,
+        mock_get_headers,
+        mock_get_existing_values,
+        mock_fetch_products,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_sheet,
+        mock_headers,
+        mock_product,
+    ):
+        """Test that changed ranges are split into batches of WRITE_BATCH_RANGES."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_get_headers.return_value = mock_headers
+        products = [mock_product._replace(id=f"SKU-{i}") for i in range(5)]
+        mock_get_existing_values.return_value = {
+            p.id: (i + 2, build_row_for_sheet(p._replace(price=1.0), mock_headers))
+            for i, p in enumerate(products)
+        }
+        mock_fetch_products.return_value = products
+
+        sync_products()
+
+        assert [len(c[0][0]) for c in mock_sheet.batch_update.call_args_list] == [2, 2, 1]
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_products", return_value=[])
+    @patch("src.sync.get_existing_values")
+    @patch("src.sync.get_headers")
+    @patch("src.sync.get_sheet")
+    def test_deletes_bottom_up_in_ranges(
+        self,
+        mock_get_sheet,
+        mock_get_headers,
+        mock_get_existing_values,
+        mock_fetch_products,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_sheet,
+        mock_headers,
+    ):
+        """Test that stale rows are deleted from the bottom so row numbers stay valid."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_get_headers.return_value = mock_headers
+        mock_get_existing_values.return_value = {
+            "SKU-A": (2, ["SKU-A"]),
+            "SKU-B": (3, ["SKU-B"]),
+            "SKU-C": (5, ["SKU-C"]),
+        }
+
+        result = sync_products()
+
+        assert [c[0] for c in mock_sheet.delete_rows.call_args_list] == [(5,), (2, 3)]
+        assert result["deleted"] == 3
+
+
+class TestSyncPlans:
+    """Tests for dry-run planning and applying stored plans."""
+
+    @patch("src.sync.save_plan")
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.get_existing_values")
+    @patch("src.sync.get_headers")
+    @patch("src.sync.get_sheet")
+    def test_dry_run_plans_without_writing(
+        self,
+        mock_get_sheet,
+        mock_get_headers,
+        mock_get_existing_values,
+        mock_fetch_products,
+        mock_save_plan,
+        mock_sheet,
+        mock_headers,
+        mock_product,
+    ):
+        """Test that a dry run diffs and stores a plan but never writes to the sheet."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_get_headers.return_value = mock_headers
+        mock_get_existing_values.return_value = {
+            "SKU-001": (2, build_row_for_sheet(mock_product._replace(price=1.0), mock_headers)),
+            "SKU-003": (3, ["SKU-003"]),
+        }
+        mock_fetch_products.return_value = [mock_product, mock_product._replace(id="SKU-002")]
+
+        result = dry_run_sync()
+
+        assert result["inserted"] == 1
+        assert result["updated"] == 1
+        assert result["deleted"] == 1
+        assert result["estimate"]["write_requests"] == 3
+        assert result["estimate"]["requests"] == {
+            "batch_update": 1,
+            "delete_rows": 1,
+            "append_rows": 1,
+        }
+        saved = mock_save_plan.call_args[0][0]
+        assert saved["plan_id"] == result["plan_id"]
+        assert saved["updates"] == [{"range": "G2:G2", "values": [["1000.0 NGN"]]}]
+        assert saved["deletes"] == [(3, 3)]
+        mock_sheet.batch_update.assert_not_called()
+        mock_sheet.append_rows.assert_not_called()
+        mock_sheet.delete_rows.assert_not_called()
+
+    @patch("src.sync.delete_plan")
+    @patch("src.sync.load_plan")
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.get_existing_values")
+    @patch("src.sync.get_sheet")
+    def test_apply_stored_plan_skips_reads(
+        self,
+        mock_get_sheet,
+        mock_get_existing_values,
+        mock_fetch_products,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_load_plan,
+        mock_delete_plan,
+        mock_sheet,
+    ):
+        """Test that applying a stored plan writes it without re-reading sheet or DB."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.col_values.return_value = ["id", "SKU-001", "SKU-003"]
+        mock_load_plan.return_value = {
+            "plan_id": "plan-1",
+            "headers": mock_sheet.row_values.return_value,
+            "sheet_rows": 2,
+            "updates": [{"range": "G2:G2", "values": [["1000.0 NGN"]]}],
+            "deletes": [[3, 3]],
+            "inserts": [["SKU-002"]],
+            "counts": {"inserted": 1, "updated": 1, "deleted": 1},
+        }
+
+        result = sync_products(plan_id="plan-1")
+
+        assert result == {"inserted": 1, "updated": 1, "deleted": 1, "resumed_from": None}
+        mock_get_existing_values.assert_not_called()
+        mock_fetch_products.assert_not_called()
+        mock_sheet.batch_update.assert_called_once()
+        mock_sheet.delete_rows.assert_called_once_with(3)
+        mock_sheet.append_rows.assert_called_once_with([["SKU-002"]], value_input_option="RAW")
+        mock_delete_plan.assert_called_once_with("plan-1")
+
+    @patch("src.sync.load_plan", return_value=None)
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    def test_apply_expired_plan_fails(
+        self, mock_get_sheet, mock_acquire_lock, mock_release_lock, mock_load_plan
+    ):
+        """Test that a plan that expired between dry run and apply fails the job."""
+        with pytest.raises(ValueError, match="not found or expired"):
+            sync_products(plan_id="plan-1")
+
+        mock_release_lock.assert_called_once()
+
+    @patch("src.sync.load_plan")
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    def test_apply_plan_after_sheet_changed_fails(
+        self, mock_get_sheet, mock_acquire_lock, mock_release_lock, mock_load_plan, mock_sheet
+    ):
+        """Test that a plan is not applied to a sheet whose rows changed since the dry run."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.col_values.return_value = ["id", "SKU-001", "SKU-002", "SKU-009"]
+        mock_load_plan.return_value = {
+            "plan_id": "plan-1",
+            "headers": mock_sheet.row_values.return_value,
+            "sheet_rows": 2,
+            "updates": [],
+            "deletes": [[3, 3]],
+            "inserts": [],
+            "counts": {},
+        }
+
+        with pytest.raises(ValueError, match="Sheet changed"):
+            sync_products(plan_id="plan-1")
+
+        mock_sheet.delete_rows.assert_not_called()
+
+    def test_estimate_uses_write_quota(self):
+        """Test that the estimate spreads write requests over the per-minute quota."""
+        plan = {
+            "updates": [{"range": f"G{i}:G{i}", "values": [["1"]]} for i in range(1200)],
+            "deletes": [],
+            "inserts": [],
+        }
+
+        with patch("src.sync.WRITE_REQUESTS_PER_MINUTE", 60):
+            estimate = estimate_plan(plan)
+
+        assert estimate["write_requests"] == 3  # 1200 ranges / 500 per batch
+        assert estimate["estimated_seconds"] == 3.0
+        assert estimate["payload_bytes"] > 0
+
+
+class TestDiffRow:
+    """Tests for diff_row function."""
+
+    def test_groups_changed_columns(self):
+        """Test that changed cells are grouped into contiguous column runs."""
+        old = ["a", "b", "c", "d", "e"]
+        new = ["a", "B", "C", "d", "E"]
+        assert diff_row(old, new) == [(1, 2), (4, 4)]
+
+    def test_short_old_row(self):
+        """Test that cells missing from a trimmed sheet row count as changed."""
+        assert diff_row(["a"], ["a", "", "c"]) == [(1, 2)]
+
+    def test_none_matches_empty_cell(self):
+        """Test that None values compare equal to empty sheet cells."""
+        assert diff_row(["a", ""], ["a", None]) == []
+
+
+class TestContiguousRuns:
+    """Tests for contiguous_runs function."""
+
+    def test_groups_adjacent_indices(self):
+        """Test that adjacent indices collapse into inclusive runs."""
+        assert contiguous_runs([0, 1, 2, 5, 7, 8]) == [(0, 2), (5, 5), (7, 8)]
+
+    def test_empty(self):
+        """Test that no indices produce no runs."""
+        assert contiguous_runs([]) == []
+
+
+class TestSyncPriceAvailability:
+    """Tests for sync_price_availability function."""
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_price_availability")
+    @patch("src.sync.get_sheet")
+    def test_writes_only_changed_cells_per_column(
+        self,
+        mock_get_sheet,
+        mock_fetch,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_sheet,
+    ):
+        """Test that changed price/availability cells are written as column ranges."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.batch_get.return_value = [
+            [["SKU-001"], ["SKU-002"], ["SKU-003"], ["SKU-004"]],
+            [["1000.0 NGN"], ["2000.0 NGN"], ["3000.0 NGN"], ["4000.0 NGN"]],
+            [["in_stock"], ["in_stock"], ["in_stock"]],
+        ]
+        mock_fetch.return_value = [
+            {"id": "SKU-001", "price": 1000.0, "availability": "in_stock"},
+            {"id": "SKU-002", "price": 2500.0, "availability": "in_stock"},
+            {"id": "SKU-003", "price": 3500.0, "availability": "out_of_stock"},
+            {"id": "SKU-004", "price": 4000.0, "availability": "in_stock"},
+            {"id": "SKU-005", "price": 10.0, "availability": "in_stock"},
+        ]
+
+        result = sync_price_availability()
+
+        mock_sheet.batch_get.assert_called_once_with(["A2:A", "G2:G", "D2:D"])
+        mock_sheet.batch_update.assert_called_once_with(
+            [
+                {"range": "G3:G4", "values": [["2500.0 NGN"], ["3500.0 NGN"]]},
+                # SKU-004 had an empty availability cell at the end of the column
+                {"range": "D4:D5", "values": [["out_of_stock"], ["in_stock"]]},
+            ],
+            value_input_option="RAW",
+        )
+        assert result == {"mode": "fast", "updated": 3, "missing": 1}
+        mock_sheet.append_rows.assert_not_called()
+        mock_sheet.delete_rows.assert_not_called()
+        mock_release_lock.assert_called_once()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.fetch_price_availability")
+    @patch("src.sync.get_sheet")
+    def test_no_write_when_nothing_changed(
+        self,
+        mock_get_sheet,
+        mock_fetch,
+        mock_acquire_lock,
+        mock_release_lock,
+        mock_sheet,
+    ):
+        """Test that an unchanged catalogue makes no write requests."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.batch_get.return_value = [[["SKU-001"]], [["1000.0 NGN"]], [["in_stock"]]]
+        mock_fetch.return_value = [{"id": "SKU-001", "price": 1000.0, "availability": "in_stock"}]
+
+        result = sync_price_availability()
+
+        mock_sheet.batch_update.assert_not_called()
+        assert result["updated"] == 0
+
+    @patch("src.sync.acquire_lock", return_value=False)
+    def test_returns_locked_when_lock_fails(self, mock_acquire_lock):
+        """Test that the fast lane backs off while another sync holds the lock."""
+        assert sync_price_availability() == {"status": "locked"}
+
+
+class TestUnchangedCatalogue:
+    """Tests for the fingerprint pre-check in sync_products."""
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_unchanged_catalogue_skips_sync(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release, redis_client, fingerprint
+    ):
+        """Test that a matching fingerprint stops before any fetch or sheet read."""
+        redis_client.get.side_effect = lambda key: fingerprint if key == FINGERPRINT_KEY else None
+
+        assert sync_products() == {"status": "unchanged"}
+
+        mock_fetch.assert_not_called()
+        mock_get_sheet.assert_not_called()
+        mock_release.assert_called_once()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_force_ignores_fingerprint(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release,
+        redis_client, fingerprint, mock_sheet,
+    ):
+        """Test that a forced sync runs even when nothing changed."""
+        redis_client.get.side_effect = lambda key: fingerprint if key == FINGERPRINT_KEY else None
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.get_all_values.return_value = []
+        mock_fetch.return_value = []
+
+        result = sync_products(force=True)
+
+        assert "status" not in result
+        mock_fetch.assert_called_once()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_pending_checkpoint_is_not_skipped(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release,
+        redis_client, fingerprint, mock_sheet,
+    ):
+        """Test that an interrupted sync is finished even if the catalogue is unchanged."""
+        checkpoint = json.dumps({"plan_id": "gone", "chunk": 0, "sheet_rows": 0})
+        redis_client.get.side_effect = lambda key: {
+            FINGERPRINT_KEY: fingerprint,
+            CHECKPOINT_KEY: checkpoint,
+        }.get(key)
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.get_all_values.return_value = []
+        mock_fetch.return_value = []
+
+        assert "status" not in sync_products()
+        mock_fetch.assert_called_once()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_successful_sync_stores_fingerprint(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release,
+        redis_client, fingerprint, mock_sheet,
+    ):
+        """Test that the next run can skip once this one has written everything."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.get_all_values.return_value = []
+        mock_fetch.return_value = []
+
+        sync_products()
+
+        redis_client.set.assert_any_call(FINGERPRINT_KEY, fingerprint)
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_failed_sync_keeps_old_fingerprint(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release,
+        redis_client, mock_sheet, mock_product,
+    ):
+        """Test that a sync that did not finish never marks the catalogue as synced."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.get_all_values.return_value = []
+        mock_sheet.append_rows.side_effect = Exception("429")
+        mock_fetch.return_value = [mock_product]
+
+        with pytest.raises(Exception):
+            sync_products()
+
+        assert all(c[0][0] != FINGERPRINT_KEY for c in redis_client.set.call_args_list)
+
+
+@pytest.fixture
+def row_index(monkeypatch):
+    """In-memory stand-in for the Redis id -> row index."""
+    index = {}
+
+    def save(ids):
+        index.clear()
+        index.update({pid: row for row, pid in enumerate(ids, start=2) if pid})
+
+    monkeypatch.setattr("src.sync.save_row_index", save)
+    monkeypatch.setattr("src.sync.add_rows", index.update)
+    monkeypatch.setattr("src.sync.load_row_index", lambda: dict(index))
+    monkeypatch.setattr("src.sync.clear_row_index", index.clear)
+    monkeypatch.setattr("src.sync.lookup_rows", lambda ids: (
+        {pid: index[pid] for pid in ids if pid in index}, len(index)
+    ))
+    return index
+
+
+def _id_cells(sheet_ids):
+    """batch_get stand-in answering A<row> ranges from a list of sheet ids."""
+    return lambda ranges: [[[sheet_ids[int(r[1:]) - 2]]] for r in ranges]
+
+
+class TestUpsertProducts:
+    """Tests for upsert_products, sync_product_ids and sync_skus."""
+
+    def test_rewrites_appends_and_deletes(self, mock_sheet, mock_product, row_index):
+        """Test that only the given products are written, and the index follows the rows."""
+        sheet_ids = ["SKU-001", "SKU-002", "SKU-003"]
+        row_index.update({"SKU-001": 2, "SKU-002": 3, "SKU-003": 4})
+        mock_sheet.batch_get.side_effect = _id_cells(sheet_ids)
+        new = mock_product._replace(id="SKU-004")
+        gone = mock_product._replace(id="SKU-002", is_active=False)
+
+        result = upsert_products(mock_sheet, [mock_product, new, gone])
+
+        assert result == {"inserted": 1, "updated": 1, "deleted": 1}
+        (data,), kwargs = mock_sheet.batch_update.call_args
+        assert data == [{"range": "A2:AE2", "values": [build_row_for_sheet(mock_product, get_headers(mock_sheet))]}]
+        assert kwargs == {"value_input_option": "RAW"}
+        mock_sheet.delete_rows.assert_called_once_with(3)
+        assert mock_sheet.append_rows.call_args[0][0][0][0] == "SKU-004"
+        # Rows were found through the index, not by reading the id column.
+        mock_sheet.col_values.assert_not_called()
+        assert row_index == {"SKU-001": 2, "SKU-003": 3, "SKU-004": 4}
+
+    def test_appends_extend_index(self, mock_sheet, mock_product, row_index):
+        """Test that appended rows are added to the index after the last row."""
+        row_index.update({"SKU-001": 2, "SKU-002": 3})
+        mock_sheet.batch_get.side_effect = _id_cells(["SKU-001", "SKU-002"])
+
+        upsert_products(mock_sheet, [mock_product._replace(id="SKU-009")])
+
+        assert row_index["SKU-009"] == 4
+        mock_sheet.batch_update.assert_not_called()
+
+    def test_missing_index_rebuilt_from_sheet(self, mock_sheet, mock_product, row_index):
+        """Test that without an index the id column is read once and indexed."""
+        mock_sheet.col_values.return_value = ["id", "SKU-002", "SKU-001"]
+
+        result = upsert_products(mock_sheet, [mock_product])
+
+        assert result["updated"] == 1
+        assert mock_sheet.batch_update.call_args[0][0][0]["range"] == "A3:AE3"
+        assert row_index == {"SKU-002": 2, "SKU-001": 3}
+
+    def test_stale_index_rebuilt_from_sheet(self, mock_sheet, mock_product, row_index):
+        """Test that a row that no longer holds the indexed id is never overwritten."""
+        sheet_ids = ["SKU-005", "SKU-001"]
+        row_index.update({"SKU-001": 2, "SKU-005": 3})
+        mock_sheet.batch_get.side_effect = _id_cells(sheet_ids)
+        mock_sheet.col_values.return_value = ["id", *sheet_ids]
+
+        upsert_products(mock_sheet, [mock_product])
+
+        assert mock_sheet.batch_update.call_args[0][0][0]["range"] == "A3:AE3"
+        assert row_index == {"SKU-005": 2, "SKU-001": 3}
+
+    def test_inactive_product_not_in_sheet(self, mock_sheet, mock_product, row_index):
+        """Test that deactivating a product that was never synced writes nothing."""
+        mock_sheet.col_values.return_value = ["id"]
+
+        result = upsert_products(mock_sheet, [mock_product._replace(is_active=False)])
+
+        assert result == {"inserted": 0, "updated": 0, "deleted": 0}
+        mock_sheet.batch_update.assert_not_called()
+        mock_sheet.append_rows.assert_not_called()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_sync_product_ids(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release, mock_sheet, mock_product, row_index
+    ):
+        """Test that changed ids are fetched and upserted under the sync lock."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.col_values.return_value = ["id", "SKU-001"]
+        mock_fetch.return_value = [mock_product]
+
+        result = sync_product_ids({1, 2})
+
+        mock_fetch.assert_called_once_with(product_ids={1, 2})
+        assert result == {"mode": "products", "inserted": 0, "updated": 1, "deleted": 0, "missing": 1}
+        mock_release.assert_called_once()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_sync_skus(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release, mock_sheet, mock_product, row_index
+    ):
+        """Test that requested SKUs are fetched by SKU and upserted."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.col_values.return_value = ["id"]
+        mock_fetch.return_value = [mock_product]
+
+        result = sync_skus(["SKU-001", "SKU-404"])
+
+        mock_fetch.assert_called_once_with(skus=["SKU-001", "SKU-404"])
+        assert result == {"mode": "products", "inserted": 1, "updated": 0, "deleted": 0, "missing": 1}
+
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.acquire_lock", return_value=False)
+    def test_sync_product_ids_locked(self, mock_acquire, mock_fetch):
+        """Test that changes wait while a full sync holds the lock."""
+        assert sync_product_ids({1}) == {"status": "locked"}
+        mock_fetch.assert_not_called()
+
+
+class TestRowIndexAfterFullSync:
+    """Tests for rebuilding the row index when a plan is applied."""
+
+    def test_applied_row_ids(self):
+        """Test that deleted rows drop out and appended rows follow the kept ones."""
+        plan = {
+            "row_ids": ["SKU-001", "SKU-002", "SKU-003", "SKU-004"],
+            "deletes": [(5, 5), (3, 3)],
+            "inserts": [["SKU-009", "title"]],
+        }
+
+        assert applied_row_ids(plan) == ["SKU-001", "SKU-003", "SKU-009"]
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products")
+    def test_full_sync_rebuilds_index(
+        self, mock_fetch, mock_get_sheet, mock_acquire, mock_release,
+        mock_sheet, mock_product, mock_headers, row_index,
+    ):
+        """Test that a full sync leaves the index matching the sheet it wrote."""
+        row_index.update({"stale": 99})
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.get_all_values.return_value = [
+            mock_headers,
+            ["SKU-003"] + [""] * 30,
+            build_row_for_sheet(mock_product, mock_headers),
+        ]
+        mock_fetch.return_value = [mock_product, mock_product._replace(id="SKU-002")]
+
+        sync_products()
+
+        assert row_index == {"SKU-001": 2, "SKU-002": 3}
+
+
+@pytest.fixture
+def plan_store(monkeypatch):
+    """In-memory stand-in for the Redis plan and checkpoint keys."""
+    store = {"plans": {}, "checkpoint": None}
+
+    monkeypatch.setattr("src.sync.save_plan", lambda plan: store["plans"].update(
+        {plan["plan_id"]: json.loads(json.dumps(plan))}
+    ))
+    monkeypatch.setattr("src.sync.load_plan", lambda plan_id: store["plans"].get(plan_id))
+    monkeypatch.setattr("src.sync.delete_plan", lambda plan_id: store["plans"].pop(plan_id, None))
+    monkeypatch.setattr("src.sync.save_checkpoint", lambda cp: store.update(checkpoint=cp))
+    monkeypatch.setattr("src.sync.load_checkpoint", lambda: store["checkpoint"])
+    monkeypatch.setattr("src.sync.clear_checkpoint", lambda: store.update(checkpoint=None))
+    return store
+
+
+class TestResumableSync:
+    """Tests for resuming an interrupted sync from its last checkpoint."""
+
+    @pytest.fixture
+    def interrupted(self, plan_store, mock_sheet, mock_headers, mock_product, monkeypatch):
+        """A sync of five price changes that hit a 429 after the first two batches."""
+        monkeypatch.setattr("src.sync.WRITE_BATCH_RANGES", 2)
+        monkeypatch.setattr("src.sync.get_sheet", lambda: mock_sheet)
+        products = [mock_product._replace(id=f"SKU-{i}") for i in range(5)]
+        monkeypatch.setattr("src.sync.fetch_products", lambda: products)
+
+        existing = {
+            p.id: (i + 2, build_row_for_sheet(p._replace(price=1.0), mock_headers))
+            for i, p in enumerate(products)
+        }
+        monkeypatch.setattr("src.sync.get_existing_values", lambda sheet: existing)
+        mock_sheet.col_values.return_value = ["id", *existing]
+        mock_sheet.batch_update.side_effect = [None, None, Exception("429 Quota exceeded")]
+
+        with pytest.raises(Exception, match="429"):
+            sync_products()
+
+        mock_sheet.batch_update.reset_mock(side_effect=True)
+        return products
+
+    def test_failure_leaves_checkpoint(self, interrupted, plan_store):
+        """Test that the last applied chunk and the plan survive a failed run."""
+        checkpoint = plan_store["checkpoint"]
+
+        assert checkpoint["chunk"] == 1
+        assert checkpoint["sheet_rows"] == 5
+        assert checkpoint["plan_id"] in plan_store["plans"]
+
+    def test_retry_resumes_from_checkpoint(
+        self, interrupted, plan_store, mock_sheet, monkeypatch
+    ):
+        """Test that a retry only sends the chunks the failed run did not apply."""
+        monkeypatch.setattr(
+            "src.sync.get_existing_values",
+            lambda sheet: pytest.fail("a resumed sync must not re-read the sheet"),
+        )
+
+        result = sync_products()
+
+        assert result["resumed_from"] == 2
+        mock_sheet.batch_update.assert_called_once()
+        assert mock_sheet.batch_update.call_args[0][0] == [
+            {"range": "G6:G6", "values": [["1000.0 NGN"]]}
+        ]
+        assert plan_store["checkpoint"] is None
+        assert plan_store["plans"] == {}
+
+    def test_catalogue_change_discards_checkpoint(
+        self, interrupted, plan_store, mock_sheet, monkeypatch
+    ):
+        """Test that a changed catalogue starts a fresh sync instead of resuming."""
+        stale_plan_id = plan_store["checkpoint"]["plan_id"]
+        changed = [p._replace(price=2000.0) for p in interrupted]
+        monkeypatch.setattr("src.sync.fetch_products", lambda: changed)
+        monkeypatch.setattr("src.sync.fetch_row_hashes", lambda: {p.id: "changed" for p in changed})
+
+        result = sync_products()
+
+        assert result["resumed_from"] is None
+        assert result["updated"] == 5
+        assert stale_plan_id not in plan_store["plans"]
+
+    def test_sheet_change_discards_checkpoint(self, interrupted, plan_store, mock_sheet):
+        """Test that rows added to the sheet by hand prevent resuming."""
+        mock_sheet.col_values.return_value = [*mock_sheet.col_values.return_value, "SKU-X"]
+
+        result = sync_products()
+
+        assert result["resumed_from"] is None
+        assert len(mock_sheet.batch_update.call_args_list) == 3
+
+
+class TestTwoPhaseFetch:
+    """Tests for fetching full rows only for new and changed products."""
+
+    @pytest.fixture
+    def catalogue(self, monkeypatch, row_hashes, mock_sheet, mock_product, mock_headers):
+        """
+        SKU-001 unchanged, SKU-002 changed, SKU-003 new and SKU-004 gone
+        since the hashes stored by the last sync.
+        """
+        row_hashes.update({"SKU-001": "a", "SKU-002": "b2", "SKU-003": "c"})
+        stored = {"SKU-001": "a", "SKU-002": "b", "SKU-004": "d"}
+        monkeypatch.setattr("src.sync.load_row_hashes", lambda: dict(stored))
+        monkeypatch.setattr("src.sync.get_sheet", lambda: mock_sheet)
+        mock_sheet.get_all_values.return_value = [
+            mock_headers,
+            build_row_for_sheet(mock_product, mock_headers),
+            build_row_for_sheet(mock_product._replace(id="SKU-002"), mock_headers),
+            build_row_for_sheet(mock_product._replace(id="SKU-004"), mock_headers),
+        ]
+        return stored
+
+    @patch("src.sync.fetch_products")
+    @patch("src.sync.fetch_changed_products")
+    def test_only_changed_rows_fetched(self, mock_changed, mock_fetch, catalogue, mock_sheet, mock_product):
+        """Test that unchanged products are neither fetched nor deleted."""
+        mock_changed.return_value = [
+            mock_product._replace(id="SKU-002", price=2000.0),
+            mock_product._replace(id="SKU-003"),
+        ]
+
+        plan = plan_sync(mock_sheet, row_hashes={"SKU-001": "a", "SKU-002": "b2", "SKU-003": "c"})
+
+        mock_fetch.assert_not_called()
+        mock_changed.assert_called_once_with(["SKU-002", "SKU-003"])
+        assert plan["counts"] == {
+            "inserted": 1, "updated": 1, "unchanged": 1, "updated_cells": 1, "deleted": 1,
+        }
+        assert plan["deletes"] == [(4, 4)]
+        assert plan["row_hashes"] == {"changed": {"SKU-002": "b2", "SKU-003": "c"}, "removed": ["SKU-004"]}
+
+    @patch("src.sync.fetch_changed_products", return_value=[])
+    def test_rows_missing_from_sheet_refetched(self, mock_changed, catalogue, mock_sheet, mock_headers):
+        """Test that a product whose hash matches is fetched again if its row is gone."""
+        mock_sheet.get_all_values.return_value = [mock_headers]
+
+        plan_sync(mock_sheet, row_hashes={"SKU-001": "a"})
+
+        mock_changed.assert_called_once_with(["SKU-001"])
+
+    @patch("src.sync.fetch_products", return_value=[])
+    @patch("src.sync.fetch_changed_products")
+    def test_no_stored_hashes_fetches_everything(self, mock_changed, mock_fetch, mock_sheet, mock_headers):
+        """Test that the first sync falls back to a full fetch."""
+        mock_sheet.get_all_values.return_value = [mock_headers]
+
+        plan = plan_sync(mock_sheet, row_hashes={"SKU-001": "a"})
+
+        mock_fetch.assert_called_once()
+        mock_changed.assert_not_called()
+        assert plan["row_hashes"] == {"changed": {}, "removed": []}
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.update_row_hashes")
+    @patch("src.sync.fetch_changed_products")
+    def test_applied_sync_stores_hashes(
+        self, mock_changed, mock_update, mock_acquire, mock_release, catalogue, mock_product
+    ):
+        """Test that hashes are stored only after their rows were written."""
+        mock_changed.return_value = [mock_product._replace(id="SKU-003")]
+
+        sync_products()
+
+        mock_update.assert_called_once_with({"SKU-003": "c"}, ["SKU-004"])
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.update_row_hashes")
+    @patch("src.sync.fetch_changed_products")
+    def test_failed_sync_keeps_old_hashes(
+        self, mock_changed, mock_update, mock_acquire, mock_release, catalogue, mock_product, mock_sheet
+    ):
+        """Test that rows that were not written are fetched again next time."""
+        mock_changed.return_value = [mock_product._replace(id="SKU-003")]
+        mock_sheet.append_rows.side_effect = Exception("429")
+
+        with pytest.raises(Exception):
+            sync_products()
+
+        mock_update.assert_not_called()
+
+    @patch("src.sync.release_lock")
+    @patch("src.sync.acquire_lock", return_value=True)
+    @patch("src.sync.clear_row_hashes")
+    @patch("src.sync.get_sheet")
+    @patch("src.sync.fetch_products", return_value=[])
+    def test_force_clears_stored_hashes(
+        self, mock_fetch, mock_get_sheet, mock_clear, mock_acquire, mock_release, mock_sheet
+    ):
+        """Test that a forced sync re-fetches and re-diffs every row."""
+        mock_get_sheet.return_value = mock_sheet
+        mock_sheet.get_all_values.return_value = []
+
+        sync_products(force=True)
+
+        mock_clear.assert_called_once()